@@ -5,16 +5,142 @@ local udp = socket.udp()
 udp:settimeout(0)
 udp:setpeername("YOUR_PI_IP_HERE", 4444)  -- Replace with Raspberry Pi IP
 
-local function sendTelemetry()
-    local vel = obj:getVelocity()
-    local data = string.format("{\"vel\":[%.2f, %.2f, %.2f]}", vel.x, vel.y, vel.z)
+-- "binary" sends the compact 24-byte format (see telemetry_protocol.py on the Pi),
+-- "json" sends the original {"vel":[x, y, z]} text for older receivers.
+local WIRE_FORMAT = "binary"
+-- Also send the vehicle's forward and up directions (+24 bytes), so the Pi can
+-- split the velocity into headwind and crosswind for several fans (see
+-- wind_channels.py). Receivers that do not use them ignore the extra bytes.
+local SEND_ORIENTATION = true
+
+-- Rate control: send when the velocity moved by more than CHANGE_THRESHOLD
+-- (m/s, any axis) since the last packet, at most MAX_SEND_HZ times a second,
+-- and every KEEPALIVE seconds when nothing changes (e.g. parked). The Pi
+-- overrides these with an "AVCFG" datagram (set in the wind server web UI).
+local maxSendHz = 60
+local changeThreshold = 0.05
+local keepalive = 1.0
+local CONFIG_CHECK_INTERVAL = 0.5  -- Seconds between checks for settings from the Pi
+
+local floor = math.floor
+local abs = math.abs
+local char = string.char
+local seq = 0
+local configVersion = -1
+local sinceSend = math.huge
+local sinceConfigCheck = 0
+local lastX, lastY, lastZ = 0, 0, 0
+local lastFx, lastFy, lastFz = 0, 0, 0
+-- A change of heading alone (sliding at a steady speed) changes the crosswind:
+-- send when the forward direction moved by more than this (unit vector, ~1 degree)
+local DIRECTION_THRESHOLD = 0.02
+
+-- Random per-vehicle ID so a Pi receiving from several BeamMP players can keep
+-- their streams apart even if a NAT changes the source port
+math.randomseed(floor(socket.gettime() * 1000) % 2147483647 + (obj and obj:getID() or 0))
+local SENDER_ID = math.random(1, 2147483646)
+
+local function u32le(n)
+    n = n % 4294967296
+    return char(n % 256, floor(n / 256) % 256, floor(n / 65536) % 256, floor(n / 16777216) % 256)
+end
+
+-- IEEE 754 single precision, little-endian (LuaJIT has no string.pack)
+local function f32le(x)
+    if x == 0 then return char(0, 0, 0, 0) end
+    if x ~= x then return char(0, 0, 0xC0, 0x7F) end  -- NaN
+    local sign = 0
+    if x < 0 then
+        sign = 0x80
+        x = -x
+    end
+    local mantissa, exponent = math.frexp(x)  -- x = mantissa * 2^exponent, 0.5 <= mantissa < 1
+    exponent = exponent + 126
+    if exponent <= 0 then  -- subnormal
+        mantissa = floor(mantissa * 2 ^ (23 + exponent) + 0.5)
+        exponent = 0
+    else
+        mantissa = floor((mantissa * 2 - 1) * 2 ^ 23 + 0.5)
+        if mantissa == 8388608 then  -- rounding carried into the exponent
+            mantissa = 0
+            exponent = exponent + 1
+        end
+    end
+    if exponent >= 255 then  -- overflow to infinity
+        mantissa = 0
+        exponent = 255
+    end
+    return char(mantissa % 256, floor(mantissa / 256) % 256,
+                floor(mantissa / 65536) % 128 + (exponent % 2) * 128, sign + floor(exponent / 2))
+end
+
+local function sendTelemetry(vel, dir, up)
+    local senderMs = floor(socket.gettime() * 1000)
+    local data
+    if WIRE_FORMAT == "binary" then
+        -- flags = 1: sender ID follows the velocity; + 2: then the forward and up vectors
+        data = "AV" .. char(1, dir and 3 or 1) .. u32le(seq) .. u32le(senderMs) .. f32le(vel.x) .. f32le(vel.y) .. f32le(vel.z) .. u32le(SENDER_ID)
+        if dir then
+            data = data .. f32le(dir.x) .. f32le(dir.y) .. f32le(dir.z) .. f32le(up.x) .. f32le(up.y) .. f32le(up.z)
+        end
+    else
+        data = string.format("{\"vel\":[%.2f, %.2f, %.2f],\"seq\":%d,\"t\":%d,\"id\":%d",
+                             vel.x, vel.y, vel.z, seq, senderMs % 4294967296, SENDER_ID)
+        if dir then
+            data = data .. string.format(",\"dir\":[%.4f, %.4f, %.4f],\"up\":[%.4f, %.4f, %.4f]",
+                                         dir.x, dir.y, dir.z, up.x, up.y, up.z)
+        end
+        data = data .. "}"
+    end
+    seq = (seq + 1) % 4294967296
     udp:send(data)
 end
 
 M = {}
 
+-- "AVCFG 1 <version> <max_send_hz> <change_threshold> <keepalive>" from the Pi
+-- (the socket is connected, so only the Pi's telemetry port can reach it)
+local function receiveConfig()
+    while true do
+        local msg = udp:receive()
+        if not msg then return end
+        local version, hz, threshold, alive = msg:match("^AVCFG 1 (%d+) ([%d%.]+) ([%d%.]+) ([%d%.]+)")
+        version = tonumber(version)
+        if version and version ~= configVersion then
+            configVersion = version
+            maxSendHz = math.max(tonumber(hz), 1)
+            changeThreshold = tonumber(threshold)
+            keepalive = tonumber(alive)
+        end
+    end
+end
+
 function M.updateGFX(dt)
-    sendTelemetry()
+    sinceSend = sinceSend + dt
+    sinceConfigCheck = sinceConfigCheck + dt
+    if sinceConfigCheck >= CONFIG_CHECK_INTERVAL then
+        sinceConfigCheck = 0
+        receiveConfig()
+    end
+    if sinceSend < 1 / maxSendHz then return end
+
+    local vel = obj:getVelocity()
+    local dir, up
+    if SEND_ORIENTATION then
+        dir, up = obj:getDirectionVector(), obj:getDirectionVectorUp()
+    end
+    if sinceSend < keepalive and abs(vel.x - lastX) <= changeThreshold
+            and abs(vel.y - lastY) <= changeThreshold and abs(vel.z - lastZ) <= changeThreshold
+            and (not dir or (abs(dir.x - lastFx) <= DIRECTION_THRESHOLD and abs(dir.y - lastFy) <= DIRECTION_THRESHOLD
+                             and abs(dir.z - lastFz) <= DIRECTION_THRESHOLD)) then
+        return
+    end
+    sendTelemetry(vel, dir, up)
+    lastX, lastY, lastZ = vel.x, vel.y, vel.z
+    if dir then
+        lastFx, lastFy, lastFz = dir.x, dir.y, dir.z
+    end
+    sinceSend = 0
 end
 
 return M
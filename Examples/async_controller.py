@@ -0,0 +1,292 @@
+
+import asyncio
+import time
+
+from config_http import ConfigHTTPServer
+from config_push import RENEW_INTERVAL, SUBSCRIBE
+from control_loop import FixedRateScheduler
+from sender_control import SenderConfigBroadcaster
+from sender_streams import StreamDemux, StreamSelector, StreamTable
+from speed_filter import make_speed_hold
+from wind_config import DEFAULT_WIND_CONFIG, WIND_CONFIG_FIELDS, wind_config
+from wind_curve import compile_curve
+
+# asyncio fan controller core.
+#
+# Telemetry, configuration and PWM output each run independently on one event
+# loop, so a slow config source can never stall the telemetry-to-PWM path:
+#   - TelemetryProtocol files each datagram under its sender's stream
+#     (sender_streams.py) and wakes the output task when the selected stream
+#     has a new sample; packets that arrive before the output task runs are
+#     counted as skipped, matching DrainingReceiver in the threaded controllers.
+#   - Pushed config (config_push.ConfigSubscriber) is applied as soon as its
+#     datagram arrives, through the same code as a ConfigStore snapshot
+#     (curve, top speed, sender settings, on_config). The config refresh task runs the (possibly blocking)
+#     config source in a worker thread, only while the push channel is down.
+#   - The output task computes the fan power and writes it to the PWM driver,
+#     either whenever a new sample arrives or, with `control_rate_hz`, on a
+#     fixed tick (control_loop.FixedRateScheduler) from the newest sample.
+#   - With a wind_config.ConfigStore, the config UI/API (config_http.py) can
+#     be served from this same loop; the output task picks up a new config
+#     snapshot with one attribute load per iteration.
+# As in the threaded controllers, an exception in one output iteration (the
+# curve, the PWM write, on_config) is counted and logged at most once a
+# second; it never ends the output task, so one bad tick cannot stop the fan.
+
+DEFAULT_TOP_SPEED = 150
+TOP_SPEED_FETCH_INTERVAL = 5  # Seconds
+EVICT_INTERVAL = 1.0  # Seconds between sweeps for idle sender streams
+ERROR_LOG_INTERVAL = 1.0  # Seconds between error reports from the output task
+
+
+class TelemetryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, controller):
+        self.controller = controller
+
+    def datagram_received(self, data, addr):
+        self.controller.on_datagram(data, addr)
+
+    def error_received(self, exc):
+        # ICMP errors on a UDP socket are not fatal for a listener
+        pass
+
+
+class ConfigPushProtocol(asyncio.DatagramProtocol):
+    def __init__(self, controller, subscriber):
+        self.controller = controller
+        self.subscriber = subscriber
+
+    def datagram_received(self, data, addr):
+        config = self.subscriber.handle(data)
+        if config is not None:
+            self.controller.apply_pushed_config(config, self.subscriber.version)
+
+    def error_received(self, exc):
+        pass
+
+
+class AsyncFanController:
+    def __init__(self, set_duty_cycle, config_source=None, config_subscriber=None,
+                 refresh_interval=TOP_SPEED_FETCH_INTERVAL, top_speed=DEFAULT_TOP_SPEED,
+                 curve="linear", control_rate_hz=None, stream_policy="sticky", driving_sender=None,
+                 config_store=None, config_http_port=None, on_config=None, speed_filter="none", lead=0.0):
+        """`set_duty_cycle(power, speed_mph)` drives the fan; `config_source()`
+        returns a new top speed (or None) and may block, it runs off-loop.
+        `config_subscriber` is an optional config_push.ConfigSubscriber; pushed
+        configs are applied like `config_store` snapshots, below.
+        `curve` is a wind_curve kind. With `control_rate_hz` the output runs
+        on a fixed tick instead of once per sample. `stream_policy` and
+        `driving_sender` choose the sender that drives the fan (see
+        sender_streams.StreamSelector). A wind_config.ConfigStore in
+        `config_store` overrides top speed, curve and sender settings (and is
+        served over HTTP on `config_http_port`, if given); `on_config(config)`
+        is called with each new WindConfig, e.g. to reconfigure an OutputStage.
+        `speed_filter` and `lead` (seconds) set up a speed_filter.FilterStage;
+        they need `control_rate_hz`, where ticks read the filtered speed
+        (ValueError without it)."""
+        if (speed_filter != "none" or lead) and not control_rate_hz:
+            raise ValueError("speed_filter and lead need control_rate_hz: only fixed-rate ticks read the filter")
+        self.set_duty_cycle = set_duty_cycle
+        self.config_source = config_source
+        self.config_subscriber = config_subscriber
+        self.refresh_interval = refresh_interval
+        self.top_speed = top_speed
+        self.curve = compile_curve(curve, top_speed)
+        self.wind = DEFAULT_WIND_CONFIG._replace(top_speed=float(top_speed), curve=curve)  # WindConfig in effect
+        self.speed_mph = 0.0
+        self.power = 0.0
+        self.received = 0
+        self.skipped = 0
+        self.errors = 0  # Output iterations that raised
+        self._next_error_report = 0.0
+        self._pending = 0
+        self._new_sample = asyncio.Event()
+        self.scheduler = FixedRateScheduler(control_rate_hz) if control_rate_hz else None
+        self.speed_hold = make_speed_hold(speed_filter, lead)
+        self.streams = StreamTable()
+        self.demux = StreamDemux(self.streams, StreamSelector(stream_policy, driving_sender), self.speed_hold)
+        self.sender_config = SenderConfigBroadcaster(self._send_to_sender, self.streams)
+        self.config_store = config_store
+        self.config_http_port = config_http_port
+        self.on_config = on_config
+        self._applied = None  # Config snapshot in effect
+        self._http = None
+        self._tasks = []
+        self._transport = None
+        self._push_transport = None
+        if config_store is not None:
+            self._apply_config()
+
+    def on_datagram(self, data, addr):
+        demux = self.demux
+        selected = demux.handle(data, len(data), addr)  # Also feeds speed_hold for _control_loop
+        self.received += 1
+        if self.scheduler is not None:
+            return
+        if demux.select(time.monotonic()) or selected:
+            slot = demux.selector.slot
+            self.speed_mph = self.streams.speed[slot] if slot >= 0 else 0.0
+            self._pending += 1
+            self._new_sample.set()
+
+    def apply_top_speed(self, new_top_speed):
+        if isinstance(new_top_speed, (int, float)) and new_top_speed > 0 and new_top_speed != self.top_speed:
+            print(f"Updated top_speed: {new_top_speed} mph")
+            self.top_speed = new_top_speed
+            self.curve = self.curve.with_top_speed(new_top_speed)
+            self.wind = self.wind._replace(top_speed=float(new_top_speed))
+            self._new_sample.set()  # Re-scale the current speed straight away
+
+    def apply_pushed_config(self, config, version=None):
+        """Apply a config dict pushed by config_push.ConfigPublisher, as a ConfigStore snapshot is."""
+        fields = {name: config[name] for name in WIND_CONFIG_FIELDS if name in config}
+        sender = config.get("sender")
+        if isinstance(sender, dict):
+            fields.update((name, sender[name]) for name in ("max_send_hz", "change_threshold", "keepalive")
+                          if name in sender)
+        try:
+            wind = wind_config(self.wind, **fields)
+        except ValueError as e:
+            print(f"Warning: Ignoring invalid pushed config: {e}")
+            return
+        if wind == self.wind:
+            return
+        try:
+            self._apply_wind(version, wind)
+        except Exception as e:  # on_config; a datagram callback must not raise
+            self._report_error(e)
+        self._new_sample.set()  # Re-scale the current speed straight away
+
+    def _apply_config(self):
+        self._applied = snapshot = self.config_store.snapshot
+        self._apply_wind(*snapshot)
+
+    def _apply_wind(self, version, wind):
+        if self.curve.kind != wind.curve or self.curve.top_speed != wind.top_speed:
+            self.curve = compile_curve(wind.curve, wind.top_speed)
+        self.top_speed = wind.top_speed
+        self.wind = wind
+        if self.sender_config.update(wind.sender):
+            self.sender_config.tick()
+        if self.on_config is not None:
+            self.on_config(wind)
+        print(f"Config version {version}: {wind}")
+
+    def _report_error(self, error):
+        self.errors += 1
+        now = time.monotonic()
+        if now >= self._next_error_report:
+            self._next_error_report = now + ERROR_LOG_INTERVAL
+            print(f"Error: {error!r} ({self.errors} errors so far)")
+
+    def _send_to_sender(self, data, address):
+        if self._transport is not None:
+            self._transport.sendto(data, address)
+
+    async def _output_loop(self):
+        while True:
+            await self._new_sample.wait()
+            self._new_sample.clear()
+            if self._pending > 1:
+                self.skipped += self._pending - 1
+            self._pending = 0
+            try:
+                if self.config_store is not None and self.config_store.snapshot is not self._applied:
+                    self._apply_config()
+                self.power = self.curve(self.speed_mph)
+                self.set_duty_cycle(self.power, self.speed_mph)
+            except Exception as e:
+                self._report_error(e)
+
+    async def _control_loop(self):
+        scheduler = self.scheduler
+        while True:
+            await asyncio.sleep(scheduler.time_until_tick())
+            if not scheduler.due():
+                continue
+            now = scheduler.begin_tick()
+            try:
+                if self.config_store is not None and self.config_store.snapshot is not self._applied:
+                    self._apply_config()
+                self.demux.select(now)
+                speed = self.speed_hold.read(now)
+                self.power = self.curve(speed)
+                self.set_duty_cycle(self.power, speed)
+            except Exception as e:
+                self._report_error(e)
+            finally:
+                scheduler.end_tick()
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(EVICT_INTERVAL)
+            now = time.monotonic()
+            self.sender_config.tick(now)
+            if self.streams.evict_idle(now) and self.scheduler is None and self.demux.select(now):
+                slot = self.demux.selector.slot  # The driving sender went away
+                self.speed_mph = self.streams.speed[slot] if slot >= 0 else 0.0
+                self._new_sample.set()
+
+    async def _config_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.config_subscriber is not None and self.config_subscriber.live:
+                await asyncio.sleep(self.refresh_interval)  # Push channel is up; no need to poll
+                continue
+            try:
+                new_top_speed = await loop.run_in_executor(None, self.config_source)
+            except Exception as e:
+                print(f"Warning: Could not refresh config: {e}")
+            else:
+                self.apply_top_speed(new_top_speed)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _renew_loop(self):
+        while True:
+            self._push_transport.sendto(SUBSCRIBE, self.config_subscriber.server_addr)
+            await asyncio.sleep(RENEW_INTERVAL)
+
+    async def start(self, ip="", port=4444, sock=None):
+        loop = asyncio.get_running_loop()
+        if sock is not None:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: TelemetryProtocol(self), sock=sock)
+        else:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: TelemetryProtocol(self), local_addr=(ip or "0.0.0.0", port))
+        if self.scheduler is not None:
+            self._tasks.append(asyncio.create_task(self._control_loop()))
+        else:
+            self._tasks.append(asyncio.create_task(self._output_loop()))
+        self._tasks.append(asyncio.create_task(self._evict_loop()))
+        if self.config_subscriber is not None:
+            subscriber = self.config_subscriber
+            self._push_transport, _ = await loop.create_datagram_endpoint(
+                lambda: ConfigPushProtocol(self, subscriber), sock=subscriber.sock)
+            self._tasks.append(asyncio.create_task(self._renew_loop()))
+        if self.config_source is not None:
+            self._tasks.append(asyncio.create_task(self._config_loop()))
+        if self.config_store is not None:
+            # Updates are saved on a worker thread; wake the output task to apply them
+            self.config_store.add_listener(lambda version, config: loop.call_soon_threadsafe(self._new_sample.set))
+            if self.config_http_port is not None:
+                self._http = await ConfigHTTPServer(self.config_store, port=self.config_http_port).start()
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+        for transport in (self._transport, self._push_transport):
+            if transport is not None:
+                transport.close()
+        self._transport = self._push_transport = None
+
+    async def run_forever(self, ip="", port=4444):
+        await self.start(ip, port)
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            self.close()
@@ -0,0 +1,190 @@
+
+import asyncio
+import html
+import json
+import threading
+from urllib.parse import parse_qs
+
+from metrics import read_metrics_file
+from wind_config import CONFIG_CURVES
+
+# Lightweight config UI/API on asyncio, to run inside a controller process
+# instead of a separate Flask server (see wind_config.py for the store it
+# edits). HTTP/1.0-style: one request per connection, small bodies only.
+#
+#   GET  /                    config form
+#   POST /                    form submit (application/x-www-form-urlencoded)
+#   GET  /api/config          {"version": n, "top_speed": ..., "curve": ..., ...}
+#   POST /api/config          JSON object with the fields to change
+#   GET  /get_top_speed_api   {"top_speed": ..., "version": n} (as wind_server_for_sim.py)
+#   GET  /metrics             controller metrics (Prometheus text)
+#
+# start() runs on an existing event loop (async_controller.py);
+# start_in_thread() gives the threaded controllers their own loop thread.
+
+DEFAULT_HTTP_PORT = 5000
+MAX_BODY = 16 * 1024
+READ_TIMEOUT = 5.0  # Seconds for a client to send its request
+
+_REASONS = {200: "OK", 303: "See Other", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+_FIELDS = (
+    ("top_speed", "Top speed (mph, 1-250)", "1"),
+    ("deadband", "PWM deadband (%, 0-10)", "any"),
+    ("max_write_hz", "Max PWM writes per second (0 = unlimited)", "any"),
+    ("slew_rate", "Slew rate (% per second, 0 = unlimited)", "any"),
+    ("max_send_hz", "main.lua max send rate (Hz, 1-240)", "any"),
+    ("change_threshold", "main.lua change threshold (m/s, 0-5)", "any"),
+    ("keepalive", "main.lua keepalive when unchanged (s, 0.1-1.5)", "any"),
+)
+
+
+def _page(version, config, error=None):
+    rows = []
+    for name, label, step in _FIELDS:
+        rows.append(f'<label>{label} <input type="number" name="{name}" value="{getattr(config, name):g}" '
+                    f'step="{step}" required></label><br>')
+    options = "".join(f'<option{" selected" if kind == config.curve else ""}>{kind}</option>'
+                      for kind in CONFIG_CURVES)
+    message = f'<p style="color:red">{html.escape(error)}</p>' if error else ""
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>BeamNG Fan Controller</title>
+</head>
+<body>
+<h2>Wind Config</h2>
+{message}<form method="post">
+<label>Wind curve <select name="curve">{options}</select></label><br>
+{"".join(rows)}
+<input type="submit" value="Set">
+</form>
+<p>Config version {version}; saved across restarts.</p>
+</body>
+</html>
+'''
+
+
+class ConfigHTTPServer:
+    def __init__(self, store, host="0.0.0.0", port=DEFAULT_HTTP_PORT, metrics_text=read_metrics_file):
+        """`store` is a wind_config.ConfigStore; `metrics_text()` returns the /metrics body."""
+        self.store = store
+        self.host = host
+        self.port = port
+        self.metrics_text = metrics_text
+        self.requests = 0
+        self._server = None
+        self._loop = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self
+
+    def start_in_thread(self):
+        """Serve from a daemon thread with its own event loop; raises OSError if the port is taken."""
+        started = threading.Event()
+        error = []
+
+        def run():
+            loop = self._loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(self.start())
+            except OSError as e:
+                error.append(e)
+                started.set()
+                loop.close()
+                return
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="config-http", daemon=True).start()
+        started.wait()
+        if error:
+            raise error[0]
+        return self
+
+    def close(self):
+        if self._server is None:
+            return
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        else:
+            self._server.close()
+        self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            status, content_type, body, headers = await asyncio.wait_for(self._respond(reader), READ_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            writer.close()
+            return
+        self.requests += 1
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                "Connection: close"]
+        head.extend(f"{name}: {value}" for name, value in headers)
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _respond(self, reader):
+        method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        if length > MAX_BODY:
+            return 413, "text/plain", b"Request body too large\n", ()
+        body = await reader.readexactly(length) if length else b""
+        path = target.split("?", 1)[0]
+        try:
+            # In a worker thread: saving the config fsyncs, which must not stall a controller on this loop
+            return await asyncio.get_running_loop().run_in_executor(None, self._route, method, path, body)
+        except OSError as e:  # Config file could not be written
+            return 500, "text/plain", f"Could not save config: {e}\n".encode(), ()
+
+    def _route(self, method, path, body):
+        store = self.store
+        if path == "/":
+            if method == "POST":
+                form = {k: v[0] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+                try:
+                    store.update(**form)
+                except ValueError as e:
+                    version, config = store.snapshot
+                    return 400, "text/html; charset=utf-8", _page(version, config, str(e)).encode(), ()
+                return 303, "text/plain", b"", (("Location", "/"),)
+            if method != "GET":
+                return 405, "text/plain", b"Method not allowed\n", ()
+            return 200, "text/html; charset=utf-8", _page(*store.snapshot).encode(), ()
+        if path == "/api/config":
+            if method in ("POST", "PUT"):
+                try:
+                    changes = json.loads(body or b"{}")
+                    if not isinstance(changes, dict):
+                        raise ValueError("Expected a JSON object")
+                    changes.pop("version", None)  # Allow sending back what GET returned
+                    store.update(**changes)
+                except ValueError as e:
+                    return 400, "application/json", json.dumps({"error": str(e)}).encode(), ()
+            elif method != "GET":
+                return 405, "text/plain", b"Method not allowed\n", ()
+            version, config = store.snapshot
+            return 200, "application/json", json.dumps({"version": version, **config._asdict()}).encode(), ()
+        if path == "/get_top_speed_api" and method == "GET":
+            version, config = store.snapshot
+            return 200, "application/json", json.dumps({"top_speed": config.top_speed, "version": version}).encode(), ()
+        if path == "/metrics" and method == "GET":
+            return 200, "text/plain; version=0.0.4", self.metrics_text().encode(), ()
+        return 404, "text/plain", b"Not found\n", ()
@@ -0,0 +1,146 @@
+
+import json
+import socket
+import threading
+import time
+
+# Push-based config updates from the wind server to fan controllers.
+#
+# A controller subscribes by sending b"SUB" to the server's config port. The
+# server answers with the current config and, from then on, sends a datagram
+# to every subscriber whenever the config changes:
+#
+#   {"epoch": <server start id>, "version": <n>, "top_speed": 150, ...}
+#
+# Subscriptions are leases: a controller re-sends b"SUB" every RENEW_INTERVAL
+# seconds (a few bytes, no HTTP) and the server drops subscribers it has not
+# heard from for LEASE_SECONDS. If the server stops answering, the controller
+# reports the push channel as down and falls back to HTTP polling.
+
+CONFIG_PUSH_PORT = 5001
+SUBSCRIBE = b"SUB"
+RENEW_INTERVAL = 10    # Seconds between subscription renewals
+LEASE_SECONDS = 30     # Server forgets a subscriber after this long
+MAX_SUBSCRIBERS = 32
+
+
+class ConfigPublisher:
+    def __init__(self, get_config, port=CONFIG_PUSH_PORT, host="0.0.0.0"):
+        """`get_config()` returns the current config as a JSON-serialisable dict."""
+        self.get_config = get_config
+        self.epoch = int(time.time())
+        self.version = 1
+        self._subscribers = {}  # addr -> lease expiry (monotonic)
+        self._lock = threading.Lock()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+
+    def start(self):
+        threading.Thread(target=self._serve, name="config-push", daemon=True).start()
+        return self
+
+    def publish(self):
+        """Bump the config version and push it to every live subscriber."""
+        now = time.monotonic()
+        with self._lock:
+            self.version += 1
+            message = self._message()
+            for addr, expiry in list(self._subscribers.items()):
+                if expiry < now:
+                    del self._subscribers[addr]
+                else:
+                    self._send(message, addr)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _message(self):
+        config = dict(self.get_config())
+        config["epoch"] = self.epoch
+        config["version"] = self.version
+        return json.dumps(config).encode("utf-8")
+
+    def _send(self, message, addr):
+        try:
+            self.sock.sendto(message, addr)
+        except OSError:
+            pass
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(64)
+            except ConnectionResetError:  # Windows: ICMP from a vanished subscriber
+                continue
+            except OSError:  # Socket closed
+                break
+            if not data.startswith(SUBSCRIBE):
+                continue
+            with self._lock:
+                if addr in self._subscribers or len(self._subscribers) < MAX_SUBSCRIBERS:
+                    self._subscribers[addr] = time.monotonic() + LEASE_SECONDS
+                message = self._message()
+            self._send(message, addr)
+
+
+class ConfigSubscriber:
+    def __init__(self, server_addr=("127.0.0.1", CONFIG_PUSH_PORT)):
+        self.server_addr = server_addr
+        self.epoch = None
+        self.version = 0
+        self.last_message = None  # monotonic time of the last datagram from the server
+        self._next_renewal = 0.0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("", 0))
+        self.sock.setblocking(False)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    @property
+    def live(self):
+        """True while the server is answering; otherwise callers should poll."""
+        return (self.last_message is not None
+                and time.monotonic() - self.last_message < RENEW_INTERVAL * 2)
+
+    def renew_if_due(self):
+        now = time.monotonic()
+        if now >= self._next_renewal:
+            self._next_renewal = now + RENEW_INTERVAL
+            try:
+                self.sock.sendto(SUBSCRIBE, self.server_addr)
+            except OSError:
+                pass
+
+    def handle(self, data):
+        """Return the config dict carried by `data` if it is newer than ours, else None."""
+        try:
+            config = json.loads(data)
+            epoch, version = config["epoch"], config["version"]
+        except (ValueError, KeyError, TypeError):
+            return None
+        self.last_message = time.monotonic()
+        if epoch == self.epoch and version <= self.version:
+            return None  # Lease renewal echo, nothing changed
+        self.epoch, self.version = epoch, version
+        return config
+
+    def poll(self):
+        """Non-blocking: renew the lease if due and return the newest pushed config, if any."""
+        self.renew_if_due()
+        latest = None
+        while True:
+            try:
+                data = self.sock.recv(1024)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:  # e.g. ICMP port unreachable reported on Windows
+                continue
+            config = self.handle(data)
+            if config is not None:
+                latest = config
+        return latest
+
+    def close(self):
+        self.sock.close()
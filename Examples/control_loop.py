@@ -0,0 +1,122 @@
+
+import time
+
+# Fixed-rate control loop support.
+#
+# The fan output is updated on a fixed tick (e.g. 100 Hz) of the monotonic
+# clock instead of whenever a packet happens to arrive, so output timing stays
+# the same however bursty the UDP stream is. Between ticks the controller
+# waits for telemetry (select/poll with the time left until the next tick) and
+# only records the newest sample in a SampleHold; every tick reads the hold,
+# extrapolating a little if the packet for this frame is late.
+
+DEFAULT_RATE_HZ = 100
+MAX_EXTRAPOLATION = 0.1  # Seconds of trend applied to a late sample
+STALE_AFTER = 2.0        # Seconds without telemetry before the speed drops to 0
+
+
+class FixedRateScheduler:
+    def __init__(self, rate_hz=DEFAULT_RATE_HZ, clock=time.monotonic):
+        self.period = 1.0 / rate_hz
+        self.clock = clock
+        self.next_tick = clock()
+        self.ticks = 0
+        self.overruns = 0       # Ticks skipped, or tick work that took longer than a period
+        self._tick_start = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_ticks = 0
+        self.jitter_sum = 0.0   # Sum of tick start lateness in the window (s)
+        self.jitter_max = 0.0
+        self.busy_max = 0.0     # Longest tick body in the window (s)
+
+    def time_until_tick(self, now=None):
+        if now is None:
+            now = self.clock()
+        return max(0.0, self.next_tick - now)
+
+    def due(self, now=None):
+        if now is None:
+            now = self.clock()
+        return now >= self.next_tick
+
+    def begin_tick(self, now=None):
+        """Start the due tick: record its lateness and schedule the next one.
+
+        Deadlines advance by whole periods from the first tick, so the loop
+        never drifts; if whole periods were missed they are counted as
+        overruns and skipped rather than run back to back.
+        """
+        if now is None:
+            now = self.clock()
+        lateness = now - self.next_tick
+        missed = int(lateness / self.period)
+        if missed:
+            self.overruns += missed
+        self.next_tick += self.period * (missed + 1)
+        self.ticks += 1
+        self.window_ticks += 1
+        self.jitter_sum += lateness
+        if lateness > self.jitter_max:
+            self.jitter_max = lateness
+        self._tick_start = now
+        return now
+
+    def end_tick(self, now=None):
+        if now is None:
+            now = self.clock()
+        busy = now - self._tick_start
+        if busy > self.busy_max:
+            self.busy_max = busy
+        if busy > self.period:
+            self.overruns += 1
+
+    def report(self):
+        """One-line summary of the window since the last report, then reset it."""
+        n = self.window_ticks or 1
+        line = (f"ticks {self.window_ticks} @ {1.0 / self.period:.0f} Hz, "
+                f"jitter mean {self.jitter_sum / n * 1000:.2f} ms max {self.jitter_max * 1000:.2f} ms, "
+                f"busy max {self.busy_max * 1000:.2f} ms, overruns {self.overruns}")
+        self._reset_window()
+        return line
+
+
+class SampleHold:
+    def __init__(self, max_extrapolation=MAX_EXTRAPOLATION, stale_after=STALE_AFTER):
+        self.max_extrapolation = max_extrapolation
+        self.stale_after = stale_after
+        self.value = 0.0
+        self.trend = 0.0       # Units per second, smoothed
+        self.time = None       # Arrival time of the held sample
+        self.extrapolated = 0  # Reads that had to extrapolate a late sample
+        self._interval = None  # Smoothed time between samples
+
+    def reset(self):
+        """Forget the held sample and its trend, e.g. when switching to another source."""
+        self.value = 0.0
+        self.trend = 0.0
+        self.time = None
+        self._interval = None
+
+    def update(self, value, now):
+        if self.time is not None:
+            dt = now - self.time
+            if dt > 0.001:
+                slope = (value - self.value) / dt
+                self.trend += 0.5 * (slope - self.trend)
+                self._interval = dt if self._interval is None else self._interval + 0.1 * (dt - self._interval)
+        self.value = value
+        self.time = now
+
+    def read(self, now):
+        """The held value, extrapolated along its trend if the next sample is late."""
+        if self.time is None:
+            return 0.0
+        age = now - self.time
+        if self.stale_after is not None and age > self.stale_after:
+            return 0.0  # Telemetry stopped (game paused or closed): let the fan stop
+        if self._interval is None or age <= self._interval:
+            return self.value
+        self.extrapolated += 1
+        return self.value + self.trend * min(age, self.max_extrapolation)
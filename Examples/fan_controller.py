@@ -1,59 +1,90 @@
 
 import time
 import socket
-import json
-from wind_server import get_top_speed  # Fetch top speed set in web app
+from telemetry_protocol import TelemetrySample, decode_into
+from metrics import PipelineMetrics
+from ring_log import RingLogger
+from sd_daemon import activated_socket, notify_ready
+from shared_config import SharedConfigReader  # Top speed set in the wind_server.py web app
+from wind_curve import compile_curve
 
 # --- Realistic Wind Power Calculation ---
-def calculate_motor_power(speed_mph, top_speed, max_real_wind_speed=70, max_power=100):
-    if top_speed < 5:
-        return 0  # Avoid division errors early on
-
-    normalized_speed = speed_mph / top_speed
-    real_wind_equivalent = normalized_speed * max_real_wind_speed
-    power = (real_wind_equivalent / max_real_wind_speed) ** 2 * max_power
-    return min(max(power, 0), max_power)
+# Quadratic: lower speeds produce much less wind, higher speeds ramp up more.
+# Compiled to a lookup table in wind_curve.py; recompiled when top speed changes.
+WIND_CURVE = "quadratic"
+MIN_TOP_SPEED = 5  # mph; below this the top speed is not set properly and the fan stays off
 
 # --- Connect to BeamNG telemetry ---
 def connect_to_beamng(port=4444):
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind(("0.0.0.0", port))
+    sock = activated_socket()  # Already bound by fan_control.socket under systemd
+    if sock is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("0.0.0.0", port))
     sock.settimeout(1.0)
     return sock
 
-# --- Parse BeamNG vehicle speed from telemetry ---
+# --- Parse BeamNG vehicle speed from telemetry (binary or JSON) ---
+_sample = TelemetrySample()
+
 def get_vehicle_speed_mph(data):
-    try:
-        telemetry = json.loads(data.decode("utf-8"))
-        velocity = telemetry["vel"]  # vel = [x, y, z] in m/s
-        speed_mps = (velocity[0] ** 2 + velocity[1] ** 2 + velocity[2] ** 2) ** 0.5
-        return speed_mps * 2.237  # m/s → mph
-    except (KeyError, json.JSONDecodeError):
-        return 0
+    if not decode_into(_sample, data, len(data)):
+        return None  # Not telemetry
+    return _sample.speed_mph()  # |vel| in m/s → mph
 
 # --- MAIN LOOP ---
 def main():
     print("Starting fan control system...")
     sock = connect_to_beamng()
+    config = SharedConfigReader()  # Shared memory written by wind_server.py, even from another process
+    log = RingLogger()  # Formats and writes to stdout/journald off the loop
+    curve = compile_curve(WIND_CURVE, config.top_speed)
+    # Per-stage latency histograms and counters, published once a second for the
+    # wind server's /metrics endpoint. recvfrom() blocks until the game sends, so
+    # there is no receive stage; end to end runs from the datagram to its power.
+    metrics = PipelineMetrics()
+    parse_latency, curve_latency, end_to_end_latency = (
+        metrics.stage(name) for name in ("parse", "curve", "end_to_end"))
+    next_publish = time.monotonic() + 1.0
+    notify_ready()
 
     while True:
         try:
             data, _ = sock.recvfrom(1024)
+            t0 = time.perf_counter()
             current_speed_mph = get_vehicle_speed_mph(data)
-            top_speed = get_top_speed()  # From Flask web app
+            t1 = time.perf_counter()
+            parse_latency.observe(t1 - t0)
+            seq = _sample.seq
+            if current_speed_mph is None:
+                metrics.decode_errors += 1
+                current_speed_mph, seq = 0, None
+            metrics.count_packets(1, 0, seq)
+            if config.refresh():  # One memory load unless the web app changed something
+                curve = curve.with_top_speed(config.top_speed)
+            top_speed = config.top_speed
 
-            power = calculate_motor_power(current_speed_mph, top_speed)
+            t1 = time.perf_counter()
+            power = curve(current_speed_mph) if top_speed >= MIN_TOP_SPEED else 0
+            t2 = time.perf_counter()
+            curve_latency.observe(t2 - t1)
+            end_to_end_latency.observe(t2 - t0)
 
             # --- Send power to fan motor ---
-            print(f"Speed: {current_speed_mph:.1f} mph | Top Speed: {top_speed:.1f} mph | Fan Power: {power:.1f}%")
+            # Every 20th packet (~1 line per second at 20 Hz)
+            log.sampled("packet", 20, "Speed: %.1f mph | Top Speed: %.1f mph | Fan Power: %.1f%%",
+                        current_speed_mph, top_speed, power)
             # Here, replace with actual motor control code e.g. PWM output
 
         except socket.timeout:
-            print("Waiting for data from BeamNG...")
+            log.rate_limited("timeout", 5.0, "Waiting for data from BeamNG...")
         except KeyboardInterrupt:
-            print("Exiting...")
+            log.log("Exiting...")
+            log.close()
             break
 
+        if time.monotonic() >= next_publish:
+            next_publish = time.monotonic() + 1.0
+            metrics.publish()
         time.sleep(0.05)  # Smooth updates ~20 Hz
 
 if __name__ == "__main__":
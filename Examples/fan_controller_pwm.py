@@ -1,55 +1,255 @@
 
 import time
-import socket
-import json
-import RPi.GPIO as GPIO
+STARTED = time.monotonic()  # Before the imports below, for the time-to-first-PWM-write report
+from control_loop import FixedRateScheduler
+from config_http import ConfigHTTPServer
+from metrics import PipelineMetrics
+from pwm_backends import open_pwm
+from pwm_output import OutputStage
+from receiver_process import ReceiverProcess, pin_to_cpu
+from ring_log import RingLogger
+from sample_ring import SampleRing, default_ring_path
+from sd_daemon import activated_socket, notify_ready, process_age
+from sender_control import SenderConfigBroadcaster
+from sender_streams import StreamDemux, StreamSelector, StreamTable
+from shared_config import SharedConfigReader
+from speed_filter import make_speed_hold
+from udp_receiver import DrainingReceiver, open_telemetry_socket
+from wind_channels import ChannelBank, open_channel_pwms
+from wind_config import ConfigStore
+from wind_curve import compile_curve
 
 PWM_PIN = 18
 FREQUENCY = 1000
+# "pigpio" or "sysfs" for jitter-free hardware PWM, "gpio" for RPi.GPIO
+# software PWM, "mock" to run without hardware; "auto" picks the first that
+# works and stops with an error if none does. See pwm_backends.py (sysfs needs
+# PWM_CHIP / PWM_CHANNEL; auto only tries it when they are set).
+PWM_BACKEND = "auto"
+PWM_CHIP = None
+PWM_CHANNEL = None
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(PWM_PIN, GPIO.OUT)
-pwm = GPIO.PWM(PWM_PIN, FREQUENCY)
-pwm.start(0)
+# Several fans, each blowing with the wind from one direction in the car's
+# frame (headwind, crosswind in slides, ...); one dict per fan with its
+# "axis", "pin" (or sysfs "chip" / "channel") and optionally its own "curve",
+# "top_speed" and "max_power". None drives a single fan on PWM_PIN with the
+# forward speed. Each fan needs an output of its own; a Pi 1-4 has two
+# hardware PWM channels, so three fans need PWM_BACKEND = "gpio" (or a Pi 5
+# with sysfs). See wind_channels.py; needs numpy. For example:
+#   CHANNELS = [
+#       {"name": "center", "pin": 18, "axis": "forward"},
+#       {"name": "left", "pin": 23, "axis": "left", "top_speed": 40},
+#       {"name": "right", "pin": 24, "axis": "right", "top_speed": 40},
+#   ]
+CHANNELS = None
+
+if CHANNELS is None:
+    pwms = [open_pwm(PWM_BACKEND, PWM_PIN, FREQUENCY, PWM_CHIP, PWM_CHANNEL)]
+else:
+    pwms = open_channel_pwms(CHANNELS, PWM_BACKEND, FREQUENCY)
+pwm = pwms[0]
+print(f"PWM backend: {pwm.name}" + (f" ({len(pwms)} channels)" if CHANNELS is not None else ""))
+# Deadband, write-rate and slew limits between the curve and the hardware
+output = OutputStage(pwm.set_duty_cycle)
 
 UDP_IP = ""
 UDP_PORT = 4444
+CONTROL_RATE_HZ = 100  # Fixed PWM update rate, independent of packet arrival
+
+# Serve the config UI/API (config_http.py) from this process on
+# CONFIG_HTTP_PORT. The full config (top speed, curve, PWM deadband and rate
+# limits, main.lua rate control) is kept in wind_config.json and survives
+# restarts. Set to None (or start wind_server.py first, which takes the port)
+# to use the separate wind_server.py process instead; top speed and sender
+# settings then come through shared memory.
+CONFIG_HTTP_PORT = 5000
 
 top_speed = 150  # Default top speed, can be set from web server
+# Realistic wind curve mapping: linear from 0 to top_speed -> 0-100% PWM.
+# See wind_curve.py for quadratic, cubic (fan law), piecewise and custom curves.
+WIND_CURVE = "linear"
+
+store = config = None
+if CONFIG_HTTP_PORT is not None:
+    store = ConfigStore()
+    try:
+        ConfigHTTPServer(store, port=CONFIG_HTTP_PORT).start_in_thread()
+    except OSError as e:
+        print(f"Config server not started ({e}); taking config from wind_server.py")
+        store = None
+    else:
+        print(f"Config UI at http://0.0.0.0:{CONFIG_HTTP_PORT}, saved to {store.path}")
+        top_speed, WIND_CURVE = store.config.top_speed, store.config.curve
+if store is None:
+    config = SharedConfigReader(default_top_speed=top_speed)  # Shared memory written by wind_server.py
+applied = None  # Config snapshot in effect; swapped in whole by the config server
+curve = compile_curve(WIND_CURVE, top_speed)
+# All fans evaluated in one vectorised step per tick; replaces curve and output when set
+channels = None
+if CHANNELS is not None:
+    channels = ChannelBank(CHANNELS, [p.set_duty_cycle for p in pwms], top_speed, WIND_CURVE)
+
+# With several BeamMP players sending to this port, each sender gets its own
+# stream and one of them drives the fan: "sticky" (stay with the current
+# player until they stop sending), "fastest", or "pinned" to DRIVING_SENDER
+# (a sender ID, "ip" or "ip:port"). See sender_streams.py.
+STREAM_POLICY = "sticky"
+DRIVING_SENDER = None
 
-def calculate_motor_power(current_speed):
-    # Realistic wind curve mapping
-    # Map 0-250 mph game speed to 0-70 mph real wind speed
-    # Use a curve that maps linear real wind speed from 0-70 mph
-    # and scales motor power PWM accordingly (0-100%)
-    max_game_speed = top_speed
-    max_real_wind = 70
+# Speed filter ("none", "ema", "one_euro", "kalman") and lead in seconds: the
+# fan is commanded for the speed LEAD_SECONDS ahead, to make up for its
+# spin-up time. See speed_filter.py; benchmarks/filter_lag.py shows the lag
+# and smoothing of each option. A lead needs a filter ("none" with a lead is
+# rejected), or noise is amplified.
+SPEED_FILTER = "none"
+LEAD_SECONDS = 0.0
 
-    # Convert game speed to real wind speed linearly
-    real_wind_speed = (current_speed / max_game_speed) * max_real_wind
-    motor_power = (real_wind_speed / max_real_wind) * 100
-    motor_power = max(0, min(100, motor_power))
-    return motor_power
+# Receive and decode telemetry in a separate process (receiver_process.py)
+# that hands samples over through a lock-free shared-memory ring, so the
+# control loop never waits on the network or shares the GIL with parsing.
+# CONTROL_CPU / RECEIVER_CPU pin the control loop and the receiver to a core
+# (None: no pinning; e.g. 3 and 2 on a Pi 4, whose CPUs are 0-3).
+RECEIVER_PROCESS = False
+CONTROL_CPU = None
+RECEIVER_CPU = None
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((UDP_IP, UDP_PORT))
-sock.settimeout(0.1)
+# Under fan_control.socket, systemd has already bound the port and keeps it
+# bound across restarts; otherwise bind it here
+sock = activated_socket()
+socket_activated = sock is not None
+if sock is None:
+    sock = open_telemetry_socket(UDP_IP, UDP_PORT)
+receiver = DrainingReceiver(sock)
+ring = receiver_process = None
+ring_skipped = 0
+if RECEIVER_PROCESS:
+    ring = SampleRing(default_ring_path(), create=True)
+    receiver_process = ReceiverProcess(sock, ring, RECEIVER_CPU).start()
+# Newest speed (filtered, if configured), extrapolated on ticks where the packet is late
+speed_hold = make_speed_hold(SPEED_FILTER, LEAD_SECONDS)
+streams = StreamTable()
+demux = StreamDemux(streams, StreamSelector(STREAM_POLICY, DRIVING_SENDER), speed_hold, channels=channels)
+# Passes the wind server's send rate / change threshold / keepalive to every main.lua sender
+sender_config = SenderConfigBroadcaster(sock.sendto, streams)
+scheduler = FixedRateScheduler(CONTROL_RATE_HZ)
+next_report = time.monotonic() + 1.0
+
+# Per-stage latency histograms and counters, published once a second for the
+# wind server's /metrics endpoint
+metrics = PipelineMetrics()
+receive_latency, parse_latency, curve_latency, pwm_latency, end_to_end_latency = (
+    metrics.stage(name) for name in ("receive", "parse", "curve", "pwm_write", "end_to_end"))
+log = RingLogger()  # Formats and writes to stdout/journald off the control loop
+notify_ready(f"Listening on UDP port {sock.getsockname()[1]}" + (" (socket-activated)" if socket_activated else "")
+             + (" in a receiver process" if receiver_process is not None else ""))
+# After the helper threads (logger, config server) have started, so only the
+# control loop is pinned
+if pin_to_cpu(CONTROL_CPU):
+    print(f"Control loop pinned to CPU {CONTROL_CPU}")
 
 try:
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
-            telemetry = json.loads(data.decode())
-            vel = telemetry.get("vel", [0,0,0])
-            speed = (vel[1] * 2.237)  # Convert m/s to mph (assuming y axis is forward)
-            power = calculate_motor_power(speed)
-            pwm.ChangeDutyCycle(power)
-            print(f"Speed: {speed:.2f} mph, PWM power: {power:.2f}%")
-        except socket.timeout:
-            pass
+            # Wait for telemetry only until the next control tick is due, then
+            # drain the queue; each datagram updates its sender's stream, and
+            # the selected stream's newest speed goes into the hold
+            if ring is not None:
+                # The receiver process does the waiting and decoding; take
+                # everything it queued at the start of the tick
+                time.sleep(scheduler.time_until_tick())
+                ring.drain(demux.handle_sample, demux.sample)
+            elif receiver.wait(scheduler.time_until_tick()):
+                demux.parse_time = 0.0
+                t0 = time.perf_counter()
+                if receiver.drain_each(demux.handle):
+                    elapsed = time.perf_counter() - t0
+                    receive_latency.observe(elapsed - demux.parse_time)
+                    parse_latency.observe(demux.parse_time)
+            if not scheduler.due():
+                continue
+
+            now = scheduler.begin_tick()
+            if demux.select(now):
+                log.log("Fan now driven by %s (%d streams)", demux.selected_name(), len(streams))
+            if store is not None:
+                if store.snapshot is not applied:  # One attribute load unless the config changed
+                    applied = store.snapshot
+                    version, wind = applied
+                    top_speed = wind.top_speed
+                    if curve.kind != wind.curve or curve.top_speed != top_speed:
+                        curve = compile_curve(wind.curve, top_speed)
+                    output.configure(wind.deadband, wind.max_write_hz, wind.slew_rate)
+                    if channels is not None:
+                        channels.set_curve(wind.curve, top_speed)
+                        channels.configure(wind.deadband, wind.max_write_hz, wind.slew_rate)
+                    if sender_config.update(wind.sender):
+                        sender_config.tick(now)
+                    log.log("Config version %d: %s", version, wind)
+            elif config.refresh():  # One memory load unless the web app changed something
+                top_speed = config.top_speed
+                curve = curve.with_top_speed(top_speed)  # Recompile the lookup table
+                if channels is not None:
+                    channels.set_curve(curve.kind, top_speed)
+                if config.sender is not None and sender_config.update(config.sender):
+                    sender_config.tick(now)
+            speed = speed_hold.read(now)
+            t0 = time.perf_counter()
+            if channels is None:
+                power = curve(speed)
+                t1 = time.perf_counter()
+                curve_latency.observe(t1 - t0)
+                wrote = output.update(power, now)
+            else:
+                wrote = channels.step(now)  # Curves, limits and writes for every fan at once
+                t1 = t0
+            if wrote:
+                t2 = time.perf_counter()
+                pwm_latency.observe(t2 - t1)
+                if demux.arrival is not None:
+                    end_to_end_latency.observe(t2 - demux.arrival)
+                if (output if channels is None else channels).writes == wrote:  # The first write(s)
+                    age = process_age()  # Includes interpreter startup; None off Linux
+                    metrics.startup_seconds = age if age is not None else time.monotonic() - STARTED
+                    log.log("First PWM write %.0f ms after process start (%.0f ms after imports began)",
+                            metrics.startup_seconds * 1000, (time.monotonic() - STARTED) * 1000)
+            demux.arrival = None
+            scheduler.end_tick()
+
+            if now >= next_report:
+                next_report += 1.0
+                streams.evict_idle(now)
+                sender_config.tick(now)  # New senders, plus a periodic refresh for all
+                if receiver_process is not None:
+                    if receiver_process.ensure_running():
+                        log.log("Receiver process exited; restarted (%d restarts)", receiver_process.restarts)
+                    demux.decode_errors = ring.decode_errors
+                    if ring.skipped != ring_skipped:
+                        ring_skipped = ring.skipped
+                        log.log("Control loop fell behind the sample ring: %d oldest samples skipped in total",
+                                ring_skipped)
+                metrics.count_streams(demux)
+                stage = output if channels is None else channels
+                metrics.pwm_writes, metrics.pwm_suppressed = stage.writes, stage.suppressed
+                metrics.publish()
+                if channels is not None:
+                    log.log("Speed: %.2f mph, fans: %s | %d packets | %d streams, driven by %s | "
+                            "%d writes / %d suppressed | %s (%d log lines dropped)",
+                            speed, channels.describe(), demux.packets, len(streams), demux.selected_name(),
+                            channels.writes, channels.suppressed, scheduler.report(), log.dropped)
+                else:
+                    log.log("Speed: %.2f mph, PWM power: %.2f%% (target %.2f%%) | "
+                            "%d packets, %d stale skipped, %d extrapolated | %d streams, driven by %s | "
+                            "%d writes / %d suppressed | %s (%d log lines dropped)",
+                            speed, output.value, power,
+                            demux.packets, demux.skipped, speed_hold.extrapolated, len(streams), demux.selected_name(),
+                            output.writes, output.suppressed, scheduler.report(), log.dropped)
         except Exception as e:
-            print("Error:", e)
-        time.sleep(0.02)
+            log.rate_limited("error", 1.0, "Error: %s", e)
 finally:
-    pwm.stop()
-    GPIO.cleanup()
+    if receiver_process is not None:
+        receiver_process.stop()
+        ring.close()
+    log.close()
+    sock.close()
+    for pwm in pwms:
+        pwm.close()
@@ -0,0 +1,200 @@
+
+import os
+import tempfile
+import time
+from bisect import bisect_left
+
+# Low-overhead pipeline metrics for the fan controllers.
+#
+# Each stage of the telemetry-to-PWM path (receive, parse, curve, PWM write,
+# and end to end from packet arrival to the PWM write that used it) is timed
+# into a fixed-bucket histogram: recording a sample is a bisect over ~20
+# bounds and two additions, no allocation. Counters track packets, stale
+# packets skipped by draining, sequence gaps (packets lost on the network),
+# decode errors and, with several senders, the per-sender stream table.
+#
+# The controller runs in its own process, so once a second it renders the
+# metrics in the Prometheus text format into METRICS_PATH (written to a temp
+# file and renamed, so readers never see a partial file). wind_server.py and
+# wind_server_for_sim.py serve that file at /metrics.
+
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+METRICS_PATH = os.path.join(_SHM_DIR, "altus_ventus_metrics.prom")
+PREFIX = "altus_ventus"
+
+# Bucket upper bounds in seconds: 10 us doubling up to ~5 s
+BUCKET_BOUNDS = tuple(10e-6 * 2 ** i for i in range(20))
+
+STAGES = ("receive", "parse", "curve", "pwm_write", "end_to_end")
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile `q` (0-1); max for the top bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKET_BOUNDS[i], self.max) if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+class PipelineMetrics:
+    def __init__(self, path=METRICS_PATH):
+        self.path = path
+        self.stages = {name: LatencyHistogram() for name in STAGES}
+        self.packets = 0         # Datagrams read from the socket
+        self.stale_skipped = 0   # Older datagrams dropped by drain-to-latest
+        self.seq_gaps = 0        # Packets missing from the sender's sequence
+        self.decode_errors = 0
+        self.pwm_writes = 0
+        self.pwm_suppressed = 0
+        self.streams_active = 0  # Sender streams in the table (sender_streams.py)
+        self.streams_evicted = 0
+        self.streams_rejected = 0
+        self.started = time.monotonic()
+        self.startup_seconds = None  # Process start to first PWM write, once it happened
+        self._last_seq = None
+        self._rate_packets = 0
+        self._rate_time = self.started
+        self.packet_rate = 0.0   # Packets per second over the last publish interval
+
+    def stage(self, name):
+        return self.stages[name]
+
+    def count_drain(self, receiver, decoded, seq=None):
+        """Record one DrainingReceiver.drain() whose newest packet did (not) decode."""
+        if not decoded:
+            self.decode_errors += 1
+            seq = None
+        self.count_packets(receiver.last_skipped + 1, receiver.last_skipped, seq)
+
+    def count_packets(self, received, skipped, seq=None):
+        """Record one drain: `received` datagrams, `skipped` of them stale, newest with `seq`."""
+        self.packets += received
+        self.stale_skipped += skipped
+        if seq is not None:
+            if self._last_seq is not None:
+                gap = ((seq - self._last_seq) & 0xFFFFFFFF) - 1 - skipped
+                if 0 < gap < 0x80000000:  # Ignore sender restarts and reordering
+                    self.seq_gaps += gap
+            self._last_seq = seq
+
+    def count_streams(self, demux):
+        """Take the counters from a sender_streams.StreamDemux, which tracks sequences per stream."""
+        table = demux.table
+        self.packets = demux.packets
+        self.stale_skipped = demux.skipped
+        self.decode_errors = demux.decode_errors
+        self.seq_gaps = table.seq_gaps
+        self.streams_active = len(table)
+        self.streams_evicted = table.evicted
+        self.streams_rejected = table.rejected
+
+    def render(self):
+        now = time.monotonic()
+        lines = []
+        counters = (
+            ("packets_total", "Telemetry datagrams received", self.packets),
+            ("stale_skipped_total", "Stale datagrams dropped in favour of newer ones", self.stale_skipped),
+            ("sequence_gaps_total", "Datagrams missing from the sender sequence", self.seq_gaps),
+            ("decode_errors_total", "Datagrams that were neither binary nor JSON telemetry", self.decode_errors),
+            ("pwm_writes_total", "PWM duty cycle writes issued", self.pwm_writes),
+            ("pwm_suppressed_total", "PWM changes held back by deadband or rate limit", self.pwm_suppressed),
+            ("streams_evicted_total", "Sender streams evicted after going idle", self.streams_evicted),
+            ("streams_rejected_total", "Datagrams from new senders dropped because the stream table was full",
+             self.streams_rejected),
+        )
+        for name, help_text, value in counters:
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} counter")
+            lines.append(f"{PREFIX}_{name} {value}")
+        lines.append(f"# HELP {PREFIX}_packet_rate Telemetry datagrams per second")
+        lines.append(f"# TYPE {PREFIX}_packet_rate gauge")
+        lines.append(f"{PREFIX}_packet_rate {self.packet_rate:.1f}")
+        lines.append(f"# HELP {PREFIX}_streams_active Sender streams currently tracked")
+        lines.append(f"# TYPE {PREFIX}_streams_active gauge")
+        lines.append(f"{PREFIX}_streams_active {self.streams_active}")
+        lines.append(f"# HELP {PREFIX}_uptime_seconds Seconds since the controller started")
+        lines.append(f"# TYPE {PREFIX}_uptime_seconds gauge")
+        lines.append(f"{PREFIX}_uptime_seconds {now - self.started:.1f}")
+        if self.startup_seconds is not None:
+            lines.append(f"# HELP {PREFIX}_startup_seconds Seconds from process start to the first PWM write")
+            lines.append(f"# TYPE {PREFIX}_startup_seconds gauge")
+            lines.append(f"{PREFIX}_startup_seconds {self.startup_seconds:.3f}")
+
+        name = f"{PREFIX}_stage_latency_seconds"
+        lines.append(f"# HELP {name} Time spent per pipeline stage")
+        lines.append(f"# TYPE {name} histogram")
+        for stage, hist in self.stages.items():
+            cumulative = 0
+            for bound, n in zip(BUCKET_BOUNDS, hist.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {hist.sum:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+        summary = f"{PREFIX}_stage_latency_summary_seconds"
+        lines.append(f"# HELP {summary} p50/p99 (bucket upper bound) per pipeline stage")
+        lines.append(f"# TYPE {summary} gauge")
+        for stage, hist in self.stages.items():
+            lines.append(f'{summary}{{stage="{stage}",quantile="0.5"}} {hist.quantile(0.5):.6g}')
+            lines.append(f'{summary}{{stage="{stage}",quantile="0.99"}} {hist.quantile(0.99):.6g}')
+        maximum = f"{PREFIX}_stage_latency_max_seconds"
+        lines.append(f"# HELP {maximum} Longest time spent in each pipeline stage")
+        lines.append(f"# TYPE {maximum} gauge")
+        for stage, hist in self.stages.items():
+            lines.append(f'{maximum}{{stage="{stage}"}} {hist.max:.6g}')
+        return "\n".join(lines) + "\n"
+
+    def publish(self):
+        """Refresh the packet rate and atomically rewrite the metrics file."""
+        now = time.monotonic()
+        elapsed = now - self._rate_time
+        if elapsed > 0:
+            self.packet_rate = (self.packets - self._rate_packets) / elapsed
+        self._rate_packets, self._rate_time = self.packets, now
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(self.render())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Could not write metrics to {self.path}: {e}")
+
+
+def _controller_up(up):
+    return (f"# HELP {PREFIX}_controller_up 1 if the controller published metrics in the last 5 seconds\n"
+            f"# TYPE {PREFIX}_controller_up gauge\n"
+            f"{PREFIX}_controller_up {up}\n")
+
+
+def read_metrics_file(path=METRICS_PATH):
+    """Metrics text for a /metrics endpoint, with the age of the controller's last publish."""
+    try:
+        with open(path) as f:
+            text = f.read()
+        age = time.time() - os.stat(path).st_mtime
+    except OSError:
+        return f"# Fan controller metrics not available yet ({path} missing)\n" + _controller_up(0)
+    return (f"{text}# HELP {PREFIX}_metrics_age_seconds Seconds since the controller last published\n"
+            f"# TYPE {PREFIX}_metrics_age_seconds gauge\n"
+            f"{PREFIX}_metrics_age_seconds {age:.1f}\n" + _controller_up(1 if age < 5 else 0))
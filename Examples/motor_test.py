@@ -1,26 +1,30 @@
 
-import RPi.GPIO as GPIO
+import argparse
 import time
+from pwm_backends import DEFAULT_FREQUENCY, DEFAULT_PIN, PWM_BACKENDS, open_pwm
 
-PWM_PIN = 18
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(PWM_PIN, GPIO.OUT)
+parser = argparse.ArgumentParser(description="Sweep the fan from 0 to 100% PWM and back")
+parser.add_argument("--backend", choices=PWM_BACKENDS, default="auto", help="PWM driver (see pwm_backends.py)")
+parser.add_argument("--pin", type=int, default=DEFAULT_PIN, help="BCM GPIO pin")
+parser.add_argument("--frequency", type=int, default=DEFAULT_FREQUENCY, help="PWM frequency (Hz)")
+parser.add_argument("--chip", type=int, help="pwmchip number for the sysfs backend (default 0)")
+parser.add_argument("--channel", type=int, help="PWM channel for the sysfs backend (default 0)")
+args = parser.parse_args()
 
-pwm = GPIO.PWM(PWM_PIN, 1000)
-pwm.start(0)
+pwm = open_pwm(args.backend, args.pin, args.frequency, args.chip, args.channel)
+print(f"PWM backend: {pwm.name}")
 
 try:
     while True:
         for dc in range(0, 101, 5):
-            pwm.ChangeDutyCycle(dc)
+            pwm.set_duty_cycle(dc)
             print(f"PWM duty cycle: {dc}%")
             time.sleep(0.1)
         for dc in range(100, -1, -5):
-            pwm.ChangeDutyCycle(dc)
+            pwm.set_duty_cycle(dc)
             print(f"PWM duty cycle: {dc}%")
             time.sleep(0.1)
 except KeyboardInterrupt:
     pass
 
-pwm.stop()
-GPIO.cleanup()
+pwm.close()
@@ -0,0 +1,187 @@
+
+import os
+import time
+from collections import deque
+
+# PWM drivers behind one interface, so the controllers do not care what
+# generates the signal:
+#
+#   pigpio   hardware-timed PWM through the pigpio daemon (sudo pigpiod);
+#            only on the PWM-capable pins GPIO12/13/18/19, and not on the Pi 5
+#   sysfs    the kernel PWM driver, /sys/class/pwm/pwmchipN (enable with
+#            dtoverlay=pwm in config.txt; GPIO18 is pwmchip0 channel 0 on a
+#            Pi 4 and pwmchip2 channel 2 on a Pi 5); also hardware-timed
+#   gpio     RPi.GPIO software PWM: works on any pin, but a busy CPU makes the
+#            pulses jitter
+#   mock     nothing is driven; every write is recorded with a timestamp, so
+#            simulations and tests run the real output path off-Pi
+#
+# Every backend has set_duty_cycle(power) with power in percent (0-100),
+# which is what pwm_output.OutputStage calls, close(), which stops the
+# output, and `output`, the physical output it drives (None for the mock), so
+# callers opening several can tell when two would drive the same one. open_pwm("auto") takes the first hardware backend that works and
+# raises if there is none: a controller meant to drive a fan must not start
+# (and report ready to systemd) without one, so the mock is only used when
+# asked for by name. auto only tries sysfs with an explicit chip / channel,
+# since which pin they drive differs between Pi models.
+
+DEFAULT_PIN = 18
+DEFAULT_FREQUENCY = 1000   # Hz
+PWM_BACKENDS = ("auto", "pigpio", "sysfs", "gpio", "mock")
+HARDWARE_PWM_PINS = (12, 13, 18, 19)
+HARDWARE_PWM_CHANNEL = {12: 0, 18: 0, 13: 1, 19: 1}  # Pins on one channel carry the same signal
+SYSFS_PWM_ROOT = "/sys/class/pwm"
+EXPORT_TIMEOUT = 1.0       # Seconds to wait for udev to make an exported channel writable
+MOCK_MAX_RECORDS = 100_000
+
+
+def _clamp(power):
+    return 0.0 if power < 0.0 else 100.0 if power > 100.0 else power
+
+
+class GPIOBackend:
+    name = "gpio"
+
+    def __init__(self, pin=DEFAULT_PIN, frequency=DEFAULT_FREQUENCY):
+        import RPi.GPIO as GPIO
+        self._gpio = GPIO
+        self.pin = pin
+        self.output = ("gpio", pin)
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(pin, GPIO.OUT)
+        self._pwm = GPIO.PWM(pin, frequency)
+        self._pwm.start(0)
+
+    def set_duty_cycle(self, power):
+        self._pwm.ChangeDutyCycle(_clamp(power))
+
+    def close(self):
+        self._pwm.stop()
+        self._gpio.cleanup(self.pin)
+
+
+class PigpioBackend:
+    name = "pigpio"
+
+    def __init__(self, pin=DEFAULT_PIN, frequency=DEFAULT_FREQUENCY):
+        import pigpio
+        if pin not in HARDWARE_PWM_PINS:
+            raise ValueError(f"GPIO{pin} has no hardware PWM; use one of {HARDWARE_PWM_PINS}")
+        self._pi = pigpio.pi()
+        if not self._pi.connected:
+            raise RuntimeError("pigpio daemon is not running (start it with: sudo pigpiod)")
+        self.pin = pin
+        self.output = ("pwm", HARDWARE_PWM_CHANNEL[pin])
+        self.frequency = frequency
+        self._pi.hardware_PWM(pin, frequency, 0)
+
+    def set_duty_cycle(self, power):
+        # pigpio takes the duty cycle in millionths
+        self._pi.hardware_PWM(self.pin, self.frequency, int(_clamp(power) * 10_000))
+
+    def close(self):
+        self._pi.hardware_PWM(self.pin, 0, 0)
+        self._pi.stop()
+
+
+class SysfsBackend:
+    name = "sysfs"
+
+    def __init__(self, chip=0, channel=0, frequency=DEFAULT_FREQUENCY, root=SYSFS_PWM_ROOT):
+        chip_dir = os.path.join(root, f"pwmchip{chip}")
+        if not os.path.isdir(chip_dir):
+            raise OSError(f"{chip_dir} not found (is dtoverlay=pwm enabled?)")
+        self._chip_dir = chip_dir
+        self.channel = channel
+        self.output = ("sysfs", chip, channel)
+        self._dir = os.path.join(chip_dir, f"pwm{channel}")
+        self._exported = False
+        if not os.path.isdir(self._dir):
+            self._write(os.path.join(chip_dir, "export"), channel)
+            self._exported = True
+            self._wait_writable()
+        self.period_ns = round(1e9 / frequency)
+        self._attr("duty_cycle", 0)  # The duty cycle may never exceed the period, old or new
+        self._attr("period", self.period_ns)
+        self._attr("enable", 1)
+        # Kept open: a write is a single pwrite() on the hot path
+        self._duty_fd = os.open(os.path.join(self._dir, "duty_cycle"), os.O_WRONLY)
+
+    @staticmethod
+    def _write(path, value):
+        with open(path, "w") as f:
+            f.write(str(value))
+
+    def _attr(self, name, value):
+        self._write(os.path.join(self._dir, name), value)
+
+    def _wait_writable(self):
+        path = os.path.join(self._dir, "period")
+        deadline = time.monotonic() + EXPORT_TIMEOUT
+        while not os.access(path, os.W_OK):
+            if time.monotonic() >= deadline:
+                raise OSError(f"{path} did not become writable")
+            time.sleep(0.01)
+
+    def set_duty_cycle(self, power):
+        os.pwrite(self._duty_fd, b"%d" % (self.period_ns * _clamp(power) // 100), 0)
+
+    def close(self):
+        try:
+            self.set_duty_cycle(0)
+            self._attr("enable", 0)
+        finally:
+            os.close(self._duty_fd)
+            if self._exported:
+                self._write(os.path.join(self._chip_dir, "unexport"), self.channel)
+
+
+class MockBackend:
+    name = "mock"
+    output = None
+
+    def __init__(self, clock=time.monotonic, max_records=MOCK_MAX_RECORDS):
+        self.clock = clock
+        self.writes = deque(maxlen=max_records)  # (timestamp, power), oldest first
+        self.count = 0      # Writes since start, including those dropped from `writes`
+        self.value = 0.0
+        self.closed = False
+
+    def set_duty_cycle(self, power):
+        self.value = _clamp(power)
+        self.writes.append((self.clock(), self.value))
+        self.count += 1
+
+    def close(self):
+        self.set_duty_cycle(0)
+        self.closed = True
+
+
+def open_pwm(backend="auto", pin=DEFAULT_PIN, frequency=DEFAULT_FREQUENCY, chip=None, channel=None):
+    """Open a PWM backend by name (see PWM_BACKENDS).
+
+    "sysfs" defaults to pwmchip0 channel 0. "auto" tries pigpio, sysfs (only
+    if `chip` or `channel` is given) and RPi.GPIO in that order, and raises
+    RuntimeError when none of them works.
+    """
+    if backend == "pigpio":
+        return PigpioBackend(pin, frequency)
+    if backend == "sysfs":
+        return SysfsBackend(chip or 0, channel or 0, frequency)
+    if backend == "gpio":
+        return GPIOBackend(pin, frequency)
+    if backend == "mock":
+        return MockBackend()
+    if backend != "auto":
+        raise ValueError(f"Unknown PWM backend {backend!r}; expected one of {PWM_BACKENDS}")
+    errors = []
+    for name in ("pigpio", "sysfs", "gpio"):
+        if name == "sysfs" and chip is None and channel is None:
+            continue  # pwmchip0 / pwm0 is not necessarily `pin`
+        try:
+            return open_pwm(name, pin, frequency, chip, channel)
+        except (ImportError, OSError, RuntimeError, ValueError) as e:
+            print(f"PWM backend {name} unavailable: {e}")
+            errors.append(f"{name}: {e}")
+    raise RuntimeError(f"No PWM backend could drive GPIO{pin} ({'; '.join(errors)}); "
+                       f"use the \"mock\" backend to run without a fan")
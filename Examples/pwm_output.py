@@ -0,0 +1,88 @@
+
+import time
+
+# Output stage between the wind curve and the PWM driver.
+#
+# Telemetry arrives at the game's frame rate, but a fan cannot follow (and
+# cheap motor controllers audibly hunt on) a new duty cycle every few
+# milliseconds. The stage:
+#   - slews: moves the output towards the target by at most `slew_rate`
+#     percent per second,
+#   - applies a deadband: skips writes that change the duty cycle by less than
+#     `deadband` percent (reaching exactly 0 or max_power is always written, so
+#     the fan can fully stop),
+#   - rate-limits: issues at most `max_write_hz` hardware writes per second.
+# A change held back by the rate limit is written once the interval has
+# passed, so call tick() periodically (or keep calling update()). A change
+# smaller than the deadband is not written at all until the target moves a
+# full deadband away from the written value or reaches 0 or max_power; the
+# fan then stays up to `deadband` percent off the curve.
+
+DEFAULT_DEADBAND = 0.5      # % duty cycle
+DEFAULT_MAX_WRITE_HZ = 50   # Hardware writes per second
+DEFAULT_SLEW_RATE = 250.0   # % per second; 0 -> 100 % in 0.4 s
+
+
+class OutputStage:
+    def __init__(self, write, deadband=DEFAULT_DEADBAND, max_write_hz=DEFAULT_MAX_WRITE_HZ,
+                 slew_rate=DEFAULT_SLEW_RATE, max_power=100.0, clock=time.monotonic):
+        """`write(power)` performs the hardware write, e.g. pwm.ChangeDutyCycle.
+        Pass None for `max_write_hz` or `slew_rate` to disable that limit."""
+        self.write = write
+        self.deadband = deadband
+        self.min_interval = 1.0 / max_write_hz if max_write_hz else 0.0
+        self.slew_rate = slew_rate
+        self.max_power = max_power
+        self.clock = clock
+        self.target = 0.0     # Latest requested power
+        self.value = 0.0      # Slew-limited power
+        self.written = None   # Last power sent to the hardware
+        self.writes = 0       # Hardware writes issued
+        self.suppressed = 0   # Requested targets held back by the deadband or rate limit, once per target
+        self._held_target = None  # Target last counted as suppressed; ticks re-requesting it are not counted
+        self._last_update = None
+        self._last_write = float("-inf")
+
+    def configure(self, deadband, max_write_hz, slew_rate):
+        """Change the limits in place (e.g. from wind_config.WindConfig); 0 or None disables a limit."""
+        self.deadband = deadband
+        self.min_interval = 1.0 / max_write_hz if max_write_hz else 0.0
+        self.slew_rate = slew_rate
+
+    def update(self, target, now=None):
+        """Request `target` power; returns True if a hardware write was issued."""
+        if now is None:
+            now = self.clock()
+        self.target = requested = target
+        if self._last_update is None:
+            self._last_update = now  # Slew from the initial value, starting now
+        if self.slew_rate:
+            step = self.slew_rate * (now - self._last_update)
+            if target > self.value + step:
+                target = self.value + step
+            elif target < self.value - step:
+                target = self.value - step
+        self.value = target
+        self._last_update = now
+
+        written = self.written
+        if written is not None:
+            delta = abs(target - written)
+            if delta == 0.0:
+                return False  # Nothing to do; not counted as suppressed
+            at_limit = target <= 0.0 or target >= self.max_power
+            if (delta < self.deadband and not at_limit) or now - self._last_write < self.min_interval:
+                if requested != self._held_target:
+                    self._held_target = requested
+                    self.suppressed += 1
+                return False
+        self.write(target)
+        self._held_target = None
+        self.written = target
+        self._last_write = now
+        self.writes += 1
+        return True
+
+    def tick(self, now=None):
+        """Advance slewing and flush a pending change with no new target."""
+        return self.update(self.target, now)
@@ -0,0 +1,117 @@
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from sample_ring import SampleRing
+from telemetry_protocol import TelemetrySample, decode_into
+from udp_receiver import DrainingReceiver
+
+# Optional receiver process: UDP receive and decode in a process of their own.
+#
+# In the single-process controller, receiving, JSON parsing, logging and the
+# PWM output share one GIL, and a burst of packets delays the control tick.
+# With RECEIVER_PROCESS set in fan_controller_pwm.py, this script (started by
+# ReceiverProcess) owns the blocking side of the telemetry socket: it waits
+# for datagrams, decodes them and appends the samples to a shared-memory
+# sample_ring.SampleRing. The controller process never waits on the network:
+# it sleeps until each tick, drains the ring and runs the streams, curve and
+# PWM output, and can be pinned to a core of its own (pin_to_cpu(); on a Pi,
+# also keep other work off that core with isolcpus=3 in /boot/cmdline.txt).
+#
+# The socket is passed as an inherited file descriptor, as systemd does for
+# socket activation (sd_daemon.py), so the controller keeps it for the
+# main.lua config replies and a restarted receiver starts on the same queue.
+# The receiver exits on its own when its parent goes away.
+
+PARENT_CHECK_INTERVAL = 1.0  # Seconds between checks that the controller is still running
+
+
+def pin_to_cpu(cpu):
+    """Pin the calling thread (and threads it starts later) to `cpu`; False where unsupported."""
+    if cpu is None or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not pin to CPU {cpu}: {e}")
+        return False
+    return True
+
+
+class ReceiverProcess:
+    def __init__(self, sock, ring, cpu=None):
+        """`sock` is the bound telemetry socket, `ring` the controller's SampleRing (create=True)."""
+        self.sock = sock
+        self.ring = ring
+        self.cpu = cpu
+        self.restarts = 0
+        self._process = None
+
+    def start(self):
+        fd = self.sock.fileno()
+        command = [sys.executable, os.path.abspath(__file__), "--fd", str(fd), "--ring", self.ring.path]
+        if self.cpu is not None:
+            command += ["--cpu", str(self.cpu)]
+        self._process = subprocess.Popen(command, pass_fds=(fd,))
+        return self
+
+    def alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def ensure_running(self):
+        """Restart the receiver if it exited; returns True if it had to."""
+        if self.alive():
+            return False
+        self.restarts += 1
+        self.start()
+        return True
+
+    def stop(self, timeout=2.0):
+        process, self._process = self._process, None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run(fd, ring_path, cpu=None):
+    pin_to_cpu(cpu)
+    sock = socket.socket(fileno=fd)
+    ring = SampleRing(ring_path)
+    receiver = DrainingReceiver(sock)
+    sample = TelemetrySample()
+    parent = os.getppid()
+
+    def handle(buf, nbytes, address):
+        arrival = time.perf_counter()
+        if not decode_into(sample, buf, nbytes):
+            ring.count_packet(decoded=False)
+            return
+        ring.count_packet()
+        ring.push(sample, address, time.monotonic(), arrival)
+
+    try:
+        while os.getppid() == parent:
+            if receiver.wait(PARENT_CHECK_INTERVAL):
+                receiver.drain_each(handle)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telemetry receiver process for fan_controller_pwm.py.")
+    parser.add_argument("--fd", type=int, required=True, help="Inherited telemetry socket file descriptor")
+    parser.add_argument("--ring", required=True, help="Path of the shared-memory sample ring")
+    parser.add_argument("--cpu", type=int, help="CPU to pin the receiver to")
+    args = parser.parse_args()
+    run(args.fd, args.ring, args.cpu)
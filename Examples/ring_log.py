@@ -0,0 +1,86 @@
+
+import sys
+import threading
+import time
+from collections import deque
+
+# Non-blocking logging for the controller hot loops.
+#
+# Under systemd, print() is a blocking write to journald at the packet rate.
+# RingLogger.log() instead appends the unformatted record (timestamp, format
+# string, args) to a bounded in-memory ring and returns; a background thread
+# formats and writes the records in batches. If the writer falls behind, the
+# oldest records are overwritten and counted as dropped rather than stalling
+# the loop.
+#
+#   log.log("Speed: %.2f mph", speed)             every call
+#   log.rate_limited("error", 1.0, "Error: %s", e)  at most once per second per key
+#   log.sampled("packet", 50, "Speed: %.2f", s)     every 50th call per key
+#   if log.due("summary", 1.0): log.log(...)        once-per-second summary lines
+
+DEFAULT_CAPACITY = 4096
+FLUSH_INTERVAL = 0.25  # Seconds between background flushes
+
+
+class RingLogger:
+    def __init__(self, stream=None, capacity=DEFAULT_CAPACITY, flush_interval=FLUSH_INTERVAL):
+        self.stream = stream if stream is not None else sys.stdout
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._ring = deque(maxlen=capacity)  # append/popleft are thread-safe
+        self._next_due = {}
+        self._counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ring-log", daemon=True)
+        self._thread.start()
+
+    def log(self, fmt, *args):
+        ring = self._ring
+        if len(ring) == ring.maxlen:
+            self.dropped += 1
+        ring.append((time.time(), fmt, args))
+
+    def due(self, key, interval):
+        """True at most once per `interval` seconds for each `key`."""
+        now = time.monotonic()
+        if now < self._next_due.get(key, 0.0):
+            return False
+        self._next_due[key] = now + interval
+        return True
+
+    def rate_limited(self, key, interval, fmt, *args):
+        if self.due(key, interval):
+            self.log(fmt, *args)
+
+    def sampled(self, key, every, fmt, *args):
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        if count % every == 0:
+            self.log(fmt, *args)
+
+    def _flush(self):
+        ring = self._ring
+        lines = []
+        while ring:
+            timestamp, fmt, args = ring.popleft()
+            try:
+                message = fmt % args if args else fmt
+            except (TypeError, ValueError) as e:
+                message = f"{fmt!r} {args!r} (bad log format: {e})"
+            lines.append(f"{time.strftime('%H:%M:%S', time.localtime(timestamp))} {message}\n")
+        if lines:
+            try:
+                self.stream.write("".join(lines))
+                self.stream.flush()
+            except (OSError, ValueError):  # Stream closed or broken pipe; nothing useful to do
+                pass
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+
+    def close(self):
+        """Stop the background thread after writing everything still queued."""
+        self._stop.set()
+        self._thread.join(timeout=2.0)
@@ -0,0 +1,228 @@
+
+import mmap
+import os
+import socket
+import struct
+import tempfile
+
+from telemetry_protocol import TelemetrySample
+
+# Lock-free single-producer / single-consumer ring of decoded telemetry
+# samples in shared memory, between the receiver process (receiver_process.py:
+# UDP receive and decode) and the controller process (streams, curve, PWM).
+#
+# Layout (native byte order, same host only):
+#   offset  type  field
+#   0       u32   magic, MAGIC once the creator has initialised the block
+#   4       u32   capacity (records, a power of two)
+#   8       u32   record stride (bytes)
+#   64      u32   head: records written; producer only       } one cache line
+#   68      u32   datagrams received                          } each, so the
+#   72      u32   datagrams that did not decode               } two processes
+#   128     u32   tail: records read; consumer only           } never write
+#   132     u32   records overwritten before they were read   } the same line
+#   192     records, `stride` bytes each
+#
+# Record (RECORD, little-endian): arrival time (time.monotonic()) and arrival
+# perf_counter() in the receiver (both CLOCK_MONOTONIC on Linux, so
+# comparable across processes), vel x, y, z, forward x, y, z and up x, y, z,
+# seq, sender_ms, sender_id, flags, address family, port, packed IP, and a
+# stamp: the record's index, stored with the record.
+#
+# Each index has exactly one writer, so no locks are needed: the producer
+# fills a record, then advances head; the consumer reads records up to head,
+# then advances tail. Indices are u32 (single aligned stores, also on 32-bit
+# Pi OS) and wrap; capacity divides 2^32, so (head - tail) & 0xFFFFFFFF is
+# how far the consumer is behind. Python cannot issue memory fences, so a
+# record whose stamp does not match its index is treated as not yet visible
+# and read on the next drain.
+#
+# The controller only needs the newest samples, so the producer never checks
+# the tail: when the consumer falls more than `capacity` records behind, the
+# oldest records are overwritten. The consumer skips to the oldest record
+# still in the ring and counts the ones it missed; a record whose slot the
+# producer may have started to overwrite while it was being read (head has
+# moved `capacity` past it) is skipped the same way rather than handled torn.
+
+MAGIC = 0x31525641  # b"AVR1"
+DEFAULT_CAPACITY = 1024
+RECORD = struct.Struct("<dd3d6fIIIBBH16sI")
+RECORD_STRIDE = 128
+HEADER_SIZE = 192
+_HEAD, _PACKETS, _DECODE_ERRORS, _TAIL, _SKIPPED = 16, 17, 18, 32, 33  # u32 indices into the header
+_MASK32 = 0xFFFFFFFF
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+FLAG_SEQ = 0x01
+FLAG_SENDER_MS = 0x02
+FLAG_SENDER_ID = 0x04
+FLAG_ORIENTED = 0x08
+FLAG_BINARY = 0x10
+
+
+def default_ring_path():
+    return os.path.join(_SHM_DIR, f"altus_ventus_ring_{os.getpid()}")
+
+
+class SampleRing:
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, create=False):
+        """Create (controller side) or open (receiver side) the ring at `path`."""
+        if create and capacity & (capacity - 1):
+            raise ValueError(f"Ring capacity must be a power of two, got {capacity}")
+        self.path = path
+        self.owner = create
+        if create:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        else:
+            fd = os.open(path, os.O_RDWR)
+        try:
+            if create:
+                os.ftruncate(fd, HEADER_SIZE + capacity * RECORD_STRIDE)
+            self._mm = mmap.mmap(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+        self._u32 = memoryview(self._mm)[:HEADER_SIZE].cast("I")
+        u32 = self._u32
+        if create:
+            u32[1], u32[2] = capacity, RECORD_STRIDE
+            u32[0] = MAGIC  # Last, so the receiver never sees a half-initialised block
+        elif u32[0] != MAGIC or u32[2] != RECORD_STRIDE:
+            self.close()
+            raise ValueError(f"{path} is not a sample ring")
+        self.capacity = u32[1]
+        self._mask = self.capacity - 1
+        # (ip, port) <-> (family, port, packed IP) caches, so neither side calls inet_pton / inet_ntop per sample
+        self._addresses = {}
+
+    def _cache(self, key, value):
+        if len(self._addresses) >= 1024:  # Bounded, e.g. against spoofed source addresses
+            self._addresses.clear()
+        self._addresses[key] = value
+        return value
+
+    @staticmethod
+    def _pack_address(address):
+        ip = address[0]
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        return int(family), address[1], socket.inet_pton(family, ip)
+
+    # Producer (receiver process)
+
+    def count_packet(self, decoded=True):
+        u32 = self._u32
+        u32[_PACKETS] = (u32[_PACKETS] + 1) & _MASK32
+        if not decoded:
+            u32[_DECODE_ERRORS] = (u32[_DECODE_ERRORS] + 1) & _MASK32
+
+    def push(self, sample, address, now, arrival):
+        """Append a decoded sample, overwriting the oldest record if the consumer is `capacity` behind."""
+        u32 = self._u32
+        head = u32[_HEAD]
+        flags = FLAG_BINARY if sample.binary else 0
+        seq = sample.seq
+        if isinstance(seq, int):
+            flags |= FLAG_SEQ
+        else:
+            seq = 0
+        sender_ms = sample.sender_ms
+        if isinstance(sender_ms, int):
+            flags |= FLAG_SENDER_MS
+        else:
+            sender_ms = 0
+        sender_id = sample.sender_id
+        if isinstance(sender_id, int) and 0 <= sender_id <= _MASK32:
+            flags |= FLAG_SENDER_ID
+        else:
+            sender_id = 0  # Streams from senders with other IDs are keyed by address
+        if sample.oriented:
+            flags |= FLAG_ORIENTED
+        packed = self._addresses.get(address)
+        if packed is None:
+            packed = self._cache(address, self._pack_address(address))
+        family, port, ip = packed
+        RECORD.pack_into(self._mm, HEADER_SIZE + (head & self._mask) * RECORD_STRIDE,
+                         now, arrival, sample.vx, sample.vy, sample.vz,
+                         sample.fx, sample.fy, sample.fz, sample.ux, sample.uy, sample.uz,
+                         seq & _MASK32, sender_ms & _MASK32, sender_id, flags, family, port, ip, head)
+        u32[_HEAD] = (head + 1) & _MASK32
+
+    # Consumer (controller process)
+
+    def drain(self, handle, sample=None):
+        """Call `handle(sample, address, now, arrival)` for every record written since the last drain.
+
+        `sample` (a TelemetrySample) is reused for every record; returns the
+        number read. Records overwritten before this drain got to them are
+        skipped and counted (`skipped`).
+        """
+        if sample is None:
+            sample = TelemetrySample()
+        u32 = self._u32
+        capacity = self.capacity
+        tail = u32[_TAIL]
+        behind = (u32[_HEAD] - tail) & _MASK32
+        skipped = 0
+        if behind > capacity:  # Overwritten: start at the oldest record still in the ring
+            skipped = behind - capacity
+            tail = (tail + skipped) & _MASK32
+            behind = capacity
+        unpack_from = RECORD.unpack_from
+        addresses = self._addresses
+        read = done = 0
+        while done < behind:
+            index = (tail + done) & _MASK32
+            (now, arrival, sample.vx, sample.vy, sample.vz, sample.fx, sample.fy, sample.fz,
+             sample.ux, sample.uy, sample.uz, seq, sender_ms, sender_id, flags, family, port, ip,
+             stamp) = unpack_from(self._mm, HEADER_SIZE + (index & self._mask) * RECORD_STRIDE)
+            if (u32[_HEAD] - index) & _MASK32 >= capacity:
+                done += 1  # The producer may have been overwriting this slot while it was read
+                skipped += 1
+                continue
+            if stamp != index:
+                break  # Not visible yet; picked up on the next drain
+            sample.seq = seq if flags & FLAG_SEQ else None
+            sample.sender_ms = sender_ms if flags & FLAG_SENDER_MS else None
+            sample.sender_id = sender_id if flags & FLAG_SENDER_ID else None
+            sample.oriented = bool(flags & FLAG_ORIENTED)
+            sample.binary = bool(flags & FLAG_BINARY)
+            packed = (family, port, ip)
+            address = addresses.get(packed)
+            if address is None:
+                size = 4 if family == socket.AF_INET else 16
+                address = self._cache(packed, (socket.inet_ntop(family, ip[:size]), port))
+            read += 1
+            done += 1
+            handle(sample, address, now, arrival)
+        if skipped:
+            u32[_SKIPPED] = (u32[_SKIPPED] + skipped) & _MASK32
+        if done or skipped:
+            u32[_TAIL] = (tail + done) & _MASK32
+        return read
+
+    @property
+    def pending(self):
+        return min((self._u32[_HEAD] - self._u32[_TAIL]) & _MASK32, self.capacity)
+
+    @property
+    def packets(self):
+        return self._u32[_PACKETS]
+
+    @property
+    def decode_errors(self):
+        return self._u32[_DECODE_ERRORS]
+
+    @property
+    def skipped(self):
+        return self._u32[_SKIPPED]
+
+    def close(self):
+        if self._mm is None:
+            return
+        self._u32.release()
+        self._mm.close()
+        self._mm = None
+        if self.owner:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
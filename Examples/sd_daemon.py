@@ -0,0 +1,76 @@
+
+import os
+import socket
+import time
+
+# Minimal sd-daemon protocol support (systemd socket activation and readiness
+# notification) without the python-systemd dependency; both are plain
+# environment variables and a datagram, and do nothing outside systemd.
+#
+# With fan_control.socket, systemd binds UDP 4444 itself and passes the socket
+# to the controller (LISTEN_FDS). It stays bound while the service restarts,
+# so telemetry queues up instead of being dropped, and the controller drains
+# it as soon as it is back. notify_ready() tells systemd (Type=notify) that
+# the controller is actually running, not just started.
+
+SD_LISTEN_FDS_START = 3
+
+
+def listen_fds(unset_environment=True):
+    """Sockets passed by systemd socket activation, in unit order (empty if none)."""
+    try:
+        if int(os.environ.get("LISTEN_PID", "")) != os.getpid():
+            return []
+        count = int(os.environ.get("LISTEN_FDS", ""))
+    except ValueError:
+        return []
+    finally:
+        if unset_environment:  # Not inherited by child processes
+            for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+                os.environ.pop(name, None)
+    sockets = []
+    for fd in range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + count):
+        os.set_inheritable(fd, False)
+        sockets.append(socket.socket(fileno=fd))  # Family and type are read from the fd
+    return sockets
+
+
+def activated_socket(sock_type=socket.SOCK_DGRAM):
+    """The first socket of `sock_type` passed by systemd, or None when not socket-activated."""
+    for sock in listen_fds():
+        if sock.type == sock_type:
+            return sock
+        sock.close()
+    return None
+
+
+def notify(state):
+    """Send a state string such as "READY=1" to systemd; False when not running under it."""
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address[0] == "@":  # Abstract namespace
+        address = "\0" + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(state.encode(), address)
+    except OSError:
+        return False
+    return True
+
+
+def notify_ready(status=None):
+    return notify("READY=1" + (f"\nSTATUS={status}" if status else ""))
+
+
+def process_age():
+    """Seconds since this process was started (including interpreter startup), or None off Linux."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22, counted after the parenthesised command name (which may contain spaces)
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
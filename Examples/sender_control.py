@@ -0,0 +1,95 @@
+
+import time
+from collections import namedtuple
+
+from telemetry_protocol import encode_sender_config
+
+# Sender-side rate control for main.lua, set from the Pi.
+#
+# main.lua sends a packet only when the velocity has moved by more than
+# `change_threshold` (m/s, on any axis) since the last packet it sent, at most
+# `max_send_hz` times a second, plus a keepalive every `keepalive` seconds
+# when nothing changes. A parked car then costs one packet a second, while a
+# real speed change still goes out on the next allowed frame.
+#
+# The settings come from the wind server (shared config block on the Pi, the
+# push channel in the simulation). The controller passes them to every sender
+# it hears from: SenderConfigBroadcaster sends the "AVCFG" datagram (see
+# telemetry_protocol.py) back to each stream's source address from the
+# telemetry socket, which is the only address the sender's connected UDP
+# socket accepts datagrams from. It is sent when the settings change, when a
+# new sender appears, and every RESEND_INTERVAL in case a datagram was lost.
+#
+# The keepalive must stay below the controllers' stale timeout
+# (control_loop.STALE_AFTER) and sender_streams.LIVE_AFTER, or a parked car
+# would look like a sender that went away.
+
+SenderSettings = namedtuple("SenderSettings", "max_send_hz change_threshold keepalive")
+
+DEFAULT_SENDER_SETTINGS = SenderSettings(max_send_hz=60.0, change_threshold=0.05, keepalive=1.0)
+MAX_SEND_HZ_RANGE = (1.0, 240.0)
+CHANGE_THRESHOLD_RANGE = (0.0, 5.0)  # m/s
+KEEPALIVE_RANGE = (0.1, 1.5)         # Seconds
+RESEND_INTERVAL = 5.0                # Seconds between refreshes to every sender
+
+
+def _clamp(value, limits):
+    value = float(value)
+    if value != value:  # NaN would pass straight through min / max
+        raise ValueError(f"Sender setting must be a number, got {value!r}")
+    return min(max(value, limits[0]), limits[1])
+
+
+def sender_settings(max_send_hz=None, change_threshold=None, keepalive=None, base=DEFAULT_SENDER_SETTINGS):
+    """SenderSettings from (possibly partial, untrusted) values, clamped to safe ranges."""
+    return SenderSettings(
+        _clamp(base.max_send_hz if max_send_hz is None else max_send_hz, MAX_SEND_HZ_RANGE),
+        _clamp(base.change_threshold if change_threshold is None else change_threshold, CHANGE_THRESHOLD_RANGE),
+        _clamp(base.keepalive if keepalive is None else keepalive, KEEPALIVE_RANGE),
+    )
+
+
+class SenderConfigBroadcaster:
+    def __init__(self, send, table, settings=DEFAULT_SENDER_SETTINGS, resend_interval=RESEND_INTERVAL):
+        """`send(data, address)` writes from the telemetry socket, e.g. sock.sendto
+        or an asyncio transport's sendto; `table` is a sender_streams.StreamTable."""
+        self.send = send
+        self.table = table
+        self.settings = settings
+        self.resend_interval = resend_interval
+        self.version = 1
+        self.sent = 0
+        self._message = encode_sender_config(self.version, *settings)
+        self._told = {}  # Stream key -> version it was last sent
+        self._next_resend = 0.0
+
+    def update(self, settings):
+        """Adopt new settings; returns True if they changed. They go out on the next tick()."""
+        if settings == self.settings:
+            return False
+        self.settings = settings
+        self.version += 1
+        self._message = encode_sender_config(self.version, *settings)
+        return True
+
+    def tick(self, now=None):
+        """Send the settings to streams that have not had this version (or to all, when a resend is due)."""
+        if now is None:
+            now = time.monotonic()
+        resend = now >= self._next_resend
+        if resend:
+            self._next_resend = now + self.resend_interval
+        table = self.table
+        told = {}
+        for key, slot in table.items():
+            address = table.address[slot]
+            if address is None:
+                continue
+            if resend or self._told.get(key) != self.version:
+                try:
+                    self.send(self._message, address)
+                    self.sent += 1
+                except OSError:  # Full socket buffer or unreachable; the next resend retries
+                    continue
+            told[key] = self.version
+        self._told = told  # Evicted streams drop out here
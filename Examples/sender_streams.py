@@ -0,0 +1,257 @@
+
+import time
+
+from telemetry_protocol import TelemetrySample, decode_into
+
+# Per-sender telemetry streams for BeamMP sessions with several players.
+#
+# main.lua runs on every connected client, so one controller port can carry
+# several vehicles' telemetry. Each datagram is attributed to a stream, keyed
+# by the sender ID in the packet or, for senders without one, the source
+# (ip, port), and a selection policy picks the stream that drives each fan
+# output instead of letting the fan jump between players' speeds.
+#
+# StreamTable is a fixed-capacity struct of arrays: the per-stream fields are
+# preallocated lists indexed by slot, and the key -> slot dict only changes
+# when a sender appears or is evicted, so the per-packet cost is one dict
+# lookup and a few list stores. Streams silent for `idle_timeout` are evicted
+# (evict_idle(), run about once a second, and on demand when the table is
+# full); packets from new senders that find the table full of live streams
+# are dropped and counted, so a flood of spoofed addresses cannot grow it.
+#
+# Selection policies (StreamSelector):
+#   sticky   keep the current stream until it goes quiet, then take the
+#            longest-running live one (default; a single sender behaves
+#            exactly as before)
+#   fastest  whichever live stream is fastest
+#   pinned   one sender only: a sender ID, "ip" or "ip:port"
+
+DEFAULT_CAPACITY = 64
+IDLE_TIMEOUT = 10.0  # Seconds of silence before a stream is evicted
+LIVE_AFTER = 2.0     # Seconds a stream stays eligible for selection after its last packet
+                     # (above the longest sender keepalive, sender_control.KEEPALIVE_RANGE)
+SELECTION_POLICIES = ("sticky", "fastest", "pinned")
+
+
+class StreamTable:
+    def __init__(self, capacity=DEFAULT_CAPACITY, idle_timeout=IDLE_TIMEOUT):
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.keys = [None] * capacity
+        self.address = [None] * capacity    # Source (ip, port) of the stream's newest packet
+        self.speed = [0.0] * capacity       # Forward speed, mph
+        self.first_seen = [0.0] * capacity  # monotonic() times
+        self.last_seen = [0.0] * capacity
+        self.last_seq = [-1] * capacity     # -1 when the sender sends no sequence numbers
+        self.packets = [0] * capacity
+        self.gaps = [0] * capacity          # Packets missing from the stream's sequence
+        self.seq_gaps = 0                   # Total over all streams, including evicted ones
+        self.evicted = 0
+        self.rejected = 0                   # Packets dropped because the table was full
+        self._slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def items(self):
+        """(key, slot) for every stream in the table."""
+        return self._slots.items()
+
+    def slot_of(self, key):
+        return self._slots.get(key, -1)
+
+    def update(self, key, speed, seq, now, address=None):
+        """Record a packet from `key`; returns its slot, or -1 if the table is full."""
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._add(key, now)
+            if slot < 0:
+                self.rejected += 1
+                return -1
+        elif type(seq) is int:  # Gap accounting only for integer sequence numbers
+            last = self.last_seq[slot]
+            if last >= 0:
+                gap = ((seq - last) & 0xFFFFFFFF) - 1
+                if 0 < gap < 0x80000000:  # Ignore sender restarts and reordering
+                    self.gaps[slot] += gap
+                    self.seq_gaps += gap
+        self.speed[slot] = speed
+        self.address[slot] = address
+        self.last_seen[slot] = now
+        self.last_seq[slot] = seq if type(seq) is int else -1
+        self.packets[slot] += 1
+        return slot
+
+    def _add(self, key, now):
+        if not self._free:
+            self.evict_idle(now)
+            if not self._free:
+                return -1
+        slot = self._free.pop()
+        self._slots[key] = slot
+        self.keys[slot] = key
+        self.first_seen[slot] = now
+        self.last_seq[slot] = -1
+        self.packets[slot] = 0
+        self.gaps[slot] = 0
+        return slot
+
+    def evict_idle(self, now):
+        """Free the slots of streams silent for longer than `idle_timeout`; returns how many."""
+        idle = [(key, slot) for key, slot in self._slots.items() if now - self.last_seen[slot] > self.idle_timeout]
+        for key, slot in idle:
+            del self._slots[key]
+            self.keys[slot] = self.address[slot] = None
+            self._free.append(slot)
+        self.evicted += len(idle)
+        return len(idle)
+
+    def describe(self, slot):
+        key = self.keys[slot]
+        if isinstance(key, tuple):
+            return f"{key[0]}:{key[1]}"
+        return f"id {key}"
+
+
+def parse_pin(text):
+    """A pinned-stream spec from config: sender ID, "ip" or "ip:port"."""
+    text = str(text).strip()
+    if text.isdigit():
+        return int(text)
+    host, sep, port = text.rpartition(":")
+    if sep and port.isdigit():
+        return (host, int(port))
+    return text
+
+
+class StreamSelector:
+    """Chooses the stream that drives one fan output."""
+
+    def __init__(self, policy="sticky", pin=None, live_after=LIVE_AFTER):
+        if policy not in SELECTION_POLICIES:
+            raise ValueError(f"Unknown selection policy {policy!r}, expected one of {SELECTION_POLICIES}")
+        if policy == "pinned" and pin is None:
+            raise ValueError("The 'pinned' policy needs a sender ID, 'ip' or 'ip:port' to pin")
+        self.policy = policy
+        self.pin = parse_pin(pin) if pin is not None else None
+        self.live_after = live_after
+        self.slot = -1    # Selected slot, -1 for none
+        self.key = None
+        self.switches = 0
+
+    def _pinned(self, table):
+        pin = self.pin
+        slot = table.slot_of(pin)
+        if slot >= 0 or not isinstance(pin, str):
+            return slot
+        for key, slot in table.items():  # Bare IP: any port from that host
+            if isinstance(key, tuple) and key[0] == pin:
+                return slot
+        return -1
+
+    def select(self, table, now):
+        """Re-evaluate the selection; returns True if it changed."""
+        slot = self.slot
+        if slot >= 0 and table.keys[slot] != self.key:
+            slot = -1  # Evicted, and the slot may since have been reused
+        live_since = now - self.live_after
+        last_seen = table.last_seen
+
+        if self.policy == "pinned":
+            if slot < 0:
+                slot = self._pinned(table)
+        elif self.policy == "sticky":
+            if slot < 0 or last_seen[slot] < live_since:
+                best = -1
+                for _, candidate in table.items():
+                    if last_seen[candidate] >= live_since and (
+                            best < 0 or table.first_seen[candidate] < table.first_seen[best]):
+                        best = candidate
+                if best >= 0 or slot < 0:
+                    slot = best  # Otherwise keep the quiet stream; the hold lets the fan spin down
+        else:
+            speed = table.speed
+            best = -1
+            for _, candidate in table.items():
+                if last_seen[candidate] >= live_since and (best < 0 or speed[candidate] > speed[best]):
+                    best = candidate
+            if best >= 0 or slot < 0:
+                slot = best
+
+        if slot == self.slot and (slot < 0 or table.keys[slot] == self.key):
+            return False
+        self.slot = slot
+        self.key = table.keys[slot] if slot >= 0 else None
+        self.switches += 1
+        return True
+
+
+class StreamDemux:
+    """Decodes datagrams into a StreamTable and feeds the selected stream to a SampleHold.
+
+    Pass `handle` to DrainingReceiver.drain_each() and call `select()` on
+    every control tick. `channels` (a wind_channels.ChannelBank) also gets
+    the selected stream's full decoded sample, for multi-fan output.
+    """
+
+    def __init__(self, table, selector, hold, sample=None, channels=None):
+        self.table = table
+        self.selector = selector
+        self.hold = hold
+        self.channels = channels
+        self.sample = sample if sample is not None else TelemetrySample()
+        self.packets = 0
+        self.decode_errors = 0
+        self.skipped = 0        # Selected-stream packets superseded before a tick used them
+        self.parse_time = 0.0   # Seconds spent decoding since the caller last reset it
+        self.arrival = None     # perf_counter() time of the newest unused selected-stream packet
+
+    def handle(self, buf, nbytes, address):
+        """Returns True if the datagram came from the selected stream."""
+        t0 = time.perf_counter()
+        sample = self.sample
+        if not decode_into(sample, buf, nbytes):
+            self.packets += 1
+            self.decode_errors += 1
+            self.parse_time += time.perf_counter() - t0
+            return False
+        selected = self.handle_sample(sample, address, time.monotonic(), t0)
+        self.parse_time += time.perf_counter() - t0
+        return selected
+
+    def handle_sample(self, sample, address, now, arrival):
+        """Record an already decoded sample, e.g. from the receiver process (sample_ring.SampleRing.drain()).
+
+        `now` is its time.monotonic() arrival time, `arrival` its perf_counter() one.
+        Returns True if it came from the selected stream.
+        """
+        self.packets += 1
+        key = sample.sender_id if sample.sender_id is not None else address
+        slot = self.table.update(key, sample.forward_speed_mph(), sample.seq, now, address)
+        selected = slot >= 0 and slot == self.selector.slot
+        if selected:
+            self.hold.update(self.table.speed[slot], now)
+            if self.channels is not None:
+                self.channels.update(sample, now)
+            if self.arrival is not None:
+                self.skipped += 1
+            self.arrival = arrival
+        return selected
+
+    def select(self, now):
+        """Re-run the selection policy; on a switch the hold restarts from the new stream."""
+        if not self.selector.select(self.table, now):
+            return False
+        self.hold.reset()
+        if self.channels is not None:
+            self.channels.reset()  # Until the new stream's next packet: it only keeps the speed
+        slot = self.selector.slot
+        if slot >= 0:
+            self.hold.update(self.table.speed[slot], self.table.last_seen[slot])
+        self.arrival = None
+        return True
+
+    def selected_name(self):
+        slot = self.selector.slot
+        return self.table.describe(slot) if slot >= 0 else "none"
@@ -0,0 +1,136 @@
+
+import mmap
+import os
+import tempfile
+import threading
+import time
+
+from sender_control import SenderSettings
+
+# Shared-memory config block written by wind_server.py and read by the fan
+# controllers, so the two can run as separate processes (as fan_control.service
+# sets up) and still see the same top speed without HTTP or polling.
+#
+# Layout (native byte order, same host only):
+#   offset  type  field
+#   0       u32   magic, MAGIC once the writer has initialised the block
+#   4       u32   seq, seqlock counter: odd while a write is in progress
+#   8       f64   top_speed (mph)
+#   16      f64   sender max_send_hz        } main.lua rate control (see
+#   24      f64   sender change_threshold   } sender_control.py); all 0 until
+#   32      f64   sender keepalive          } the wind server sets them
+#   40..63        reserved for future fields
+#
+# The writer bumps seq to odd, stores the fields, then bumps it back to even.
+# Readers compare seq with the value they last saw: a single memory load per
+# packet when nothing changed, and a retry if they raced a write.
+
+MAGIC = 0x31435641  # b"AVC1"
+BLOCK_SIZE = 64
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+DEFAULT_PATH = os.path.join(_SHM_DIR, "altus_ventus_config")
+REOPEN_INTERVAL = 1.0  # Seconds between attempts to open a missing block
+
+
+class SharedConfigWriter:
+    def __init__(self, top_speed, path=DEFAULT_PATH, sender=None):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, BLOCK_SIZE)
+            self._mm = mmap.mmap(fd, BLOCK_SIZE)
+        finally:
+            os.close(fd)
+        self._u32 = memoryview(self._mm)[:8].cast("I")
+        self._f64 = memoryview(self._mm)[8:40].cast("d")
+        self._lock = threading.Lock()  # One writer at a time (Flask serves requests on threads)
+        fresh = self._u32[0] != MAGIC
+        if fresh:
+            self._u32[1] = 0
+        self.write(top_speed, sender)
+        if fresh:  # Publish the magic last so readers never see an unset block
+            self._u32[0] = MAGIC
+
+    def write(self, top_speed, sender=None):
+        """Publish `top_speed` and, if given, new sender_control.SenderSettings."""
+        with self._lock:
+            seq = self._u32[1]
+            if seq & 1:  # A previous writer died mid-write; start from even
+                seq += 1
+            self._u32[1] = (seq + 1) & 0xFFFFFFFF
+            self._f64[0] = float(top_speed)
+            if sender is not None:
+                self._f64[1], self._f64[2], self._f64[3] = sender
+            self._u32[1] = (seq + 2) & 0xFFFFFFFF
+
+    def close(self):
+        self._u32.release()
+        self._f64.release()
+        self._mm.close()
+
+
+class SharedConfigReader:
+    def __init__(self, path=DEFAULT_PATH, default_top_speed=150):
+        self.path = path
+        self.top_speed = default_top_speed
+        self.sender = None  # SenderSettings, None until the wind server sets them
+        self.seq = None  # seq of the snapshot held in the attributes above
+        self._mm = None
+        self._u32 = self._f64 = None
+        self._next_open = 0.0
+        self._open()
+
+    def _open(self):
+        self._next_open = time.monotonic() + REOPEN_INTERVAL
+        try:
+            with open(self.path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), BLOCK_SIZE, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # Missing, or not yet sized by the writer
+            return False
+        self._mm = mm
+        self._u32 = memoryview(mm)[:8].cast("I")
+        self._f64 = memoryview(mm)[8:40].cast("d")
+        return True
+
+    @property
+    def connected(self):
+        return self._mm is not None
+
+    def refresh(self):
+        """Update `top_speed` and `sender` if the writer changed them; returns True on change.
+
+        Cheap enough to call per packet: when nothing changed it is one load
+        of the seq counter.
+        """
+        if self._u32 is None:
+            if time.monotonic() < self._next_open or not self._open():
+                return False
+        seq = self._u32[1]
+        if seq == self.seq:
+            return False
+        if self._u32[0] != MAGIC:
+            return False
+        for _ in range(100):
+            if seq & 1:  # Write in progress
+                seq = self._u32[1]
+                continue
+            top_speed = self._f64[0]
+            sender = SenderSettings(self._f64[1], self._f64[2], self._f64[3])
+            seq_after = self._u32[1]
+            if seq_after == seq:
+                self.seq = seq
+                if not sender.max_send_hz:
+                    sender = None
+                changed = top_speed != self.top_speed or sender != self.sender
+                self.top_speed = top_speed
+                self.sender = sender
+                return changed
+            seq = seq_after
+        return False  # Writer is hammering the block; keep the old value this packet
+
+    def close(self):
+        if self._mm is not None:
+            self._u32.release()
+            self._f64.release()
+            self._mm.close()
+            self._mm = self._u32 = self._f64 = None
@@ -0,0 +1,295 @@
+
+import math
+import random
+from collections import deque
+
+from control_loop import MAX_EXTRAPOLATION, STALE_AFTER, SampleHold
+
+# Speed filtering and lead between the telemetry and the wind curve.
+#
+# A fan takes hundreds of milliseconds to spin up, so the airflow trails the
+# game. The filters smooth the raw per-packet speed and estimate its rate of
+# change; the stage then commands the fan for where the speed will be `lead`
+# seconds from now (value + rate * lead), which hides part of the motor lag.
+#
+#   none      raw speed; the rate is a finite difference
+#   ema       exponential moving average with a time constant (not a fixed
+#             per-packet blend, so irregular packet spacing is handled)
+#   one_euro  One-Euro filter: smooths hard while the speed is steady, follows
+#             quickly while it changes (Casiez et al., CHI 2012)
+#   kalman    constant-acceleration Kalman filter (position = speed, velocity
+#             = acceleration, acceleration = jerk)
+#
+# FilterStage is a drop-in for control_loop.SampleHold: update() only queues
+# the sample, and the next read() runs the filter once over everything queued
+# since the last tick (all packets drained in one wake-up), then extrapolates
+# to `now + lead`. measure_lag() reports what a configuration costs (ramp and
+# step lag) and buys (noise reduction); see benchmarks/filter_lag.py.
+
+FILTER_KINDS = ("none", "ema", "one_euro", "kalman")
+MIN_DT = 1e-3  # Seconds; floor for the spacing between two samples
+MAX_PENDING = 256  # Samples queued between two reads; older ones are dropped if read() falls behind
+
+
+class PassThroughFilter:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.value = 0.0
+        self.rate = 0.0
+        self.time = None
+
+    def update(self, x, t):
+        if self.time is not None:
+            self.rate = (x - self.value) / max(t - self.time, MIN_DT)
+        self.value = x
+        self.time = t
+        return x
+
+
+class EMAFilter:
+    def __init__(self, time_constant=0.1):
+        self.time_constant = time_constant
+        self.reset()
+
+    def reset(self):
+        self.value = 0.0
+        self.rate = 0.0
+        self.time = None
+        self._raw = 0.0
+
+    def update(self, x, t):
+        if self.time is None:
+            self.value = self._raw = x
+        else:
+            dt = max(t - self.time, MIN_DT)
+            alpha = 1.0 - math.exp(-dt / self.time_constant)
+            self.rate += alpha * ((x - self._raw) / dt - self.rate)
+            self.value += alpha * (x - self.value)
+            self._raw = x
+        self.time = t
+        return self.value
+
+
+class OneEuroFilter:
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        """`min_cutoff` (Hz) sets the smoothing at rest, `beta` how fast the
+        cutoff rises with the rate of change (per mph/s)."""
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = 0.0
+        self.rate = 0.0
+        self.time = None
+        self._raw = 0.0
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2.0 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, x, t):
+        if self.time is None:
+            self.value = self._raw = x
+        else:
+            dt = max(t - self.time, MIN_DT)
+            # Rate from the raw samples: the filtered value lags, which would inflate it
+            self.rate += self._alpha(self.d_cutoff, dt) * ((x - self._raw) / dt - self.rate)
+            cutoff = self.min_cutoff + self.beta * abs(self.rate)
+            self.value += self._alpha(cutoff, dt) * (x - self.value)
+            self._raw = x
+        self.time = t
+        return self.value
+
+
+class KalmanFilter:
+    def __init__(self, jerk_noise=400.0, measurement_noise=0.25):
+        """`jerk_noise`: spectral density of the unmodelled jerk ((mph/s^3)^2 s);
+        larger follows manoeuvres faster. `measurement_noise`: variance of the
+        telemetry speed (mph^2)."""
+        self.q = jerk_noise
+        self.r = measurement_noise
+        self.reset()
+
+    def reset(self):
+        self.x = [0.0, 0.0, 0.0]  # Speed (mph), its rate (mph/s) and the rate's rate (mph/s^2)
+        self.p = [[100.0, 0.0, 0.0], [0.0, 100.0, 0.0], [0.0, 0.0, 100.0]]
+        self.time = None
+
+    @property
+    def value(self):
+        return self.x[0]
+
+    @property
+    def rate(self):
+        return self.x[1]
+
+    def update(self, z, t):
+        if self.time is None:
+            self.x = [z, 0.0, 0.0]
+            self.time = t
+            return z
+        dt = max(t - self.time, MIN_DT)
+        self.time = t
+        x0, x1, x2 = self.x
+        p = self.p
+        # Predict: x = F x, P = F P F' + Q, with F = [[1, dt, dt^2/2], [0, 1, dt], [0, 0, 1]]
+        h = 0.5 * dt * dt
+        f = ((1.0, dt, h), (0.0, 1.0, dt), (0.0, 0.0, 1.0))
+        x = [x0 + dt * x1 + h * x2, x1 + dt * x2, x2]
+        fp = [[sum(f[i][k] * p[k][j] for k in range(3)) for j in range(3)] for i in range(3)]
+        q = self.q
+        dt2 = dt * dt
+        qm = ((dt2 * dt2 * dt / 20, dt2 * dt2 / 8, dt2 * dt / 6),
+              (dt2 * dt2 / 8, dt2 * dt / 3, dt2 / 2),
+              (dt2 * dt / 6, dt2 / 2, dt))
+        p = [[sum(fp[i][k] * f[j][k] for k in range(3)) + q * qm[i][j] for j in range(3)] for i in range(3)]
+        # Update with the measured speed (H = [1, 0, 0])
+        s = p[0][0] + self.r
+        k = [p[0][0] / s, p[1][0] / s, p[2][0] / s]
+        y = z - x[0]
+        self.x = [x[0] + k[0] * y, x[1] + k[1] * y, x[2] + k[2] * y]
+        self.p = [[p[i][j] - k[i] * p[0][j] for j in range(3)] for i in range(3)]
+        return self.x[0]
+
+
+def make_filter(kind="none", **params):
+    if kind == "none":
+        return PassThroughFilter()
+    if kind == "ema":
+        return EMAFilter(**params)
+    if kind == "one_euro":
+        return OneEuroFilter(**params)
+    if kind == "kalman":
+        return KalmanFilter(**params)
+    raise ValueError(f"Unknown filter {kind!r}, expected one of {FILTER_KINDS}")
+
+
+class FilterStage:
+    """SampleHold replacement that filters the speed and commands it `lead` seconds ahead."""
+
+    def __init__(self, filt=None, lead=0.0, max_extrapolation=MAX_EXTRAPOLATION, stale_after=STALE_AFTER):
+        self.filter = filt if filt is not None else PassThroughFilter()
+        self.lead = lead
+        self.max_extrapolation = max_extrapolation
+        self.stale_after = stale_after
+        self.extrapolated = 0  # Reads that had to extrapolate a late sample
+        self.batches = 0       # read() calls that ran the filter
+        self.time = None       # Arrival time of the newest sample
+        self._pending = deque(maxlen=MAX_PENDING)  # Values queued since the last read
+        self._filtered_time = None
+        self._interval = None  # Smoothed time between filtered batches
+
+    @property
+    def value(self):
+        return self.filter.value
+
+    def reset(self):
+        self.filter.reset()
+        self._pending.clear()
+        self.time = None
+        self._filtered_time = None
+        self._interval = None
+
+    def update(self, value, now):
+        self._pending.append(value)
+        self.time = now
+
+    def _run_filter(self):
+        pending = self._pending
+        n = len(pending)
+        # Packets drained in one wake-up arrive with (nearly) the same time
+        # stamp; they were sent spread over the time since the previous batch,
+        # so space them evenly over it
+        start = self._filtered_time
+        end = self.time
+        if start is None:
+            start = end - MIN_DT * n
+        step = (end - start) / n
+        update = self.filter.update
+        for i, value in enumerate(pending):
+            update(value, start + step * (i + 1))
+        if self._filtered_time is not None:
+            gap = end - start  # Between batches: reads within it are not late
+            self._interval = gap if self._interval is None else self._interval + 0.1 * (gap - self._interval)
+        self._filtered_time = end
+        pending.clear()
+        self.batches += 1
+
+    def read(self, now):
+        """The filtered speed, projected to `now + lead`."""
+        if self._pending:
+            self._run_filter()
+        if self.time is None:
+            return 0.0
+        age = now - self.time
+        if self.stale_after is not None and age > self.stale_after:
+            return 0.0  # Telemetry stopped (game paused or closed): let the fan stop
+        horizon = self.lead
+        if self._interval is not None and age > self._interval:
+            self.extrapolated += 1
+            horizon += min(age, self.max_extrapolation)
+        value = self.filter.value + self.filter.rate * horizon
+        return value if value > 0.0 else 0.0
+
+
+def make_speed_hold(kind="none", lead=0.0, **params):
+    """A FilterStage for `kind` and `lead`; plain SampleHold behaviour for ("none", 0).
+
+    A lead needs a smoothing filter: extrapolating raw packet-to-packet
+    changes amplifies the noise (see benchmarks/filter_lag.py), so "none" with
+    a lead raises ValueError.
+    """
+    if kind == "none":
+        if lead:
+            raise ValueError("A lead needs a smoothing speed filter (ema, one_euro or kalman), not 'none'")
+        return SampleHold()
+    return FilterStage(make_filter(kind, **params), lead)
+
+
+def measure_lag(make_stage, rate_hz=60.0, noise=0.5, ramp_slope=20.0, step_size=40.0, seed=1):
+    """Lag and smoothing of the stage built by `make_stage()`, on synthetic telemetry at `rate_hz`.
+
+    Returns a dict:
+      ramp_lag     seconds behind a steady `ramp_slope` mph/s acceleration
+                   (negative: ahead of it, i.e. the lead overshoots)
+      step_50      seconds to reach half of a `step_size` mph jump
+      overshoot    peak overshoot after the step, in mph
+      noise_ratio  output / input standard deviation at constant speed with
+                   `noise` mph of Gaussian noise (lower is smoother)
+    The stage is read once per packet, right after it arrives.
+    """
+    rng = random.Random(seed)
+    dt = 1.0 / rate_hz
+
+    def run(signal, seconds, noisy):
+        stage = make_stage()
+        out = []
+        for i in range(int(seconds * rate_hz)):
+            t = i * dt
+            stage.update(signal(t) + (rng.gauss(0.0, noise) if noisy else 0.0), t)
+            out.append(stage.read(t))
+        return out
+
+    ramp_seconds = 4.0
+    ramp = run(lambda t: 20.0 + ramp_slope * t, ramp_seconds, False)
+    settled = range(int(ramp_seconds * rate_hz / 2), len(ramp))  # Second half: past the start-up transient
+    ramp_lag = sum(20.0 + ramp_slope * i * dt - ramp[i] for i in settled) / len(settled) / ramp_slope
+
+    base, step_at = 30.0, 1.0
+    step = run(lambda t: base + (step_size if t >= step_at else 0.0), 4.0, False)
+    step_50 = None
+    for i, v in enumerate(step):
+        if i * dt >= step_at and v >= base + step_size / 2:
+            step_50 = i * dt - step_at
+            break
+    overshoot = max(0.0, max(step) - (base + step_size))
+
+    flat = run(lambda t: 50.0, 4.0, True)[int(rate_hz):]
+    mean = sum(flat) / len(flat)
+    noise_ratio = math.sqrt(sum((v - mean) ** 2 for v in flat) / len(flat)) / noise if noise else 0.0
+    return {"ramp_lag": ramp_lag, "step_50": step_50, "overshoot": overshoot, "noise_ratio": noise_ratio}
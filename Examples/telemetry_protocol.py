@@ -0,0 +1,197 @@
+
+import json
+import struct
+from math import isfinite
+
+# Telemetry wire formats understood by the fan controllers.
+#
+# JSON (original, still accepted):  {"vel":[x, y, z]}  with optional "seq", "t",
+# "id", and "dir" / "up" (the orientation, as below)
+#
+# Binary v1, little-endian, 24 bytes (+4 with a sender ID, +24 with the orientation):
+#   offset  size  field
+#   0       2     magic "AV"
+#   2       1     version (1)
+#   3       1     flags: bit 0 = sender ID follows the velocity
+#                        bit 1 = orientation follows (after the sender ID, if any)
+#   4       4     seq        uint32, incremented per packet, wraps
+#   8       4     sender_ms  uint32, sender clock in milliseconds, wraps
+#   12      12    vel x, y, z  float32, m/s
+#   24      4     sender_id  uint32, only with flag bit 0
+#   24/28   24    forward x, y, z and up x, y, z  float32 unit vectors, only with flag bit 1
+#
+# The sender ID tells apart several BeamMP clients sending to one controller
+# (see sender_streams.py); without one, receivers key streams by source
+# address. The orientation (the vehicle's forward and up directions in world
+# space) lets receivers split the velocity into forward / sideways / vertical
+# components for several fans (see wind_channels.py); without it the world
+# axes are assumed (y forward, x right, z up). Receivers that predate either
+# field ignore the trailing bytes.
+#
+# Receivers look at the first bytes of every datagram, so JSON and binary
+# senders can share a port.
+#
+# Sender config (controller -> main.lua, sent back to each sender's address
+# from the telemetry port), ASCII so the Lua side can parse it with a pattern:
+#   "AVCFG 1 <version> <max_send_hz> <change_threshold m/s> <keepalive s>"
+
+MAGIC = b"AV"
+VERSION = 1
+HEADER = struct.Struct("<2sBB")
+PACKET_V1 = struct.Struct("<2sBBIIfff")
+_BODY_V1 = struct.Struct("<IIfff")  # PACKET_V1 without the header, for decoding
+PACKET_V1_ID = struct.Struct("<2sBBIIfffI")
+_SENDER_ID = struct.Struct("<I")
+_ORIENTATION = struct.Struct("<6f")
+FLAG_SENDER_ID = 0x01
+FLAG_ORIENTATION = 0x02
+MAX_PACKET_SIZE = PACKET_V1_ID.size + _ORIENTATION.size
+_MAGIC_0, _MAGIC_1 = MAGIC
+
+MPS_TO_MPH = 2.237
+
+SENDER_CONFIG_PREFIX = b"AVCFG 1 "
+
+
+class TelemetrySample:
+    """One decoded telemetry packet. Reused across packets to avoid allocation."""
+    __slots__ = ("vx", "vy", "vz", "seq", "sender_ms", "sender_id", "binary", "oriented",
+                 "fx", "fy", "fz", "ux", "uy", "uz")
+
+    def __init__(self):
+        self.vx = self.vy = self.vz = 0.0
+        self.seq = None        # None when the sender did not provide one
+        self.sender_ms = None
+        self.sender_id = None  # None when the sender did not identify itself
+        self.binary = False
+        self.oriented = False  # True when the forward (f*) and up (u*) vectors were sent
+        self.fx, self.fy, self.fz = 0.0, 1.0, 0.0
+        self.ux, self.uy, self.uz = 0.0, 0.0, 1.0
+
+    def forward_speed_mph(self):
+        return self.vy * MPS_TO_MPH  # Assuming y axis is forward
+
+    def speed_mph(self):
+        return (self.vx * self.vx + self.vy * self.vy + self.vz * self.vz) ** 0.5 * MPS_TO_MPH
+
+    def vehicle_velocity(self):
+        """(forward, right, up) velocity in m/s, in the vehicle's frame when it sent its orientation."""
+        vx, vy, vz = self.vx, self.vy, self.vz
+        if not self.oriented:
+            return vy, vx, vz  # World axes: y forward, x right, z up
+        fx, fy, fz, ux, uy, uz = self.fx, self.fy, self.fz, self.ux, self.uy, self.uz
+        # right = forward x up
+        rx, ry, rz = fy * uz - fz * uy, fz * ux - fx * uz, fx * uy - fy * ux
+        return (vx * fx + vy * fy + vz * fz), (vx * rx + vy * ry + vz * rz), (vx * ux + vy * uy + vz * uz)
+
+
+def decode_into(sample, buf, nbytes):
+    """Decode the datagram in buf[:nbytes] (bytes or bytearray) into `sample`.
+
+    The format is detected per packet. Returns False (leaving `sample`
+    untouched) if the datagram is neither valid binary nor valid JSON, or
+    its velocity is not finite (NaN or infinite). An orientation that is not
+    finite is ignored (`oriented` False); a JSON "seq" or "t" that is not an
+    integer is stored as None.
+    """
+    if nbytes >= PACKET_V1.size and buf[0] == _MAGIC_0 and buf[1] == _MAGIC_1:
+        if buf[2] != VERSION:
+            return False
+        seq, sender_ms, vx, vy, vz = _BODY_V1.unpack_from(buf, HEADER.size)
+        if not (isfinite(vx) and isfinite(vy) and isfinite(vz)):
+            return False
+        sample.seq, sample.sender_ms, sample.vx, sample.vy, sample.vz = seq, sender_ms, vx, vy, vz
+        flags = buf[3]
+        offset = PACKET_V1.size
+        if flags & FLAG_SENDER_ID and nbytes >= PACKET_V1_ID.size:
+            sample.sender_id = _SENDER_ID.unpack_from(buf, offset)[0]
+            offset = PACKET_V1_ID.size
+        else:
+            sample.sender_id = None
+        sample.oriented = False
+        if flags & FLAG_ORIENTATION and nbytes >= offset + _ORIENTATION.size:
+            _set_orientation(sample, _ORIENTATION.unpack_from(buf, offset))
+        sample.binary = True
+        return True
+    try:
+        telemetry = json.loads(buf[:nbytes])
+        vel = telemetry["vel"]
+        vx, vy, vz = float(vel[0]), float(vel[1]), float(vel[2])  # Also accepts "NaN" and 1e999
+    except (ValueError, KeyError, IndexError, TypeError):  # JSONDecodeError is a ValueError
+        return False
+    if not (isfinite(vx) and isfinite(vy) and isfinite(vz)):
+        return False
+    sample.vx, sample.vy, sample.vz = vx, vy, vz
+    seq = telemetry.get("seq")
+    sample.seq = seq if type(seq) is int else None  # Used in wrap-around arithmetic
+    sender_ms = telemetry.get("t")
+    sample.sender_ms = sender_ms if type(sender_ms) is int else None
+    sender_id = telemetry.get("id")
+    sample.sender_id = sender_id if isinstance(sender_id, (int, str)) else None  # Must be hashable
+    sample.oriented = False
+    if "dir" in telemetry:
+        try:
+            (fx, fy, fz), (ux, uy, uz) = telemetry["dir"], telemetry["up"]
+            _set_orientation(sample, (float(fx), float(fy), float(fz), float(ux), float(uy), float(uz)))
+        except (ValueError, KeyError, TypeError):
+            pass
+    sample.binary = False
+    return True
+
+
+def _set_orientation(sample, orientation):
+    for value in orientation:
+        if not isfinite(value):
+            return
+    sample.fx, sample.fy, sample.fz, sample.ux, sample.uy, sample.uz = orientation
+    sample.oriented = True
+
+
+def pack_binary_into(buf, seq, sender_ms, vx, vy, vz, sender_id=None, orientation=None):
+    """Pack a binary packet into `buf` (MAX_PACKET_SIZE is always enough); returns its length.
+
+    `orientation` is (fx, fy, fz, ux, uy, uz): the vehicle's forward and up unit vectors.
+    """
+    flags = (FLAG_SENDER_ID if sender_id is not None else 0) | (FLAG_ORIENTATION if orientation is not None else 0)
+    if sender_id is None:
+        PACKET_V1.pack_into(buf, 0, MAGIC, VERSION, flags, seq & 0xFFFFFFFF, sender_ms & 0xFFFFFFFF, vx, vy, vz)
+        size = PACKET_V1.size
+    else:
+        PACKET_V1_ID.pack_into(buf, 0, MAGIC, VERSION, flags, seq & 0xFFFFFFFF, sender_ms & 0xFFFFFFFF,
+                               vx, vy, vz, sender_id & 0xFFFFFFFF)
+        size = PACKET_V1_ID.size
+    if orientation is not None:
+        _ORIENTATION.pack_into(buf, size, *orientation)
+        size += _ORIENTATION.size
+    return size
+
+
+def encode_binary(seq, sender_ms, vx, vy, vz, sender_id=None, orientation=None):
+    if sender_id is None and orientation is None:
+        return PACKET_V1.pack(MAGIC, VERSION, 0, seq & 0xFFFFFFFF, sender_ms & 0xFFFFFFFF, vx, vy, vz)
+    buf = bytearray(MAX_PACKET_SIZE)
+    return bytes(buf[:pack_binary_into(buf, seq, sender_ms, vx, vy, vz, sender_id, orientation)])
+
+
+def encode_json(seq, sender_ms, vx, vy, vz, sender_id=None, orientation=None):
+    message = {"vel": [vx, vy, vz], "seq": seq, "t": sender_ms}
+    if sender_id is not None:
+        message["id"] = sender_id
+    if orientation is not None:
+        message["dir"], message["up"] = list(orientation[:3]), list(orientation[3:])
+    return json.dumps(message).encode("utf-8")
+
+
+def encode_sender_config(version, max_send_hz, change_threshold, keepalive):
+    return b"%s%d %.2f %.4f %.3f" % (SENDER_CONFIG_PREFIX, version, max_send_hz, change_threshold, keepalive)
+
+
+def decode_sender_config(data):
+    """(version, max_send_hz, change_threshold, keepalive), or None if `data` is not a sender config."""
+    if not data.startswith(SENDER_CONFIG_PREFIX):
+        return None
+    try:
+        version, max_send_hz, change_threshold, keepalive = data[len(SENDER_CONFIG_PREFIX):].split()
+        return int(version), float(max_send_hz), float(change_threshold), float(keepalive)
+    except ValueError:
+        return None
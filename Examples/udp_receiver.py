@@ -0,0 +1,95 @@
+
+import select
+import socket
+
+# BeamNG sends one telemetry datagram per rendered frame (updateGFX), which at
+# 100+ FPS is far more than a fan can use. Reading one packet per loop
+# iteration means the socket queue grows and the fan reacts to stale speeds,
+# so instead every wake-up drains the whole queue and keeps only the newest.
+
+BUFFER_SIZE = 1024
+
+
+class DrainingReceiver:
+    def __init__(self, sock, buffer_size=BUFFER_SIZE):
+        sock.setblocking(False)
+        self.sock = sock
+        # Two preallocated buffers: each datagram is read into the spare one,
+        # and the two are swapped so `buffer` always holds the newest packet.
+        self.buffer = bytearray(buffer_size)
+        self._spare = bytearray(buffer_size)
+        self.received = 0        # Datagrams read since start
+        self.skipped = 0         # Stale datagrams dropped in favour of newer ones
+        self.last_skipped = 0    # Stale datagrams dropped on the last drain
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def wait(self, timeout=None):
+        """Block until a datagram is queued or `timeout` seconds pass."""
+        # select() rather than poll(): microsecond timeouts (poll rounds to
+        # whole milliseconds, which shows up as control tick jitter) and it
+        # works on Windows; with a single socket the cost is the same.
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return bool(readable)
+
+    def drain(self):
+        """Read everything queued on the socket without blocking.
+
+        Returns the length of the newest datagram, which is left in
+        `self.buffer`, or 0 if nothing was queued.
+        """
+        nbytes = 0
+        count = 0
+        while True:
+            try:
+                n = self.sock.recv_into(self._spare)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                # Windows reports ICMP port-unreachable on UDP sockets; ignore it
+                continue
+            self.buffer, self._spare = self._spare, self.buffer
+            nbytes = n
+            count += 1
+        self.last_skipped = max(0, count - 1)
+        self.received += count
+        self.skipped += self.last_skipped
+        return nbytes
+
+    def drain_each(self, handle):
+        """Read everything queued, calling `handle(buffer, nbytes, address)` per datagram.
+
+        For several senders on one port (see sender_streams.py), where the
+        newest datagram overall is not the newest from every sender. The
+        buffer is reused, so `handle` must decode it before returning.
+        Returns the number of datagrams read.
+        """
+        buffer = self.buffer
+        recvfrom_into = self.sock.recvfrom_into
+        count = 0
+        while True:
+            try:
+                nbytes, address = recvfrom_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                continue
+            count += 1
+            handle(buffer, nbytes, address)
+        self.last_skipped = 0
+        self.received += count
+        return count
+
+    def receive_latest(self, timeout=None):
+        """Wait for telemetry, then drain the queue and keep the newest packet."""
+        if not self.wait(timeout):
+            self.last_skipped = 0
+            return 0
+        return self.drain()
+
+
+def open_telemetry_socket(ip="", port=4444):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((ip, port))
+    return sock
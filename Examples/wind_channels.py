@@ -0,0 +1,258 @@
+
+import time
+
+from control_loop import STALE_AFTER
+from pwm_backends import DEFAULT_FREQUENCY, DEFAULT_PIN, open_pwm
+from pwm_output import DEFAULT_DEADBAND, DEFAULT_MAX_WRITE_HZ, DEFAULT_SLEW_RATE
+from telemetry_protocol import MPS_TO_MPH
+from wind_curve import compile_curve
+
+np = None  # Imported when a ChannelBank is built: single-fan controllers never need it
+
+# Several fans driven by the direction of the relative wind, not just its
+# forward component.
+#
+# The velocity is projected onto the vehicle's frame (forward, right, up;
+# TelemetrySample.vehicle_velocity(), using the orientation main.lua sends),
+# and each channel (fan) has a unit axis in that frame: the fan blows when
+# the car moves along its axis. A center fan on "forward" gives the headwind,
+# fans on "left" / "right" the crosswind of a slide (sliding to the right,
+# the air comes from the right), and "up" / "down" a jump or a crest. Each
+# channel has its own curve, top speed and maximum power, so side fans can
+# reach full power at slide speeds rather than at the car's top speed.
+#
+# ChannelBank holds all channels as arrays, and step() evaluates them in one
+# NumPy step per tick: a (channels x 3) @ (3,) projection, a gather from the
+# stacked curve lookup tables, then the slew / deadband / write-rate limits
+# of pwm_output.OutputStage, applied elementwise. Only the channels whose
+# output changes are written, so a tick costs about the same for one fan as
+# for eight.
+#
+# Every channel needs an output of its own: a distinct "pin", or with the
+# sysfs backend a distinct "chip" / "channel" (required there). A Pi 1-4 has
+# two hardware PWM channels (GPIO12 or 18, GPIO13 or 19), so three fans need
+# PWM_BACKEND = "gpio" (software PWM, any pin) or a Pi 5 with sysfs:
+#
+#   CHANNELS = [
+#       {"name": "center", "pin": 18, "axis": "forward"},
+#       {"name": "left", "pin": 23, "axis": "left", "top_speed": 40},
+#       {"name": "right", "pin": 24, "axis": "right", "top_speed": 40},
+#   ]
+
+AXES = {
+    "forward": (1.0, 0.0, 0.0),
+    "back": (-1.0, 0.0, 0.0),
+    "right": (0.0, 1.0, 0.0),
+    "left": (0.0, -1.0, 0.0),
+    "up": (0.0, 0.0, 1.0),
+    "down": (0.0, 0.0, -1.0),
+}
+CHANNEL_FIELDS = ("name", "axis", "curve", "top_speed", "max_power", "pin", "chip", "channel")
+
+
+def _unit_axis(axis):
+    if isinstance(axis, str):
+        if axis not in AXES:
+            raise ValueError(f"Unknown axis {axis!r}, expected one of {tuple(AXES)} or a (forward, right, up) vector")
+        return AXES[axis]
+    x, y, z = (float(c) for c in axis)
+    norm = (x * x + y * y + z * z) ** 0.5
+    if norm == 0.0:
+        raise ValueError("A channel axis must not be the zero vector")
+    return x / norm, y / norm, z / norm
+
+
+def _describe_output(output):
+    kind = output[0]
+    if kind == "sysfs":
+        return f"pwmchip{output[1]}/pwm{output[2]}"
+    if kind == "pwm":
+        return f"hardware PWM channel {output[1]}"
+    return f"GPIO{output[1]}"
+
+
+def channel_specs(channels):
+    """Validated channel dicts from config: unknown keys rejected, axes normalised.
+
+    A channel without "top_speed" or "curve" follows the global config
+    (None here); "name" defaults to the axis name. Two channels on the same
+    pin or sysfs chip / channel are rejected.
+    """
+    specs = []
+    outputs = {}
+    for i, channel in enumerate(channels):
+        unknown = set(channel) - set(CHANNEL_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown channel field(s): {', '.join(sorted(unknown))}")
+        axis = channel.get("axis", "forward")
+        spec = dict.fromkeys(CHANNEL_FIELDS)
+        spec.update(channel)
+        spec["axis"] = _unit_axis(axis)
+        spec["name"] = str(channel.get("name", axis if isinstance(axis, str) else f"channel{i}"))
+        spec["max_power"] = float(channel.get("max_power", 100.0))
+        keys = []
+        if spec["chip"] is not None or spec["channel"] is not None:
+            keys.append(("sysfs", spec["chip"] or 0, spec["channel"] or 0))
+        if spec["pin"] is not None or not keys:
+            keys.append(("gpio", spec["pin"] if spec["pin"] is not None else DEFAULT_PIN))
+        for key in keys:
+            if key in outputs:
+                raise ValueError(f"Channels {outputs[key]!r} and {spec['name']!r} both use {_describe_output(key)}")
+            outputs[key] = spec["name"]
+        specs.append(spec)
+    if not specs:
+        raise ValueError("At least one channel is needed")
+    return specs
+
+
+def open_channel_pwms(channels, backend="auto", frequency=DEFAULT_FREQUENCY):
+    """One pwm_backends output per channel, on the channel's "pin" (or sysfs "chip" / "channel").
+
+    Raises ValueError if two channels end up driving the same physical output,
+    e.g. GPIO12 and GPIO18, which share a hardware PWM channel.
+    """
+    specs = channel_specs(channels)
+    if backend == "sysfs":
+        missing = [spec["name"] for spec in specs if spec["chip"] is None or spec["channel"] is None]
+        if missing:
+            raise ValueError(f"The sysfs backend needs \"chip\" and \"channel\" for every channel: {', '.join(missing)}")
+    pwms = []
+    used = {}
+    try:
+        for spec in specs:
+            pin = spec["pin"] if spec["pin"] is not None else DEFAULT_PIN
+            pwm = open_pwm(backend, pin, frequency, spec["chip"], spec["channel"])
+            pwms.append(pwm)
+            if pwm.output is not None:
+                if pwm.output in used:
+                    raise ValueError(f"Channels {used[pwm.output]!r} and {spec['name']!r} both drive "
+                                     f"{_describe_output(pwm.output)}")
+                used[pwm.output] = spec["name"]
+    except BaseException:
+        for pwm in pwms:
+            pwm.close()
+        raise
+    return pwms
+
+
+class ChannelBank:
+    def __init__(self, channels, writers, top_speed=150, curve="linear", deadband=DEFAULT_DEADBAND,
+                 max_write_hz=DEFAULT_MAX_WRITE_HZ, slew_rate=DEFAULT_SLEW_RATE, stale_after=STALE_AFTER,
+                 clock=time.monotonic):
+        """`channels` as for channel_specs(); `writers[i](power)` does channel i's hardware write.
+
+        `top_speed` and `curve` apply to channels that do not set their own.
+        """
+        global np
+        if np is None:
+            try:
+                import numpy as np
+            except ImportError:
+                raise RuntimeError("Multi-channel output requires numpy") from None
+        self.specs = channel_specs(channels)
+        if len(writers) != len(self.specs):
+            raise ValueError(f"{len(self.specs)} channels but {len(writers)} writers")
+        self.writers = list(writers)
+        self.names = [spec["name"] for spec in self.specs]
+        self.stale_after = stale_after
+        self.clock = clock
+        n = len(self.specs)
+        self.axes = np.array([spec["axis"] for spec in self.specs])
+        self.max_power = np.array([spec["max_power"] for spec in self.specs])
+        self._rows = np.arange(n)
+        self.curves = [None] * n
+        self.top_speed = self.curve = None
+        self.set_curve(curve, top_speed)
+        self.configure(deadband, max_write_hz, slew_rate)
+
+        self.velocity = np.zeros(3)  # Newest (forward, right, up) velocity, mph
+        self.time = None             # Arrival time of the newest sample
+        self.target = np.zeros(n)    # Curve output
+        self.value = np.zeros(n)     # Slew-limited power
+        self.written = np.full(n, np.nan)  # Last power sent to each fan; NaN before the first write
+        self.writes = 0
+        self.suppressed = 0  # Counted once per held-back target, as in OutputStage
+        self._held_target = np.full(n, np.nan)
+        self._last_update = None
+        self._last_write = np.full(n, -np.inf)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def set_curve(self, curve, top_speed):
+        """Recompile the lookup tables of the channels that follow the global curve / top speed."""
+        if curve == self.curve and top_speed == self.top_speed:
+            return
+        self.curve, self.top_speed = curve, top_speed
+        for i, spec in enumerate(self.specs):
+            self.curves[i] = compile_curve(spec["curve"] or curve, spec["top_speed"] or top_speed, None,
+                                           spec["max_power"])
+        # Stacked tables: one row per channel, indexed like CompiledCurve.__call__
+        self._lut = np.array([c._lut for c in self.curves])
+        self._slope = np.array([c._slope for c in self.curves])
+        self._scale = np.array([c._scale for c in self.curves])
+        self._last = self._lut.shape[1] - 1
+
+    def configure(self, deadband, max_write_hz, slew_rate):
+        """Output limits shared by all channels, as pwm_output.OutputStage.configure()."""
+        self.deadband = deadband
+        self.min_interval = 1.0 / max_write_hz if max_write_hz else 0.0
+        self.slew_rate = slew_rate
+
+    def update(self, sample, now):
+        """Take the velocity of a decoded TelemetrySample (as StreamDemux does for the driving stream)."""
+        forward, right, up = sample.vehicle_velocity()
+        velocity = self.velocity
+        velocity[0] = forward * MPS_TO_MPH
+        velocity[1] = right * MPS_TO_MPH
+        velocity[2] = up * MPS_TO_MPH
+        self.time = now
+
+    def reset(self):
+        self.velocity[:] = 0.0
+        self.time = None
+
+    def speeds(self, now):
+        """Wind speed along each channel's axis, mph (0 once the telemetry is stale)."""
+        if self.time is None or (self.stale_after is not None and now - self.time > self.stale_after):
+            return np.zeros(len(self.specs))
+        return np.maximum(self.axes @ self.velocity, 0.0)
+
+    def step(self, now=None):
+        """Evaluate every channel and write those that changed; returns the number of writes."""
+        if now is None:
+            now = self.clock()
+        x = np.minimum(self.speeds(now) * self._scale, self._last)
+        i = x.astype(np.intp)
+        target = self.target = self._lut[self._rows, i] + self._slope[self._rows, i] * (x - i)
+
+        if self._last_update is None:
+            self._last_update = now
+        value = target
+        if self.slew_rate:
+            step = self.slew_rate * (now - self._last_update)
+            value = np.clip(target, self.value - step, self.value + step)
+        self.value = value
+        self._last_update = now
+
+        delta = np.abs(value - self.written)  # NaN before the first write
+        changed = delta != 0.0
+        at_limit = (value <= 0.0) | (value >= self.max_power)
+        due = now - self._last_write >= self.min_interval
+        write = np.isnan(delta) | (changed & ((delta >= self.deadband) | at_limit) & due)
+        held = changed & ~write
+        self.suppressed += int(np.count_nonzero(held & (target != self._held_target)))
+        self._held_target[held] = target[held]
+        self._held_target[write] = np.nan
+        indices = np.flatnonzero(write)
+        if not len(indices):
+            return 0
+        for k in indices.tolist():
+            self.writers[k](float(value[k]))
+        self.written[indices] = value[indices]
+        self._last_write[indices] = now
+        self.writes += len(indices)
+        return len(indices)
+
+    def describe(self):
+        return ", ".join(f"{name} {power:.1f}%" for name, power in zip(self.names, self.value.tolist()))
@@ -0,0 +1,159 @@
+
+import json
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+from pwm_output import DEFAULT_DEADBAND, DEFAULT_MAX_WRITE_HZ, DEFAULT_SLEW_RATE
+from sender_control import (CHANGE_THRESHOLD_RANGE, DEFAULT_SENDER_SETTINGS, KEEPALIVE_RANGE, MAX_SEND_HZ_RANGE,
+                            SenderSettings)
+
+# The full wind config (top speed, curve, output limits, main.lua rate
+# control), persisted on disk so it survives restarts.
+#
+# A WindConfig is immutable. ConfigStore keeps the current one in a single
+# attribute, `snapshot`, as a (version, config) tuple; an update builds a new
+# tuple and rebinds the attribute, which is atomic in Python. The packet path
+# therefore never takes a lock or reads the file:
+#
+#   if store.snapshot is not applied:    # one attribute load per tick
+#       applied = store.snapshot
+#       version, config = applied
+#       ...recompile the curve, reconfigure the output stage...
+#
+# Only writers (the config HTTP server, see config_http.py) serialise on a
+# lock. Each update is written to a temp file, fsynced and renamed over the
+# old file, so a power cut leaves either the old or the new config, never a
+# partial one.
+
+WIND_CONFIG_FIELDS = ("top_speed", "curve", "deadband", "max_write_hz", "slew_rate",
+                      "max_send_hz", "change_threshold", "keepalive")
+CONFIG_CURVES = ("linear", "quadratic", "cubic", "piecewise")  # "points" needs points; not editable here
+TOP_SPEED_RANGE = (1.0, 250.0)     # mph
+DEADBAND_RANGE = (0.0, 10.0)       # % duty cycle
+MAX_WRITE_HZ_RANGE = (0.0, 1000.0) # Writes per second; 0 = unlimited
+SLEW_RATE_RANGE = (0.0, 10000.0)   # % per second; 0 = unlimited
+_RANGES = {
+    "top_speed": TOP_SPEED_RANGE,
+    "deadband": DEADBAND_RANGE,
+    "max_write_hz": MAX_WRITE_HZ_RANGE,
+    "slew_rate": SLEW_RATE_RANGE,
+    "max_send_hz": MAX_SEND_HZ_RANGE,
+    "change_threshold": CHANGE_THRESHOLD_RANGE,
+    "keepalive": KEEPALIVE_RANGE,
+}
+CONFIG_PATH = os.environ.get("ALTUS_VENTUS_CONFIG",
+                             os.path.join(os.path.expanduser("~"), ".altus_ventus", "wind_config.json"))
+
+
+class WindConfig(namedtuple("WindConfig", WIND_CONFIG_FIELDS)):
+    __slots__ = ()
+
+    @property
+    def sender(self):
+        return SenderSettings(self.max_send_hz, self.change_threshold, self.keepalive)
+
+
+DEFAULT_WIND_CONFIG = WindConfig(150.0, "linear", DEFAULT_DEADBAND, float(DEFAULT_MAX_WRITE_HZ), DEFAULT_SLEW_RATE,
+                                 *DEFAULT_SENDER_SETTINGS)
+
+
+def wind_config(base=DEFAULT_WIND_CONFIG, **changes):
+    """A new WindConfig from `base` with (possibly untrusted) `changes`, clamped to safe ranges.
+
+    Raises ValueError for unknown fields, non-numeric values or an unknown curve.
+    """
+    unknown = set(changes) - set(WIND_CONFIG_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown config field(s): {', '.join(sorted(unknown))}")
+    values = base._asdict()
+    for name, value in changes.items():
+        if value is None:
+            continue
+        if name == "curve":
+            if value not in CONFIG_CURVES:
+                raise ValueError(f"Unknown curve {value!r}, expected one of {CONFIG_CURVES}")
+        else:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be a number, got {value!r}") from None
+            if value != value:  # NaN
+                raise ValueError(f"{name} must be a number, got {value!r}")
+            low, high = _RANGES[name]
+            value = min(max(value, low), high)
+        values[name] = value
+    return WindConfig(**values)
+
+
+class ConfigStore:
+    def __init__(self, path=CONFIG_PATH, default=DEFAULT_WIND_CONFIG):
+        self.path = path
+        self._lock = threading.Lock()  # Writers only
+        self._listeners = []
+        self.snapshot = (1, self._load(default))
+
+    @property
+    def config(self):
+        return self.snapshot[1]
+
+    @property
+    def version(self):
+        return self.snapshot[0]
+
+    def _load(self, default):
+        try:
+            with open(self.path) as f:
+                return wind_config(default, **json.load(f))
+        except FileNotFoundError:
+            return default
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Warning: Ignoring unreadable config {self.path}: {e}")
+            return default
+
+    def add_listener(self, callback):
+        """Call `callback(version, config)` after every change (on the writer's thread)."""
+        self._listeners.append(callback)
+
+    def update(self, **changes):
+        """Validate, persist and publish a change; returns the new snapshot.
+
+        Raises ValueError for invalid values and OSError if the file cannot be
+        written (the running config is then left unchanged).
+        """
+        with self._lock:
+            version, config = self.snapshot
+            new_config = wind_config(config, **changes)
+            if new_config == config:
+                return self.snapshot
+            self._save(new_config)
+            self.snapshot = snapshot = (version + 1, new_config)
+        for callback in self._listeners:
+            callback(*snapshot)
+        return snapshot
+
+    def _save(self, config):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".wind_config.", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(config._asdict(), f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        try:  # Make the rename itself durable
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return  # e.g. Windows, where directories cannot be opened
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
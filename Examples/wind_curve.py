@@ -0,0 +1,110 @@
+
+np = None  # Imported on first evaluate_batch(): only replay and plotting need it, and it slows controller startup
+
+# Wind response curves: game speed (mph) -> fan power (0-100 %).
+#
+# A curve is compiled into a lookup table whenever its config (kind, top
+# speed, points) changes, so evaluating it per packet is one multiply, an
+# index and a linear interpolation, whatever the curve shape.
+#
+#   linear     power = s * 100                 (fan_controller_pwm.py)
+#   quadratic  power = s ** 2 * 100            (fan_controller.py)
+#   cubic      power = s ** 3 * 100            (fan law: fan power ~ speed ** 3)
+#   piecewise  the "desired feel" table from the README, ending at 100 % at top speed
+#   points     user-supplied (speed_mph, power) points, interpolated linearly
+#
+# where s = speed / top_speed clamped to 0..1. The original scripts also
+# scaled through a virtual max_real_wind (70 mph); it cancels out of every
+# formula, so it is not a parameter here.
+
+CURVE_KINDS = ("linear", "quadratic", "cubic", "piecewise", "points")
+LUT_SIZE = 256
+
+# Game speed (mph) -> target wind power feel (%), from the README / Overview.docx
+FEEL_TABLE = ((0, 0), (20, 10), (40, 25), (60, 50), (80, 75), (100, 90))
+
+_EXPONENTS = {"linear": 1, "quadratic": 2, "cubic": 3}
+
+
+def _interp(points, x):
+    """Linear interpolation through sorted (x, y) points, clamped at both ends."""
+    if x <= points[0][0]:
+        return points[0][1]
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        if x <= x1:
+            return y0 + (y1 - y0) * (x - x0) / (x1 - x0) if x1 > x0 else y1
+    return points[-1][1]
+
+
+def _curve_points(kind, top_speed, points, max_power):
+    if kind == "piecewise":
+        table = [(s, p * max_power / 100) for s, p in FEEL_TABLE if s < top_speed]
+        return table + [(top_speed, max_power)]
+    points = sorted((float(s), float(p)) for s, p in points)
+    if not points:
+        raise ValueError("'points' curve needs at least one (speed, power) point")
+    if points[0][0] > 0:
+        points.insert(0, (0.0, 0.0))
+    return points
+
+
+class CompiledCurve:
+    def __init__(self, kind="linear", top_speed=150, points=None, max_power=100, size=LUT_SIZE):
+        if kind not in CURVE_KINDS:
+            raise ValueError(f"Unknown curve kind {kind!r}, expected one of {CURVE_KINDS}")
+        self.kind = kind
+        self.top_speed = top_speed
+        self.points = tuple(points) if points else None
+        self.max_power = max_power
+
+        if kind in _EXPONENTS:
+            span = float(top_speed)
+            exponent = _EXPONENTS[kind]
+            table = [(i / (size - 1)) ** exponent * max_power for i in range(size)]
+        else:
+            curve_points = _curve_points(kind, top_speed, points or (), max_power)
+            span = float(curve_points[-1][0])
+            table = [_interp(curve_points, span * i / (size - 1)) for i in range(size)]
+        table = [min(max(p, 0.0), max_power) for p in table]
+
+        if span <= 0:  # top_speed not set properly; keep the fan off
+            table = [0.0] * size
+            span = 1.0
+        self.span = span  # Speed (mph) covered by the table; beyond it the last value holds
+        self._scale = (size - 1) / span
+        self._last = size - 1
+        self._lut = table
+        self._slope = [b - a for a, b in zip(table, table[1:])] + [0.0]
+        self._np_xs = None
+
+    def __call__(self, speed_mph):
+        x = speed_mph * self._scale
+        if not x > 0:  # Also NaN, which would fail both range checks and break int(x)
+            return self._lut[0]
+        if x >= self._last:
+            return self._lut[self._last]
+        i = int(x)
+        return self._lut[i] + self._slope[i] * (x - i)
+
+    def evaluate_batch(self, speeds_mph):
+        """Evaluate a whole array of speeds at once (for replay and plotting). Needs NumPy."""
+        global np
+        if np is None:
+            try:
+                import numpy as np
+            except ImportError:
+                raise RuntimeError("evaluate_batch() requires numpy") from None
+        if self._np_xs is None:
+            self._np_xs = np.linspace(0.0, self.span, len(self._lut))
+            self._np_lut = np.asarray(self._lut)
+        return np.interp(np.asarray(speeds_mph, dtype=float), self._np_xs, self._np_lut)
+
+    def with_top_speed(self, top_speed):
+        """Recompile for a new top speed, keeping the rest of the config."""
+        if top_speed == self.top_speed:
+            return self
+        return CompiledCurve(self.kind, top_speed, self.points, self.max_power, len(self._lut))
+
+
+def compile_curve(kind="linear", top_speed=150, points=None, max_power=100):
+    return CompiledCurve(kind, top_speed, points, max_power)
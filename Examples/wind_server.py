@@ -1,9 +1,17 @@
 
-from flask import Flask, request, render_template_string
+from flask import Flask, Response, request, render_template_string
+from metrics import read_metrics_file
+from shared_config import SharedConfigWriter
+from wind_config import ConfigStore
 
 app = Flask(__name__)
 
-top_speed = 150  # Default top speed
+# Top speed and main.lua send rate / change threshold / keepalive, saved to
+# wind_config.json so they survive restarts. For the whole config (curve, PWM
+# limits) without a separate Flask process, see CONFIG_HTTP_PORT in
+# fan_controller_pwm.py.
+store = ConfigStore()
+shared_config = None  # Shared-memory block read by fan_controller*.py; opened in __main__
 
 HTML = '''
 <!DOCTYPE html>
@@ -13,30 +21,56 @@ HTML = '''
 <title>BeamNG Fan Controller</title>
 </head>
 <body>
+{% if error %}<p style="color: red">{{error}}</p>{% endif %}
 <h2>Set In-Game Car Top Speed</h2>
 <form method="post">
 <input type="number" name="top_speed" value="{{top_speed}}" min="1" max="250" required>
 <input type="submit" value="Set">
 </form>
 <p>Current top speed: {{top_speed}} mph</p>
+<h2>Telemetry Sender (main.lua)</h2>
+<form method="post">
+<label>Max send rate (Hz) <input type="number" name="max_send_hz" value="{{sender.max_send_hz}}" min="1" max="240" step="any" required></label><br>
+<label>Change threshold (m/s) <input type="number" name="change_threshold" value="{{sender.change_threshold}}" min="0" max="5" step="any" required></label><br>
+<label>Keepalive when unchanged (s) <input type="number" name="keepalive" value="{{sender.keepalive}}" min="0.1" max="1.5" step="any" required></label><br>
+<input type="submit" value="Set">
+</form>
 </body>
 </html>
 '''
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    global top_speed
+    error = None
     if request.method == 'POST':
         try:
-            ts = int(request.form['top_speed'])
-            if 1 <= ts <= 250:
-                top_speed = ts
-        except:
-            pass
-    return render_template_string(HTML, top_speed=top_speed)
+            if 'top_speed' in request.form:
+                ts = int(request.form['top_speed'])
+                if not 1 <= ts <= 250:
+                    raise ValueError(ts)
+                store.update(top_speed=ts)
+            else:
+                store.update(max_send_hz=request.form['max_send_hz'],
+                             change_threshold=request.form['change_threshold'],
+                             keepalive=request.form['keepalive'])  # Clamped to safe ranges
+            if shared_config is not None:
+                shared_config.write(get_top_speed(), store.config.sender)
+        except (KeyError, ValueError):
+            error = "Invalid value; nothing was changed."
+        except OSError as e:
+            print(f"Error: Could not save {store.path}: {e}")
+            error = f"Could not save the config: {e}"
+    return render_template_string(HTML, top_speed=get_top_speed(), sender=store.config.sender, error=error)
+
+# Prometheus-style pipeline metrics published by the fan controller process
+@app.route('/metrics')
+def metrics():
+    return Response(read_metrics_file(), mimetype='text/plain; version=0.0.4')
 
 def get_top_speed():
-    return top_speed
+    top_speed = store.config.top_speed
+    return int(top_speed) if top_speed.is_integer() else top_speed
 
 if __name__ == '__main__':
+    shared_config = SharedConfigWriter(get_top_speed(), sender=store.config.sender)
     app.run(host='0.0.0.0', port=5000)
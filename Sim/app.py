@@ -1,91 +1,60 @@
+import os
+import sys
+import weakref
 import streamlit as st
-import time
-import random
-import pandas as pd
+import numpy as np
 import plotly.graph_objects as go # Import Plotly
 
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from downsample import DOWNSAMPLE_METHODS
+from live_monitor import LiveMonitor
+from sim_engine import SimulationEngine
+from speed_filter import FILTER_KINDS
+
 # --- Configuration & State Initialization ---
 DEFAULT_TOP_SPEED = 70
+DEFAULT_WIND_CURVE = "linear"
+WIND_CURVE_OPTIONS = ("linear", "quadratic", "cubic", "piecewise") # "points" needs user-supplied points
+SIMULATION_RATE_HZ = 10 # Simulation steps per second, run by the engine thread
+MAX_HISTORY_POINTS = 36_000 # One hour at 10 Hz, preallocated
+HISTORY_3D_POINTS = 1_000 # Markers get expensive in 3D; show the most recent stretch
+LIVE_HISTORY_POINTS = 1_500_000 # Live mode records every packet: about three hours at 144 Hz
+MAX_CHART_POINTS = 2_000 # Per history trace, however long the session; see downsample.py
+MODES = ("Simulation", "Live monitor")
+# UI refresh cadence while the simulation runs, independent of the simulation rate.
+# Only the fragments below rerun; the controls and the rest of the page do not.
+STATUS_REFRESH_S = 0.25 # Metrics and gauge
+CHART_REFRESH_S = 1.0 # Curve marker, history, 3D view and log
 
-if 'initialized' not in st.session_state:
-    st.session_state.initialized = True
-    st.session_state.top_speed = DEFAULT_TOP_SPEED
-    st.session_state.current_game_speed_mph = 0.0
-    st.session_state.current_pwm_power = 0.0
-    st.session_state.simulation_running = False
-    st.session_state.manual_speed_mode = False
-    st.session_state.manual_speed_setpoint_mph = 0.0
-    st.session_state.log_messages = ["Simulator initialized. Welcome!"]
-    st.session_state.history_data = pd.DataFrame(columns=['Time', 'Game Speed (mph)', 'PWM Power (%)'])
-    st.session_state.start_time = time.time()
-
-# --- Core Logic ---
-def calculate_motor_power(current_speed_mph, top_speed_setting):
-    if top_speed_setting <= 0:
-        return 0.0
-    motor_power = (current_speed_mph / top_speed_setting) * 100
-    motor_power = max(0.0, min(100.0, motor_power))
-    return motor_power
-
-def add_log(message):
-    max_logs = 30
-    st.session_state.log_messages.append(f"{time.strftime('%H:%M:%S')}: {message}")
-    if len(st.session_state.log_messages) > max_logs:
-        st.session_state.log_messages = st.session_state.log_messages[-max_logs:]
-
-def update_history(game_speed, pwm_power):
-    max_history_points = 100
-    current_time_elapsed = time.time() - st.session_state.start_time
-    new_data_dict = {
-        'Time': [current_time_elapsed],
-        'Game Speed (mph)': [game_speed],
-        'PWM Power (%)': [pwm_power]
-    }
-    new_data_df = pd.DataFrame(new_data_dict)
-    st.session_state.history_data = pd.concat([st.session_state.history_data, new_data_df], ignore_index=True)
-    if len(st.session_state.history_data) > max_history_points:
-        st.session_state.history_data = st.session_state.history_data.iloc[-max_history_points:]
-
-# --- Game Telemetry Simulation Step ---
-def run_simulation_step():
-    if not st.session_state.simulation_running:
-        if st.session_state.current_game_speed_mph != 0.0:
-            st.session_state.current_game_speed_mph = 0.0
-            st.session_state.current_pwm_power = calculate_motor_power(
-                st.session_state.current_game_speed_mph,
-                st.session_state.top_speed
-            )
-            update_history(st.session_state.current_game_speed_mph, st.session_state.current_pwm_power)
-            add_log("Simulation stopped. Speed and PWM set to 0.")
-        return
-
-    if st.session_state.manual_speed_mode:
-        new_speed = st.session_state.manual_speed_setpoint_mph
-        if abs(new_speed - st.session_state.current_game_speed_mph) > 0.01 :
-             add_log(f"Manual speed updated to: {new_speed:.2f} mph")
-    else: 
-        baseline_speed = st.session_state.top_speed * 0.4 
-        fluctuation = random.uniform(-st.session_state.top_speed * 0.1, st.session_state.top_speed * 0.1)
-        change_factor = 0.3
-        target_random_speed = baseline_speed + fluctuation
-        current_speed = st.session_state.current_game_speed_mph
-        new_speed = current_speed * (1-change_factor) + target_random_speed * change_factor
-        max_possible_speed = st.session_state.top_speed
-        new_speed = max(0, min(new_speed, max_possible_speed))
-        add_log(f"Random speed generated: {new_speed:.2f} mph")
-
-    st.session_state.current_game_speed_mph = new_speed
-    st.session_state.current_pwm_power = calculate_motor_power(
-        st.session_state.current_game_speed_mph,
-        st.session_state.top_speed
-    )
-    add_log(f"PWM: {st.session_state.current_pwm_power:.2f}% (Speed: {st.session_state.current_game_speed_mph:.2f} mph, Top: {st.session_state.top_speed} mph)")
-    update_history(st.session_state.current_game_speed_mph, st.session_state.current_pwm_power)
+
+class SessionGuard:
+    """Held only by st.session_state, so it is collected when the browser session ends."""
+
+
+def session_resource(key, factory):
+    """st.session_state[key], created by `factory()` on first use and closed when the session ends.
+
+    The resource's own thread keeps it alive, so the session's end is taken
+    from a guard object nothing else refers to.
+    """
+    if key not in st.session_state:
+        resource = factory()
+        st.session_state[key] = resource
+        guard = st.session_state[key + "_guard"] = SessionGuard()
+        weakref.finalize(guard, resource.close)
+    return st.session_state[key]
+
+
+# One engine (and simulation thread) per browser session; it survives reruns
+engine = session_resource("engine", lambda: SimulationEngine(DEFAULT_TOP_SPEED, DEFAULT_WIND_CURVE,
+                                                              SIMULATION_RATE_HZ, MAX_HISTORY_POINTS))
+monitor = st.session_state.get("monitor")  # Created the first time live mode is selected
 
 # --- UI Layout ---
 st.set_page_config(layout="wide", page_title="Altus Ventus Simulator")
 st.title("💨 Project Altus Ventus - Wind Simulator")
-st.markdown("An interactive simulator for the wind generation system. Adjust parameters and observe the real-time simulated output for fan control.")
+st.markdown("An interactive simulator for the wind generation system. Adjust parameters and observe the real-time simulated output for fan control, or switch to live mode to watch real telemetry.")
 
 controls_col, visuals_col = st.columns([1, 2])
 
@@ -95,59 +64,108 @@ with controls_col:
         "Vehicle Top Speed for Scaling (mph):",
         min_value=10, 
         max_value=300,
-        value=st.session_state.top_speed,
+        value=engine.top_speed,
         step=10,
         key="top_speed_input",
         help="Set the game speed at which the fan PWM output will reach 100%."
     )
-    if new_top_speed != st.session_state.top_speed:
-        st.session_state.top_speed = new_top_speed
-        add_log(f"Vehicle Top Speed for scaling set to: {st.session_state.top_speed} mph")
-        st.session_state.current_pwm_power = calculate_motor_power(
-            st.session_state.current_game_speed_mph,
-            st.session_state.top_speed
-        )
+    new_wind_curve = st.selectbox(
+        "Wind Response Curve:",
+        WIND_CURVE_OPTIONS,
+        index=WIND_CURVE_OPTIONS.index(engine.wind_curve),
+        key="wind_curve_select",
+        help="How fan power scales with game speed. Quadratic and cubic (fan law) give much less wind at low speeds; piecewise follows the 'desired feel' table."
+    )
+    mode = st.radio("Mode:", MODES, horizontal=True, key="mode_radio",
+                    help="Live monitor listens for real game telemetry on a UDP port instead of simulating it.")
 
-    st.session_state.manual_speed_mode = st.checkbox("Enable Manual Speed Control", value=st.session_state.manual_speed_mode, key="manual_mode_checkbox")
-
-    if st.session_state.manual_speed_mode:
-        manual_max = float(st.session_state.top_speed)
-        current_manual_val = st.session_state.manual_speed_setpoint_mph
-        if current_manual_val > manual_max: 
-            current_manual_val = manual_max
-        new_manual_speed = st.slider(
-            "Set Game Speed Manually (mph):",
-            min_value=0.0,
-            max_value=manual_max,
-            value=current_manual_val,
-            step=1.0,
-            key="manual_speed_slider",
-            disabled=not st.session_state.manual_speed_mode
+    if mode == "Simulation":
+        if monitor is not None and monitor.running:
+            monitor.stop()
+        manual_speed_mode = st.checkbox("Enable Manual Speed Control", value=engine.manual_speed_mode, key="manual_mode_checkbox")
+
+        manual_speed = None
+        if manual_speed_mode:
+            manual_max = float(new_top_speed)
+            manual_speed = st.slider(
+                "Set Game Speed Manually (mph):",
+                min_value=0.0,
+                max_value=manual_max,
+                value=min(engine.manual_speed_setpoint_mph, manual_max),
+                step=1.0,
+                key="manual_speed_slider",
+            )
+        speed_filter = st.selectbox(
+            "Speed Filter:",
+            FILTER_KINDS,
+            index=FILTER_KINDS.index(engine.speed_filter),
+            key="speed_filter_select",
+            help="Smoothing between game speed and the wind curve, as in the controllers (speed_filter.py). Run benchmarks/filter_lag.py for the lag each one adds."
         )
-        if new_manual_speed != st.session_state.manual_speed_setpoint_mph:
-             st.session_state.manual_speed_setpoint_mph = new_manual_speed
-             
-    sim_button_text = "Stop Simulation" if st.session_state.simulation_running else "Start Simulation"
+        lead = st.slider("Lead (s):", min_value=0.0, max_value=0.5, value=float(engine.lead), step=0.05, key="lead_slider",
+                         disabled=speed_filter == "none",
+                         help="Command the fan for the speed this far ahead, using the filter's trend, to make up for motor spin-up time. Needs a speed filter: without one, the lead amplifies packet-to-packet noise.")
+        if speed_filter == "none":
+            lead = 0.0
+        # The engine thread picks these up on its next step; it logs what changed
+        engine.configure(top_speed=new_top_speed, wind_curve=new_wind_curve,
+                         manual_speed_mode=manual_speed_mode, manual_speed_setpoint_mph=manual_speed,
+                         speed_filter=speed_filter, lead=lead)
+        source = engine
+        toggle_labels = ("Stop Simulation", "Start Simulation")
+    else:
+        if engine.running:
+            engine.stop()
+        monitor = session_resource("monitor", lambda: LiveMonitor(DEFAULT_TOP_SPEED, DEFAULT_WIND_CURVE,
+                                                                  history_points=LIVE_HISTORY_POINTS))
+        live_port = st.number_input("Telemetry UDP Port:", min_value=1, max_value=65535, value=monitor.port,
+                                    step=1, key="live_port_input", disabled=monitor.running,
+                                    help="The port the game sends to. Nothing else (e.g. a controller) may be listening on it.")
+        forward_text = st.text_input("Forward to Controller (host:port):", value="", key="live_forward_input",
+                                     disabled=monitor.running,
+                                     help="Optional. Pass every packet on to a controller listening on another port, so the monitor can sit in front of it.")
+        forward = None
+        if forward_text.strip():
+            host, _, port_text = forward_text.strip().rpartition(":")
+            if host and port_text.isdigit():
+                forward = (host, int(port_text))
+            else:
+                st.warning("Forward address must look like 127.0.0.1:4445; not forwarding.")
+        # Packets from now on are scaled with the selected curve and top speed
+        monitor.configure(top_speed=new_top_speed, wind_curve=new_wind_curve, port=int(live_port), forward=forward)
+        senders, selected = monitor.sender_summary()
+        st.caption(f"Senders: {senders} · Showing: {selected}")
+        source = monitor
+        toggle_labels = ("Stop Monitoring", "Start Monitoring")
+
+    downsample_method = st.selectbox("Chart Downsampling:", DOWNSAMPLE_METHODS, key="downsample_select",
+                                     help=f"Long histories are reduced to at most {MAX_CHART_POINTS:,} points per trace. lttb keeps the shape of the line; minmax keeps every spike.")
+
+    sim_button_text = toggle_labels[0] if source.running else toggle_labels[1]
     if st.button(sim_button_text, key="sim_toggle_button"):
-        st.session_state.simulation_running = not st.session_state.simulation_running
-        if st.session_state.simulation_running:
-            add_log("Simulation started.")
-            st.session_state.start_time = time.time()
-            st.session_state.history_data = pd.DataFrame(columns=['Time', 'Game Speed (mph)', 'PWM Power (%)'])
+        if source.running:
+            source.stop()
         else:
-            add_log("Simulation stopped.")
-            
-with visuals_col:
-    st.header("📊 Live Status & Visuals")
-    
+            source.start() # The monitor logs why if it cannot bind the port
+        st.rerun() # Re-render the button label and switch the fragments' refresh on or off
+
+# Fragments rerun on their own timer while the simulation runs, without
+# re-executing the rest of the script; when it is stopped they only render
+# with the page.
+status_refresh = STATUS_REFRESH_S if source.running else None
+chart_refresh = CHART_REFRESH_S if source.running else None
+
+@st.fragment(run_every=status_refresh)
+def live_status():
+    _, speed_mph, pwm_power, _, _ = source.snapshot()
     status_m1, status_m2 = st.columns(2)
-    status_m1.metric(label="Current Simulated Game Speed", value=f"{st.session_state.current_game_speed_mph:.1f} mph")
-    status_m2.metric(label="Calculated PWM Power", value=f"{st.session_state.current_pwm_power:.1f} %")
+    status_m1.metric(label="Current Game Speed" if source is monitor else "Current Simulated Game Speed", value=f"{speed_mph:.1f} mph")
+    status_m2.metric(label="Calculated PWM Power", value=f"{pwm_power:.1f} %")
 
     st.subheader("Fan PWM Output Level (Gauge)")
     gauge_fig = go.Figure(go.Indicator(
         mode = "gauge+number",
-        value = st.session_state.current_pwm_power,
+        value = pwm_power,
         title = {'text': "PWM (%)", 'font': {'size': 16}}, # Smaller title font
         gauge = {'axis': {'range': [0, 100], 'tickwidth': 1, 'tickcolor': "darkblue"},
                  'bar': {'color': "royalblue"},
@@ -162,19 +180,47 @@ with visuals_col:
     gauge_fig.update_layout(height=200, margin=dict(l=20, r=20, t=50, b=20)) # Adjusted margins
     st.plotly_chart(gauge_fig, use_container_width=True)
 
+@st.fragment(run_every=chart_refresh)
+def live_charts():
+    _, speed_mph, pwm_power, top_speed, curve = source.snapshot()
+
+    st.subheader("Wind Response Curve")
+    # Whole curve evaluated in one vectorised call against the compiled lookup table
+    curve_speeds = np.linspace(0.0, top_speed * 1.1, 200)
+    curve_powers = curve.evaluate_batch(curve_speeds)
+    curve_fig = go.Figure()
+    curve_fig.add_trace(go.Scatter(x=curve_speeds, y=curve_powers, mode='lines', name='Curve', line=dict(color='purple', width=2)))
+    curve_fig.add_trace(go.Scatter(
+        x=[speed_mph], y=[pwm_power],
+        mode='markers', name='Current', marker=dict(color='red', size=10)
+    ))
+    curve_fig.update_layout(
+        xaxis_title="Game Speed (mph)",
+        yaxis_title="PWM Power (%)",
+        yaxis=dict(range=[0, 105]),
+        showlegend=False,
+        height=250,
+        margin=dict(l=20, r=20, t=20, b=20)
+    )
+    st.plotly_chart(curve_fig, use_container_width=True)
+
     st.subheader("Output History")
-    if not st.session_state.history_data.empty and len(st.session_state.history_data) > 1:
+    if source.history_length() > 1:
+        # Only a bounded number of points per trace goes to the browser, however long the session
+        history = source.history_chart(('Game Speed (mph)', 'PWM Power (%)'), MAX_CHART_POINTS, downsample_method)
+        speed_x, speed_y = history['Game Speed (mph)']
+        power_x, power_y = history['PWM Power (%)']
         history_fig = go.Figure()
-        history_fig.add_trace(go.Scatter(
-            x=st.session_state.history_data['Time'],
-            y=st.session_state.history_data['Game Speed (mph)'],
+        history_fig.add_trace(go.Scattergl( # WebGL: stays responsive with long histories
+            x=speed_x,
+            y=speed_y,
             mode='lines', # Smoother lines
             name='Game Speed (mph)',
             line=dict(color='blue', width=2)
         ))
-        history_fig.add_trace(go.Scatter(
-            x=st.session_state.history_data['Time'],
-            y=st.session_state.history_data['PWM Power (%)'],
+        history_fig.add_trace(go.Scattergl(
+            x=power_x,
+            y=power_y,
             mode='lines', # Smoother lines
             name='PWM Power (%)',
             yaxis='y2', # Use a secondary y-axis
@@ -184,7 +230,7 @@ with visuals_col:
             # title="Live Output History", # Removed title from here as subheader exists
             xaxis_title="Time Elapsed (s)",
             yaxis_title="Game Speed (mph)",
-            yaxis=dict(range=[0, st.session_state.top_speed + 10]), # Dynamically set y-axis range a bit
+            yaxis=dict(range=[0, top_speed + 10]), # Dynamically set y-axis range a bit
             yaxis2=dict(
                 title="PWM Power (%)",
                 overlaying='y',
@@ -197,19 +243,20 @@ with visuals_col:
         )
         st.plotly_chart(history_fig, use_container_width=True)
     else:
-        st.caption("No history data yet or not enough data (need >1 point). Start the simulation to populate charts.")
+        st.caption("No history data yet or not enough data (need >1 point). Start the simulation or the live monitor to populate charts.")
 
     # Optional 3D Scatter Plot
     st.subheader("3D View (Time, Speed, PWM)")
-    if not st.session_state.history_data.empty and len(st.session_state.history_data) > 1:
+    if source.history_length() > 1:
+        recent = source.history_view(last=HISTORY_3D_POINTS)
         fig_3d = go.Figure(data=[go.Scatter3d(
-            x=st.session_state.history_data['Time'],
-            y=st.session_state.history_data['Game Speed (mph)'],
-            z=st.session_state.history_data['PWM Power (%)'],
+            x=recent['Time'],
+            y=recent['Game Speed (mph)'],
+            z=recent['PWM Power (%)'],
             mode='lines+markers', # Show lines connecting points and markers
             marker=dict(
                 size=4, # Smaller markers
-                color=st.session_state.history_data['PWM Power (%)'], # Color points by PWM value
+                color=recent['PWM Power (%)'], # Color points by PWM value
                 colorscale='Viridis',  # Choose a colorscale
                 opacity=0.8,
                 colorbar=dict(title='PWM (%)', thickness=10)
@@ -234,20 +281,19 @@ with visuals_col:
     else:
         st.caption("Not enough data for 3D history yet (need >1 point).")
 
+@st.fragment(run_every=chart_refresh)
+def event_log():
+    log_container = st.container(height=250)
+    for msg in reversed(source.logs()):
+        log_container.text(msg)
+
+with visuals_col:
+    st.header("📊 Live Status & Visuals")
+    live_status()
+    live_charts()
 
 st.header("📝 Event Log")
-log_container = st.container(height=250)
-for msg in reversed(st.session_state.log_messages):
-    log_container.text(msg)
+event_log()
 
 st.markdown("---")
 st.caption("This simulator combines and adapts logic from the original project files into a single interactive application for testing and visualization.")
-
-# --- Main Simulation Loop Control ---
-if st.session_state.simulation_running:
-    run_simulation_step() 
-    time.sleep(0.1) # Update frequency (10 Hz) 
-    st.rerun() 
-elif not st.session_state.simulation_running and st.session_state.current_game_speed_mph != 0.0:
-    run_simulation_step()
-    st.rerun()
\ No newline at end of file
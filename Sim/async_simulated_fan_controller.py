@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+import time
+
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from async_controller import AsyncFanController
+from config_push import ConfigSubscriber
+from pwm_backends import open_pwm
+from pwm_output import OutputStage
+from wind_config import ConfigStore
+
+# asyncio variant of simulated_fan_controller.py: top_speed changes are pushed
+# by the wind server, and the polling fallback runs in a background task, so a
+# slow or unreachable wind server never delays the telemetry-to-PWM path.
+
+UDP_IP = ""  # Listen on all available interfaces
+UDP_PORT = 4444
+wind_server_url = "http://127.0.0.1:5000/get_top_speed_api"
+TOP_SPEED_FETCH_INTERVAL = 5 # Seconds
+CONTROL_RATE_HZ = 100 # Fixed PWM update rate, independent of packet arrival
+PWM_BACKEND = "mock" # Records writes instead of driving a pin; see pwm_backends.py
+# Set to a port (e.g. 5000, instead of running wind_server_for_sim.py) to serve
+# the config UI/API from this process, with the config saved to disk
+CONFIG_HTTP_PORT = None
+# Speed filter ("none", "ema", "one_euro", "kalman") and lead in seconds; see
+# speed_filter.py and benchmarks/filter_lag.py
+SPEED_FILTER = "none"
+LEAD_SECONDS = 0.0
+
+def fetch_top_speed_from_server():
+    # Blocking; AsyncFanController runs it in a worker thread
+    import requests # Only needed for the polling fallback; importing it up front slows startup
+    response = requests.get(wind_server_url, timeout=0.5)
+    response.raise_for_status()
+    data = response.json()
+    new_top_speed = data.get("top_speed")
+    if new_top_speed is None or not isinstance(new_top_speed, (int, float)) or new_top_speed <= 0:
+        print(f"Warning: Received invalid top_speed data from server: {data}")
+        return None
+    return new_top_speed
+
+pwm = open_pwm(PWM_BACKEND)
+# Deadband, write-rate and slew limits between the curve and the (simulated) PWM
+output = OutputStage(pwm.set_duty_cycle)
+
+next_report = time.monotonic() + 1.0
+
+def simulated_pwm(power, speed_mph):
+    global next_report
+    output.update(power)
+    now = time.monotonic()
+    if now >= next_report:
+        next_report += 1.0
+        # Print the simulated output; with the mock backend nothing is driven
+        print(f"Speed: {speed_mph:.2f} mph (Top Speed: {controller.top_speed} mph) -> Simulated PWM Power: {output.value:.2f}% (target {power:.2f}%) | "
+              f"{controller.received} packets | {output.writes} writes / {output.suppressed} suppressed | {controller.scheduler.report()}")
+
+def apply_output_limits(config):
+    output.configure(config.deadband, config.max_write_hz, config.slew_rate)
+
+if CONFIG_HTTP_PORT is None:
+    config_store = None
+    config_subscriber = ConfigSubscriber()
+    config_source = fetch_top_speed_from_server
+else:
+    config_store = ConfigStore()
+    config_subscriber = config_source = None
+controller = AsyncFanController(simulated_pwm, config_source=config_source,
+                                config_subscriber=config_subscriber,
+                                refresh_interval=TOP_SPEED_FETCH_INTERVAL,
+                                control_rate_hz=CONTROL_RATE_HZ,
+                                config_store=config_store, config_http_port=CONFIG_HTTP_PORT,
+                                on_config=apply_output_limits,
+                                speed_filter=SPEED_FILTER, lead=LEAD_SECONDS)
+
+print(f"Async Simulated Fan Controller started.")
+print(f"Listening for UDP packets on port {UDP_PORT}")
+if config_store is None:
+    print(f"Subscribed to top_speed pushes on {config_subscriber.server_addr[0]}:{config_subscriber.server_addr[1]}, polling {wind_server_url} as fallback")
+else:
+    print(f"Config UI at http://127.0.0.1:{CONFIG_HTTP_PORT}, saved to {config_store.path}")
+print("Press Ctrl+C to stop.")
+
+try:
+    asyncio.run(controller.run_forever(UDP_IP, UDP_PORT))
+except KeyboardInterrupt:
+    pass
+finally:
+    pwm.close()
+    print("Async Simulated Fan Controller stopped.")
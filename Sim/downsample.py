@@ -0,0 +1,76 @@
+import numpy as np
+
+# Chart downsampling for long histories.
+#
+# Plotly gets slow (and the browser gets a multi-megabyte payload) well before
+# an hour of 100+ Hz telemetry is on screen, so charts only ever receive a
+# bounded number of points, however long the session has run:
+#
+#   lttb     Largest-Triangle-Three-Buckets: keeps the points that preserve the
+#            visual shape of a line; `n` points out
+#   minmax   the minimum and maximum of each bucket, so spikes survive; about
+#            `n` points out, and cheaper than LTTB (fully vectorised)
+#
+# Both take oldest-first x (time) and y arrays and return (x, y) arrays.
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def lttb(x, y, n):
+    size = len(x)
+    if n >= size or n < 3:
+        return x, y
+    # Bucket i (of n - 2) covers points [edges[i], edges[i + 1]); the first and last points are kept as is
+    edges = (np.arange(n - 1) * ((size - 2) / (n - 2))).astype(np.int64) + 1
+    edges[-1] = size - 1
+    counts = np.diff(edges)
+    # Mean of every bucket, plus the last point as the "next bucket" of the final one
+    mean_x = np.append(np.add.reduceat(x[:size - 1], edges[:-1]) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:size - 1], edges[:-1]) / counts, y[-1])
+    selected = np.empty(n, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    a = 0
+    for i in range(n - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        bx, by = mean_x[i + 1], mean_y[i + 1]
+        # Twice the area of the triangle (a, candidate, next bucket's mean), per candidate
+        area = np.abs((ax - bx) * (y[start:end] - ay) - (ax - x[start:end]) * (by - ay))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+def minmax(x, y, n):
+    size = len(x)
+    buckets = n // 2
+    if size <= n or buckets < 1:
+        return x, y
+    width = size // buckets
+    m = buckets * width
+    rows = y[:m].reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    lo = rows.argmin(axis=1) + offsets
+    hi = rows.argmax(axis=1) + offsets
+    selected = np.sort(np.concatenate((lo, hi, np.arange(m, size))))  # The leftover tail is kept as is
+    return x[selected], y[selected]
+
+
+def downsample(x, y, n, method="lttb"):
+    if method == "minmax":
+        return minmax(x, y, n)
+    return lttb(x, y, n)
+
+
+def downsample_blocks(blocks, x_column, y_column, n, method="lttb"):
+    """downsample() over consecutive row blocks (HistoryBuffer.segments()), without copying the rows."""
+    total = sum(len(block) for block in blocks)
+    xs, ys = [], []
+    for block in blocks:
+        x, y = downsample(block[:, x_column], block[:, y_column], max(3, n * len(block) // max(total, 1)), method)
+        xs.append(x)
+        ys.append(y)
+    if len(blocks) == 1:
+        return xs[0].copy(), ys[0].copy()  # Unless downsampled, still views of the history
+    return np.concatenate(xs), np.concatenate(ys)
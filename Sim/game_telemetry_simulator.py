@@ -1,17 +1,51 @@
+import argparse
+import math
+import os
 import socket
+import sys
 import time
-import json
 import random
 
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from telemetry_protocol import encode_binary, encode_json
+
 UDP_TARGET_IP = "127.0.0.1"  # Localhost
 UDP_TARGET_PORT = 4444
 
+parser = argparse.ArgumentParser(description="Send simulated BeamNG telemetry over UDP.")
+parser.add_argument("--format", choices=("json", "binary"), default="json",
+                    help="Wire format to send (the controllers accept both)")
+parser.add_argument("--load", action="store_true",
+                    help="Load-generation mode: many senders replaying drive profiles at a fixed rate")
+parser.add_argument("--senders", type=int, default=8, help="Concurrent senders in --load mode (default 8)")
+parser.add_argument("--rate", type=float, default=144.0, help="Packets per second per sender in --load mode (default 144)")
+parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run in --load mode (0 = until Ctrl+C)")
+parser.add_argument("--top-speed", type=float, default=120.0, help="Fastest speed (mph) in the drive profiles")
+parser.add_argument("--slide", action="store_true",
+                    help="Send the vehicle orientation, with a changing heading and slip angle (for multi-fan output)")
+args = parser.parse_args()
+encode = encode_binary if args.format == "binary" else encode_json
+
+if args.load:
+    from load_generator import run_load  # Needs NumPy; the plain simulator does not
+    sent, elapsed, late = run_load((UDP_TARGET_IP, UDP_TARGET_PORT), args.senders, args.rate, args.duration,
+                                   args.format, top_speed_mph=args.top_speed)
+    target_rate = args.senders * args.rate
+    achieved = sent / max(elapsed, 1e-9)
+    print(f"Sent {sent} packets in {elapsed:.2f} s: {achieved:.0f} packets/s "
+          f"({achieved / target_rate * 100:.1f}% of {target_rate:g} target, "
+          f"{achieved / args.senders:.1f} per sender), {late} late frames")
+    sys.exit(0)
+
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
 print(f"Game Telemetry Simulator started.")
-print(f"Sending UDP packets to {UDP_TARGET_IP}:{UDP_TARGET_PORT}")
+print(f"Sending {args.format} UDP packets to {UDP_TARGET_IP}:{UDP_TARGET_PORT}")
 print("Press Ctrl+C to stop.")
 
+seq = 0
+heading = 0.0  # Radians from the world y axis, for --slide
 try:
     while True:
         # Simulate game speed between 0 and 200 mph
@@ -22,15 +56,27 @@ try:
         simulated_speed_mps = simulated_speed_mph * 0.44704
 
         # Create telemetry data (assuming y-axis is forward)
-        telemetry_data = {"vel": [0, simulated_speed_mps, 0]}
-        message = json.dumps(telemetry_data).encode('utf-8')
+        sender_ms = int(time.time() * 1000)
+        if args.slide:
+            # The car points along `heading` but travels `slip` radians off it
+            heading += random.uniform(-0.3, 0.3)
+            slip = random.uniform(-0.6, 0.6)
+            forward = (math.sin(heading), math.cos(heading), 0.0)
+            vx = simulated_speed_mps * math.sin(heading + slip)
+            vy = simulated_speed_mps * math.cos(heading + slip)
+            message = encode(seq, sender_ms, vx, vy, 0.0, orientation=forward + (0.0, 0.0, 1.0))
+            detail = f", slip = {math.degrees(slip):+.0f} deg"
+        else:
+            message = encode(seq, sender_ms, 0.0, simulated_speed_mps, 0.0)
+            detail = ""
 
         sock.sendto(message, (UDP_TARGET_IP, UDP_TARGET_PORT))
-        print(f"Sent: Speed MPH = {simulated_speed_mph:.2f}, Data = {telemetry_data}")
+        print(f"Sent: Speed MPH = {simulated_speed_mph:.2f}{detail}, seq = {seq}, {len(message)} bytes")
+        seq += 1
 
         time.sleep(0.1)  # Send data 10 times per second
 
 except KeyboardInterrupt:
     print("\nSimulator stopped.")
 finally:
-    sock.close()
\ No newline at end of file
+    sock.close()
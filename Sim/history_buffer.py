@@ -0,0 +1,78 @@
+import numpy as np
+
+# Fixed-capacity history for the Streamlit simulator.
+#
+# Samples go into a preallocated NumPy array used as a ring: append() is two
+# index stores and a counter bump, whatever the history length, and nothing is
+# allocated per tick. Chronological arrays are only assembled by view(), i.e.
+# when a chart actually renders, and the result is cached until the next
+# append so several charts in one render share it. For charts of the whole
+# history, segments() hands out the rows in place instead, so a long history
+# is downsampled without being copied.
+
+SPARE_FRACTION = 0.01  # Share of a full buffer segments() leaves out: the rows the next appends overwrite
+
+
+class HistoryBuffer:
+    def __init__(self, columns, capacity=36_000):
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self._data = np.zeros((capacity, len(self.columns)))
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._count = 0     # Samples appended since the last clear
+        self._cache = None  # (count, last, view) from the newest view() call
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    @property
+    def total(self):
+        """Samples appended since the last clear, including those overwritten."""
+        return self._count
+
+    def append(self, *values):
+        self._data[self._count % self.capacity] = values
+        self._count += 1
+
+    def clear(self):
+        self._count = 0
+        self._cache = None
+
+    def view(self, last=None):
+        """Oldest-first arrays of the newest `last` samples (all by default), keyed by column."""
+        n = len(self)
+        if last is not None:
+            n = min(n, last)
+        cache = self._cache
+        if cache is not None and cache[0] == self._count and cache[1] == n:
+            return cache[2]
+        end = self._count % self.capacity
+        start = end - n
+        if start >= 0:
+            rows = self._data[start:end]  # Contiguous: a view, no copy
+        else:
+            rows = np.concatenate((self._data[start:], self._data[:end]))
+        view = {name: rows[:, i] for name, i in self._index.items()}
+        self._cache = (self._count, n, view)
+        return view
+
+    def segments(self, last=None):
+        """The newest `last` rows (all by default) as one or two oldest-first
+        blocks of the underlying array: views, not copies.
+
+        The blocks stay valid while the writer appends, as long as it appends
+        fewer than capacity * SPARE_FRACTION rows before they are read; those
+        oldest rows are left out.
+        """
+        n = len(self) if last is None else min(len(self), last)
+        n = min(n, self.capacity - max(1, int(self.capacity * SPARE_FRACTION)))
+        end = self._count % self.capacity
+        start = end - n
+        if start >= 0:
+            return [self._data[start:end]]
+        return [self._data[start:], self._data[:end]]
+
+    def latest(self, name):
+        if not self._count:
+            return None
+        return self._data[(self._count - 1) % self.capacity, self._index[name]]
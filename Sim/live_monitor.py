@@ -0,0 +1,208 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from control_loop import SampleHold
+from downsample import downsample_blocks
+from history_buffer import HistoryBuffer
+from sender_streams import StreamDemux, StreamSelector, StreamTable
+from sim_engine import HISTORY_COLUMNS, MAX_LOG_MESSAGES
+from udp_receiver import DrainingReceiver, open_telemetry_socket
+from wind_curve import compile_curve
+
+# Live telemetry monitor for the Streamlit app (app.py).
+#
+# A background thread listens on the telemetry UDP port and records every
+# packet from the selected sender (sender_streams.py, same policies as the
+# controllers) together with the fan power the configured curve gives for it.
+# It offers the same read interface as sim_engine.SimulationEngine, so the app
+# draws either one with the same fragments.
+#
+# Only one socket can receive a unicast datagram, so to watch what a running
+# controller sees, either point the game at the monitor and set `forward` to
+# the controller's address (every datagram is passed on unchanged, as with
+# telemetry_recorder.py record --forward), or forward to the monitor's port
+# from the recorder.
+
+DEFAULT_LIVE_HISTORY_POINTS = 1_500_000  # About three hours at 144 Hz (~36 MB)
+POLL_INTERVAL = 0.25     # Seconds the receiver thread waits for a datagram before housekeeping
+SWEEP_INTERVAL = 1.0     # Seconds between idle-stream sweeps
+SUMMARY_INTERVAL = 10.0  # Seconds between packet-rate lines in the event log
+
+
+class LiveMonitor:
+    def __init__(self, top_speed=70, wind_curve="linear", port=4444, forward=None,
+                 stream_policy="sticky", history_points=DEFAULT_LIVE_HISTORY_POINTS):
+        """`forward` is an optional (host, port) every datagram is passed on to."""
+        self.top_speed = top_speed
+        self.wind_curve = wind_curve
+        self.curve = compile_curve(wind_curve, top_speed)
+        self.port = port
+        self.forward = forward
+        self.running = False
+        self.speed_mph = 0.0
+        self.pwm_power = 0.0
+        self.history = HistoryBuffer(HISTORY_COLUMNS, history_points)
+        self.log_messages = deque(["Live monitor ready."], maxlen=MAX_LOG_MESSAGES)
+        self.version = 0
+        self.streams = StreamTable()
+        self.demux = StreamDemux(self.streams, StreamSelector(stream_policy), SampleHold())
+        self.receiver = None
+        self.start_time = time.time()
+        self._next_sweep = 0.0
+        self._next_summary = 0.0
+        self._summary_packets = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="live-monitor", daemon=True)
+        self._thread.start()
+
+    # --- Called from the UI thread ---
+
+    def configure(self, top_speed=None, wind_curve=None, port=None, forward=False):
+        """Curve changes apply to packets from now on; port and `forward` (None to
+        stop forwarding) take effect on the next start()."""
+        with self._lock:
+            if top_speed is not None and top_speed != self.top_speed:
+                self.top_speed = top_speed
+            if wind_curve is not None and wind_curve != self.wind_curve:
+                self.wind_curve = wind_curve
+            if self.curve.kind != self.wind_curve or self.curve.top_speed != self.top_speed:
+                self.curve = compile_curve(self.wind_curve, self.top_speed)
+                self.pwm_power = self.curve(self.speed_mph)
+                self.version += 1
+            if port is not None:
+                self.port = port
+            if forward is not False:
+                self.forward = forward
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return True
+            try:
+                sock = open_telemetry_socket("", self.port)
+            except OSError as e:
+                self._log(f"Could not listen on UDP port {self.port}: {e}")
+                self.version += 1
+                return False
+            self.receiver = DrainingReceiver(sock)
+            self.running = True
+            self.start_time = time.time()
+            self.history.clear()
+            self._summary_packets = self.demux.packets
+            self._next_summary = time.monotonic() + SUMMARY_INTERVAL
+            forward = f", forwarding to {self.forward[0]}:{self.forward[1]}" if self.forward else ""
+            self._log(f"Listening for telemetry on UDP port {self.port}{forward}.")
+            self.version += 1
+        self._wake.set()
+        return True
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+            # The receiver thread may be waiting on the socket; it notices on its next wake
+            self.receiver.sock.close()
+            self.receiver = None
+            self._log("Live monitor stopped.")
+            self.version += 1
+
+    def close(self, timeout=2.0):
+        """Stop monitoring and end the receiver thread for good."""
+        self.stop()
+        self._closed = True
+        self._wake.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def snapshot(self):
+        """(version, speed_mph, pwm_power, top_speed, curve) read together."""
+        with self._lock:
+            return self.version, self.speed_mph, self.pwm_power, self.top_speed, self.curve
+
+    def history_view(self, last=None):
+        """Copies of the newest history arrays, safe to hand to a chart while packets arrive."""
+        with self._lock:
+            return {name: values.copy() for name, values in self.history.view(last).items()}
+
+    def history_chart(self, columns, n, method="lttb"):
+        """{column: (time, values)} of the whole history, downsampled to about `n` points each.
+
+        Only the history's position is read under the lock; the rows are
+        downsampled in place, so a long history is never copied.
+        """
+        with self._lock:
+            blocks = self.history.segments()
+        index = self.history.columns.index
+        return {name: downsample_blocks(blocks, 0, index(name), n, method) for name in columns}
+
+    def history_length(self):
+        return len(self.history)
+
+    def logs(self):
+        with self._lock:
+            return list(self.log_messages)
+
+    def sender_summary(self):
+        """(active streams, description of the selected one)."""
+        with self._lock:
+            return len(self.streams), self.demux.selected_name()
+
+    # --- Receiver thread ---
+
+    def _log(self, message):
+        self.log_messages.append(f"{time.strftime('%H:%M:%S')}: {message}")
+
+    def _handle(self, buf, nbytes, address):
+        if self.forward is not None:
+            self.receiver.sock.sendto(memoryview(buf)[:nbytes], self.forward)
+        if self.demux.handle(buf, nbytes, address):
+            self.speed_mph = self.streams.speed[self.demux.selector.slot]
+            self.pwm_power = self.curve(self.speed_mph)
+            self.history.append(time.time() - self.start_time, self.speed_mph, self.pwm_power)
+            self.version += 1
+
+    def _housekeeping(self, now):
+        if self.demux.select(now):
+            self._log(f"Showing telemetry from {self.demux.selected_name()}")
+            self.version += 1
+        if now >= self._next_sweep:
+            self._next_sweep = now + SWEEP_INTERVAL
+            if self.streams.evict_idle(now):
+                self._log(f"Senders active: {len(self.streams)}")
+                self.version += 1
+        if now >= self._next_summary:
+            rate = (self.demux.packets - self._summary_packets) / SUMMARY_INTERVAL
+            self._summary_packets = self.demux.packets
+            self._next_summary = now + SUMMARY_INTERVAL
+            self._log(f"{rate:.1f} packets/s from {len(self.streams)} sender(s), "
+                      f"{len(self.history):,} points recorded")
+            self.version += 1
+
+    def _run(self):
+        while not self._closed:
+            receiver = self.receiver
+            if not self.running or receiver is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                ready = receiver.wait(POLL_INTERVAL)
+            except (OSError, ValueError):
+                continue  # Socket closed by stop()
+            with self._lock:
+                if receiver is not self.receiver:
+                    continue
+                if ready:
+                    try:
+                        receiver.drain_each(self._handle)
+                    except OSError as e:
+                        self._log(f"Receive error: {e}")
+                self._housekeeping(time.monotonic())
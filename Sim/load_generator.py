@@ -0,0 +1,111 @@
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from telemetry_protocol import PACKET_V1, encode_json, pack_binary_into
+
+# High-rate, multi-sender telemetry load generator (game_telemetry_simulator.py --load).
+#
+# Each sender is its own UDP socket (its own source port, like a separate
+# BeamMP client) replaying a drive profile of accelerating, cruising and
+# braking phases. Profiles are precomputed with NumPy so the send loop only
+# packs and sends. Pacing is an absolute schedule on perf_counter(): the loop
+# sleeps until just before each frame and spins the last stretch, and a frame
+# that is late is sent immediately and never shifts the ones after it.
+
+MPH_TO_MPS = 0.44704
+SPIN_MARGIN = 0.0005  # Seconds before a deadline to stop sleeping and spin
+
+
+def drive_profile(duration, rate_hz, top_speed_mph=120.0, seed=None):
+    """Forward speed (m/s) at `rate_hz` for `duration` seconds of realistic driving."""
+    rng = np.random.default_rng(seed)
+    n = int(duration * rate_hz)
+    dt = 1.0 / rate_hz
+    pieces = []
+    speed = 0.0
+    total = 0
+    while total < n:
+        phase = rng.choice(("accelerate", "cruise", "brake", "stop"), p=(0.35, 0.35, 0.2, 0.1))
+        if phase == "accelerate":
+            target = rng.uniform(speed, top_speed_mph)
+            rate = rng.uniform(5.0, 15.0)  # mph per second
+            steps = max(1, int((target - speed) / rate / dt))
+            piece = np.linspace(speed, target, steps)
+        elif phase == "brake":
+            target = rng.uniform(0.0, speed)
+            rate = rng.uniform(10.0, 30.0)
+            steps = max(1, int((speed - target) / rate / dt))
+            piece = np.linspace(speed, target, steps)
+        elif phase == "cruise":
+            steps = int(rng.uniform(3.0, 15.0) * rate_hz)
+            wander = np.cumsum(rng.normal(0.0, 0.3, steps)) * np.sqrt(dt)
+            piece = np.clip(speed + wander, 0.0, top_speed_mph)
+        else:
+            steps = int(rng.uniform(1.0, 3.0) * rate_hz) if speed < 5.0 else 1
+            piece = np.zeros(steps) if speed < 5.0 else np.array([speed])
+        pieces.append(piece)
+        total += len(piece)
+        speed = float(piece[-1])
+    return (np.concatenate(pieces)[:n] * MPH_TO_MPS).astype(np.float32)
+
+
+def run_load(target, senders=8, rate_hz=144.0, duration=10.0, wire_format="binary",
+             profile_seconds=120.0, top_speed_mph=120.0, report_interval=1.0):
+    """Send `senders` concurrent streams at `rate_hz` each; returns (sent, elapsed, late frames)."""
+    profiles = np.stack([drive_profile(profile_seconds, rate_hz, top_speed_mph, seed=i) for i in range(senders)])
+    profile_len = profiles.shape[1]
+    speeds = profiles.tolist()  # Plain floats: faster to index per packet than NumPy scalars
+    socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(senders)]
+    packet = bytearray(PACKET_V1.size)
+    period = 1.0 / rate_hz
+    frames = int(duration * rate_hz) if duration else None
+    target_rate = senders * rate_hz
+
+    print(f"Load: {senders} senders x {rate_hz:g} Hz = {target_rate:g} packets/s to {target[0]}:{target[1]} ({wire_format})")
+    start = time.perf_counter()
+    next_report = start + report_interval
+    report_sent = 0
+    sent = 0
+    late = 0
+    frame = 0
+    try:
+        while frames is None or frame < frames:
+            deadline = start + frame * period
+            delay = deadline - time.perf_counter()
+            if delay > SPIN_MARGIN:
+                time.sleep(delay - SPIN_MARGIN)
+            while time.perf_counter() < deadline:
+                pass
+            if time.perf_counter() - deadline > period:
+                late += 1
+            i = frame % profile_len
+            sender_ms = int(time.time() * 1000)
+            for s, sock in enumerate(socks):
+                vy = speeds[s][i]
+                if wire_format == "json":
+                    sock.sendto(encode_json(frame, sender_ms, 0.0, vy, 0.0), target)
+                else:
+                    pack_binary_into(packet, frame, sender_ms, 0.0, vy, 0.0)
+                    sock.sendto(packet, target)
+            sent += senders
+            frame += 1
+
+            now = time.perf_counter()
+            if now >= next_report:
+                achieved = (sent - report_sent) / (now - next_report + report_interval)
+                print(f"  achieved {achieved:8.0f} packets/s ({achieved / target_rate * 100:5.1f}% of target), {late} late frames")
+                report_sent = sent
+                next_report = now + report_interval
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sock in socks:
+            sock.close()
+    elapsed = time.perf_counter() - start
+    return sent, elapsed, late
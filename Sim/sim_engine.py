@@ -0,0 +1,192 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from control_loop import FixedRateScheduler
+from downsample import downsample_blocks
+from history_buffer import HistoryBuffer
+from speed_filter import make_speed_hold
+from wind_curve import compile_curve
+
+# Background simulation engine for the Streamlit app (app.py).
+#
+# The simulation step runs on its own thread at a fixed rate
+# (control_loop.FixedRateScheduler, so it does not drift), independent of how
+# long the page takes to render. The UI only changes settings through
+# configure() and reads consistent snapshots; every step bumps `version`, so
+# the UI can tell whether anything changed since it last drew. While the
+# simulation is stopped the thread sleeps on an event and costs nothing;
+# close() ends it for good.
+# The power goes through the same speed filter stage as the controllers
+# (speed_filter.py), so filter and lead settings can be tried here.
+
+HISTORY_COLUMNS = ('Time', 'Game Speed (mph)', 'PWM Power (%)')
+MAX_LOG_MESSAGES = 30
+
+
+class SimulationEngine:
+    def __init__(self, top_speed=70, wind_curve="linear", rate_hz=10, history_points=36_000,
+                 speed_filter="none", lead=0.0):
+        self.rate_hz = rate_hz
+        self.top_speed = top_speed
+        self.wind_curve = wind_curve
+        self.curve = compile_curve(wind_curve, top_speed)
+        self.speed_filter = speed_filter
+        self.lead = lead
+        self.speed_hold = make_speed_hold(speed_filter, lead)
+        self.manual_speed_mode = False
+        self.manual_speed_setpoint_mph = 0.0
+        self.running = False
+        self.speed_mph = 0.0
+        self.pwm_power = 0.0
+        self.history = HistoryBuffer(HISTORY_COLUMNS, history_points)
+        self.log_messages = deque(["Simulator initialized. Welcome!"], maxlen=MAX_LOG_MESSAGES)
+        self.version = 0          # Bumped whenever state the UI shows changes
+        self.scheduler = None
+        self.start_time = time.time()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+        self._thread.start()
+
+    # --- Called from the UI thread ---
+
+    def configure(self, top_speed=None, wind_curve=None, manual_speed_mode=None, manual_speed_setpoint_mph=None,
+                  speed_filter=None, lead=None):
+        with self._lock:
+            if top_speed is not None and top_speed != self.top_speed:
+                self.top_speed = top_speed
+                self._log(f"Vehicle Top Speed for scaling set to: {top_speed} mph")
+            if wind_curve is not None and wind_curve != self.wind_curve:
+                self.wind_curve = wind_curve
+                self._log(f"Wind response curve set to: {wind_curve}")
+            if (speed_filter is not None and speed_filter != self.speed_filter) or (lead is not None and lead != self.lead):
+                self.speed_filter = speed_filter if speed_filter is not None else self.speed_filter
+                self.lead = lead if lead is not None else self.lead
+                self.speed_hold = make_speed_hold(self.speed_filter, self.lead)
+                self._log(f"Speed filter set to: {self.speed_filter}, lead {self.lead:.2f} s")
+            if manual_speed_mode is not None:
+                self.manual_speed_mode = manual_speed_mode
+            if manual_speed_setpoint_mph is not None:
+                self.manual_speed_setpoint_mph = manual_speed_setpoint_mph
+            self._recompile()
+            self.pwm_power = self.curve(self.speed_mph)
+            self.version += 1
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self.start_time = time.time()
+            self.history.clear()
+            self.scheduler = FixedRateScheduler(self.rate_hz)
+            self._log("Simulation started.")
+            self.version += 1
+        self._wake.set()
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+            self._log("Simulation stopped.")
+            self.speed_hold.reset()
+            if self.speed_mph != 0.0:
+                self.speed_mph = 0.0
+                self.pwm_power = self.curve(0.0)
+                self._record()
+                self._log("Simulation stopped. Speed and PWM set to 0.")
+            self.version += 1
+
+    def close(self, timeout=2.0):
+        """Stop the simulation thread for good; stop() only pauses it."""
+        with self._lock:
+            self.running = False
+            self._closed = True
+        self._wake.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def snapshot(self):
+        """(version, speed_mph, pwm_power, top_speed, curve) read together."""
+        with self._lock:
+            return self.version, self.speed_mph, self.pwm_power, self.top_speed, self.curve
+
+    def history_view(self, last=None):
+        """Copies of the newest history arrays, safe to hand to a chart while the engine runs."""
+        with self._lock:
+            return {name: values.copy() for name, values in self.history.view(last).items()}
+
+    def history_chart(self, columns, n, method="lttb"):
+        """{column: (time, values)} of the whole history, downsampled to about `n` points each.
+
+        Only the history's position is read under the lock; the rows are
+        downsampled in place, so a long history is never copied.
+        """
+        with self._lock:
+            blocks = self.history.segments()
+        index = self.history.columns.index
+        return {name: downsample_blocks(blocks, 0, index(name), n, method) for name in columns}
+
+    def history_length(self):
+        return len(self.history)
+
+    def logs(self):
+        with self._lock:
+            return list(self.log_messages)
+
+    # --- Simulation thread ---
+
+    def _log(self, message):
+        self.log_messages.append(f"{time.strftime('%H:%M:%S')}: {message}")
+
+    def _recompile(self):
+        # The curve is compiled to a lookup table; only recompile when its config changes
+        if self.curve.kind != self.wind_curve or self.curve.top_speed != self.top_speed:
+            self.curve = compile_curve(self.wind_curve, self.top_speed)
+
+    def _record(self):
+        self.history.append(time.time() - self.start_time, self.speed_mph, self.pwm_power)
+
+    def step(self):
+        with self._lock:
+            if self.manual_speed_mode:
+                new_speed = self.manual_speed_setpoint_mph
+                if abs(new_speed - self.speed_mph) > 0.01:
+                    self._log(f"Manual speed updated to: {new_speed:.2f} mph")
+            else:
+                baseline_speed = self.top_speed * 0.4
+                fluctuation = random.uniform(-self.top_speed * 0.1, self.top_speed * 0.1)
+                change_factor = 0.3
+                target_random_speed = baseline_speed + fluctuation
+                new_speed = self.speed_mph * (1 - change_factor) + target_random_speed * change_factor
+                new_speed = max(0, min(new_speed, self.top_speed))
+                self._log(f"Random speed generated: {new_speed:.2f} mph")
+            self.speed_mph = new_speed
+            now = time.monotonic()
+            self.speed_hold.update(new_speed, now)
+            self.pwm_power = self.curve(self.speed_hold.read(now))
+            self._log(f"PWM: {self.pwm_power:.2f}% (Speed: {self.speed_mph:.2f} mph, Top: {self.top_speed} mph)")
+            self._record()
+            self.version += 1
+
+    def _run(self):
+        while not self._closed:
+            if not self.running:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            scheduler = self.scheduler
+            time.sleep(scheduler.time_until_tick())
+            if not scheduler.due() or not self.running:
+                continue
+            scheduler.begin_tick()
+            self.step()
+            scheduler.end_tick()
@@ -1,18 +1,41 @@
+import os
+import sys
+import threading
 import time
-import socket
 import json
-import requests # For fetching top_speed from the web server
 
-# PWM_PIN = 18 # No GPIO in simulation
-# FREQUENCY = 1000 # No GPIO in simulation
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from config_push import ConfigSubscriber
+from control_loop import FixedRateScheduler
+from metrics import PipelineMetrics
+from pwm_backends import open_pwm
+from pwm_output import OutputStage
+from ring_log import RingLogger
+from sender_control import SenderConfigBroadcaster, sender_settings
+from sender_streams import StreamDemux, StreamSelector, StreamTable
+from speed_filter import make_speed_hold
+from udp_receiver import DrainingReceiver, open_telemetry_socket
+from wind_channels import ChannelBank, open_channel_pwms
+from wind_config import CONFIG_CURVES
+from wind_curve import compile_curve
 
-# GPIO.setmode(GPIO.BCM) # No GPIO
-# GPIO.setup(PWM_PIN, GPIO.OUT) # No GPIO
-# pwm = GPIO.PWM(PWM_PIN, FREQUENCY) # No GPIO
-# pwm.start(0) # No GPIO
+PWM_PIN = 18
+FREQUENCY = 1000
+# The mock backend records every duty-cycle write with a timestamp instead of
+# driving a pin; "auto" (or "pigpio", "sysfs", "gpio") drives real hardware.
+# See pwm_backends.py.
+PWM_BACKEND = "mock"
+pwm = open_pwm(PWM_BACKEND, PWM_PIN, FREQUENCY)
+# Several fans driven by headwind / crosswind (see wind_channels.py), e.g.
+# [{"name": "center", "pin": 18, "axis": "forward"}, {"name": "left", "pin": 23, "axis": "left", "top_speed": 40},
+#  {"name": "right", "pin": 24, "axis": "right", "top_speed": 40}];
+# run game_telemetry_simulator.py --slide to send a sideways velocity
+CHANNELS = None
 
 UDP_IP = ""  # Listen on all available interfaces
 UDP_PORT = 4444 #
+CONTROL_RATE_HZ = 100 # Fixed PWM update rate, independent of packet arrival
 
 # Global variable for top_speed, will be updated from server
 # Initialize with a default, same as in original fan_controller_pwm.py and wind_server.py
@@ -20,12 +43,45 @@ UDP_PORT = 4444 #
 top_speed = 150
 wind_server_url = "http://127.0.0.1:5000/get_top_speed_api"
 last_top_speed_fetch_time = 0
-TOP_SPEED_FETCH_INTERVAL = 5 # Seconds
+TOP_SPEED_FETCH_INTERVAL = 5 # Seconds, polling fallback when push updates are not arriving
+config_subscriber = ConfigSubscriber() # Wind server pushes top_speed changes over UDP
+log = RingLogger() # Formats and writes to stdout off the control loop
+
+def apply_pushed_config():
+    global top_speed, curve
+    config = config_subscriber.poll()
+    if config is None:
+        return
+    kind = config.get("curve")
+    if kind in CONFIG_CURVES and kind != curve.kind:
+        log.log("Pushed wind curve: %s", kind)
+        curve = compile_curve(kind, top_speed)
+    limits = (config.get("deadband"), config.get("max_write_hz"), config.get("slew_rate"))
+    if all(isinstance(value, (int, float)) for value in limits):
+        output.configure(*limits)
+        if channels is not None:
+            channels.configure(*limits)
+    sender = config.get("sender")
+    if isinstance(sender, dict):
+        try:
+            if sender_config.update(sender_settings(sender.get("max_send_hz"), sender.get("change_threshold"),
+                                                    sender.get("keepalive"))):
+                log.log("Pushed sender settings: %s", sender_config.settings)
+                sender_config.tick()
+        except (TypeError, ValueError):
+            log.log("Warning: Received invalid sender settings from server: %s", sender)
+    new_top_speed = config.get("top_speed")
+    if isinstance(new_top_speed, (int, float)) and new_top_speed > 0 and top_speed != new_top_speed:
+        log.log("Pushed top_speed from server: %s mph (config version %d)", new_top_speed, config_subscriber.version)
+        top_speed = new_top_speed
 
 def fetch_top_speed_from_server():
     global top_speed, last_top_speed_fetch_time
     current_time = time.time()
+    if config_subscriber.live:
+        return # Push channel is up; no need to poll
     if current_time - last_top_speed_fetch_time > TOP_SPEED_FETCH_INTERVAL:
+        import requests # Only needed for the polling fallback; importing it up front slows startup
         try:
             response = requests.get(wind_server_url, timeout=0.5) # Short timeout
             response.raise_for_status() # Raise an exception for HTTP errors
@@ -33,60 +89,134 @@ def fetch_top_speed_from_server():
             new_top_speed = data.get("top_speed")
             if new_top_speed is not None and isinstance(new_top_speed, (int, float)) and new_top_speed > 0:
                 if top_speed != new_top_speed:
-                    print(f"Updated top_speed from server: {new_top_speed} mph")
+                    log.log("Updated top_speed from server: %s mph", new_top_speed)
                     top_speed = new_top_speed
             else:
-                print(f"Warning: Received invalid top_speed data from server: {data}")
+                log.log("Warning: Received invalid top_speed data from server: %s", data)
         except requests.exceptions.RequestException as e:
-            print(f"Warning: Could not fetch top_speed from server: {e}")
+            log.log("Warning: Could not fetch top_speed from server: %s", e)
         except json.JSONDecodeError:
-            print(f"Warning: Could not decode JSON from top_speed server response.")
+            log.log("Warning: Could not decode JSON from top_speed server response.")
         last_top_speed_fetch_time = current_time
 
+def poll_top_speed_forever():
+    # On its own thread: the blocking HTTP request (up to its 0.5 s timeout)
+    # must not stall the fixed-rate control ticks
+    while True:
+        try:
+            fetch_top_speed_from_server()
+        except Exception as e:
+            log.rate_limited("poll-error", 5.0, "Error polling top_speed: %s", e)
+        time.sleep(1.0)
+
+# Logic from fan_controller_pwm.py: linear curve, compiled to a lookup table
+# and recompiled whenever top_speed changes
+WIND_CURVE = "linear"
+curve = compile_curve(WIND_CURVE, top_speed)
+
 def calculate_motor_power(current_speed):
-    global top_speed # Use the global top_speed updated from the server
-    # Logic from fan_controller_pwm.py
-    max_game_speed = top_speed
-    if max_game_speed <= 0: # Avoid division by zero if top_speed is not set properly
-        return 0
-    max_real_wind = 70 # Virtual reference for scaling
-
-    real_wind_speed = (current_speed / max_game_speed) * max_real_wind
-    motor_power = (real_wind_speed / max_real_wind) * 100
-    motor_power = max(0, min(100, motor_power)) # Clamp between 0 and 100
-    return motor_power
-
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((UDP_IP, UDP_PORT)) #
-sock.settimeout(0.1) #
+    global curve
+    if curve.top_speed != top_speed: # top_speed was updated from the server
+        curve = curve.with_top_speed(top_speed)
+    return curve(current_speed)
+
+# Deadband, write-rate and slew limits between the curve and the (simulated) PWM
+output = OutputStage(pwm.set_duty_cycle)
+channels = None # With CHANNELS: every fan's curve and limits in one vectorised step per tick
+if CHANNELS is not None:
+    channel_pwms = open_channel_pwms(CHANNELS, PWM_BACKEND, FREQUENCY)
+    channels = ChannelBank(CHANNELS, [p.set_duty_cycle for p in channel_pwms], top_speed, WIND_CURVE)
+
+# One stream per sender (several BeamMP players, or --load senders from
+# game_telemetry_simulator.py); STREAM_POLICY picks the one that drives the
+# fan: "sticky", "fastest", or "pinned" to DRIVING_SENDER. See sender_streams.py.
+STREAM_POLICY = "sticky"
+DRIVING_SENDER = None
+# Speed filter ("none", "ema", "one_euro", "kalman") and lead in seconds; see
+# speed_filter.py and benchmarks/filter_lag.py
+SPEED_FILTER = "none"
+LEAD_SECONDS = 0.0
+
+sock = open_telemetry_socket(UDP_IP, UDP_PORT)
+receiver = DrainingReceiver(sock)
+speed_hold = make_speed_hold(SPEED_FILTER, LEAD_SECONDS) # Newest (filtered) speed, extrapolated on ticks where the packet is late
+streams = StreamTable()
+demux = StreamDemux(streams, StreamSelector(STREAM_POLICY, DRIVING_SENDER), speed_hold, channels=channels)
+# Passes the wind server's send rate / change threshold / keepalive to every main.lua sender
+sender_config = SenderConfigBroadcaster(sock.sendto, streams)
+scheduler = FixedRateScheduler(CONTROL_RATE_HZ)
+next_report = time.monotonic() + 1.0
+
+# Per-stage latency histograms and counters, published once a second for the
+# wind server's /metrics endpoint
+metrics = PipelineMetrics()
+receive_latency, parse_latency, curve_latency, pwm_latency, end_to_end_latency = (
+    metrics.stage(name) for name in ("receive", "parse", "curve", "pwm_write", "end_to_end"))
 
 print(f"Simulated Fan Controller started.")
 print(f"Listening for UDP packets on port {UDP_PORT}")
-print(f"Fetching top_speed from {wind_server_url}")
+print(f"Subscribed to top_speed pushes on {config_subscriber.server_addr[0]}:{config_subscriber.server_addr[1]}, polling {wind_server_url} as fallback")
 print("Press Ctrl+C to stop.")
+threading.Thread(target=poll_top_speed_forever, name="top-speed-poll", daemon=True).start() # Polls only while the push channel is down
 
 try:
     while True:
-        fetch_top_speed_from_server() # Periodically update top_speed
         try:
-            data, addr = sock.recvfrom(1024) #
-            telemetry = json.loads(data.decode()) #
-            vel = telemetry.get("vel", [0,0,0]) #
-            # Assuming y-axis is forward as in fan_controller_pwm.py
-            speed_mps = vel[1]
-            speed_mph = speed_mps * 2.237 # Convert m/s to mph
+            # Wait for telemetry only until the next control tick is due, then
+            # drain the queue; each datagram (binary or JSON, detected per
+            # packet) updates its sender's stream
+            if receiver.wait(scheduler.time_until_tick()):
+                demux.parse_time = 0.0
+                t0 = time.perf_counter()
+                if receiver.drain_each(demux.handle):
+                    elapsed = time.perf_counter() - t0
+                    receive_latency.observe(elapsed - demux.parse_time)
+                    parse_latency.observe(demux.parse_time)
+            if not scheduler.due():
+                continue
 
+            now = scheduler.begin_tick()
+            if demux.select(now):
+                log.log("Fan now driven by %s (%d streams)", demux.selected_name(), len(streams))
+            apply_pushed_config() # Non-blocking check for pushed config
+            speed_mph = speed_hold.read(now)
+            t0 = time.perf_counter()
             power = calculate_motor_power(speed_mph)
-            # Instead of GPIO control, print the simulated output
-            # pwm.ChangeDutyCycle(power) # Original GPIO line
-            print(f"Received Speed: {speed_mph:.2f} mph (Top Speed: {top_speed} mph) -> Simulated PWM Power: {power:.2f}%")
-        except socket.timeout: #
-            pass
+            t1 = time.perf_counter()
+            curve_latency.observe(t1 - t0)
+            if channels is not None:
+                channels.set_curve(curve.kind, top_speed) # No-op unless the config changed
+                channels.step(now)
+            if output.update(power, now):
+                t2 = time.perf_counter()
+                pwm_latency.observe(t2 - t1)
+                if demux.arrival is not None:
+                    end_to_end_latency.observe(t2 - demux.arrival)
+            demux.arrival = None
+            scheduler.end_tick()
+
+            if now >= next_report:
+                next_report += 1.0
+                streams.evict_idle(now)
+                sender_config.tick(now) # New senders, plus a periodic refresh for all
+                metrics.count_streams(demux)
+                metrics.pwm_writes, metrics.pwm_suppressed = output.writes, output.suppressed
+                metrics.publish()
+                # Log the simulated output; with the mock backend nothing is driven
+                log.log("Speed: %.2f mph (Top Speed: %s mph) -> Simulated PWM Power: %.2f%% (target %.2f%%) | "
+                        "%d packets, %d stale skipped, %d extrapolated | %d streams, driven by %s | "
+                        "%d writes / %d suppressed | %s (%d log lines dropped)",
+                        speed_mph, top_speed, output.value, power,
+                        demux.packets, demux.skipped, speed_hold.extrapolated, len(streams), demux.selected_name(),
+                        output.writes, output.suppressed, scheduler.report(), log.dropped)
+                if channels is not None:
+                    log.log("Simulated fans: %s | %d writes / %d suppressed",
+                            channels.describe(), channels.writes, channels.suppressed)
         except Exception as e:
-            print(f"Error in main loop: {e}") #
-        time.sleep(0.02) #
+            log.rate_limited("error", 1.0, "Error in main loop: %s", e)
 finally:
-    # pwm.stop() # No GPIO
-    # GPIO.cleanup() # No GPIO
+    log.close()
+    pwm.close()
     sock.close()
+    config_subscriber.close()
     print("Simulated Fan Controller stopped.")
\ No newline at end of file
@@ -0,0 +1,254 @@
+import argparse
+import mmap
+import os
+import socket
+import struct
+import sys
+import time
+
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from telemetry_protocol import TelemetrySample, decode_into, encode_json, pack_binary_into, PACKET_V1
+from udp_receiver import BUFFER_SIZE
+
+# Telemetry recorder and replay engine.
+#
+#   python telemetry_recorder.py record session.avrec [--forward 127.0.0.1:4445]
+#   python telemetry_recorder.py replay session.avrec [--rate 4 | --fast] [--format json]
+#   python telemetry_recorder.py info session.avrec
+#
+# Recordings are append-only files of fixed-size records, so they can be
+# memory-mapped and scanned (or viewed as a NumPy array) without loading a
+# multi-hour session into memory, and a crash loses at most the last
+# partially written record (cut off when recording to the file resumes).
+#
+# File layout (little-endian):
+#   header  16 bytes: magic "AVREC\0", version u16, start time u64 (ns since epoch)
+#   record  32 bytes: t_ns u64 (since start), seq u32, sender_ms u32, flags u32,
+#                     vel x, y, z f32 (m/s)
+# Record flags: bit 0 = sender used the binary format, bit 1 = seq/sender_ms valid.
+
+MAGIC = b"AVREC\x00"
+VERSION = 1
+HEADER = struct.Struct("<6sHQ")
+RECORD = struct.Struct("<QIIIfff")
+FLAG_BINARY = 1
+FLAG_HAS_SEQ = 2
+FLUSH_INTERVAL = 1.0  # Seconds between flushes to disk while recording
+
+try:
+    import numpy as np
+    RECORD_DTYPE = np.dtype([("t_ns", "<u8"), ("seq", "<u4"), ("sender_ms", "<u4"), ("flags", "<u4"),
+                             ("vx", "<f4"), ("vy", "<f4"), ("vz", "<f4")])
+except ImportError:  # Only Recording.as_array() needs NumPy
+    np = None
+
+
+class TelemetryRecorder:
+    def __init__(self, path):
+        self._file = open(path, "ab")
+        size = self._file.tell()
+        if size == 0:
+            self.start_ns = time.time_ns()
+            self._file.write(HEADER.pack(MAGIC, VERSION, self.start_ns))
+        else:  # Appending to an existing recording keeps its time base
+            try:
+                if size < HEADER.size:
+                    raise ValueError(f"{path} is too short to be a telemetry recording")
+                with open(path, "rb") as f:
+                    magic, version, self.start_ns = HEADER.unpack(f.read(HEADER.size))
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError(f"{path} is not a version {VERSION} telemetry recording")
+            except ValueError:
+                self._file.close()
+                raise
+            # Drop a torn final record (the reader ignores it), so new records stay aligned
+            self._file.truncate(size - (size - HEADER.size) % RECORD.size)
+        self._start_perf = time.perf_counter_ns() - (time.time_ns() - self.start_ns)
+        self._record = bytearray(RECORD.size)
+        self._next_flush = time.monotonic() + FLUSH_INTERVAL
+        self.count = 0
+
+    def elapsed_ns(self):
+        return time.perf_counter_ns() - self._start_perf
+
+    def add(self, sample, t_ns=None):
+        if t_ns is None:
+            t_ns = self.elapsed_ns()
+        flags = FLAG_BINARY if sample.binary else 0
+        seq = sender_ms = 0
+        if sample.seq is not None:
+            flags |= FLAG_HAS_SEQ
+            seq, sender_ms = sample.seq & 0xFFFFFFFF, (sample.sender_ms or 0) & 0xFFFFFFFF
+        RECORD.pack_into(self._record, 0, t_ns, seq, sender_ms, flags, sample.vx, sample.vy, sample.vz)
+        self._file.write(self._record)
+        self.count += 1
+        if time.monotonic() >= self._next_flush:
+            self._next_flush += FLUSH_INTERVAL
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Recording:
+    """Read-only, memory-mapped view of a recording."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f"{path} is too short to be a telemetry recording")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.start_ns = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} telemetry recording")
+        self.count = (size - HEADER.size) // RECORD.size  # A torn final record is ignored
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return RECORD.unpack_from(self._mm, HEADER.size + i * RECORD.size)
+
+    def __iter__(self):
+        return RECORD.iter_unpack(memoryview(self._mm)[HEADER.size:HEADER.size + self.count * RECORD.size])
+
+    @property
+    def duration(self):
+        return self[self.count - 1][0] / 1e9 if self.count else 0.0
+
+    def as_array(self):
+        """Zero-copy NumPy structured array over the mapped records."""
+        if np is None:
+            raise RuntimeError("as_array() requires numpy")
+        return np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=self.count, offset=HEADER.size)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+def record(path, port=4444, forward=None, duration=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("", port))
+    sock.settimeout(0.5)
+    buffer = bytearray(BUFFER_SIZE)
+    sample = TelemetrySample()
+    recorder = TelemetryRecorder(path)
+    deadline = time.monotonic() + duration if duration else None
+    print(f"Recording telemetry from UDP port {port} to {path}" + (f", forwarding to {forward[0]}:{forward[1]}" if forward else ""))
+    print("Press Ctrl+C to stop.")
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                nbytes = sock.recv_into(buffer)
+            except socket.timeout:
+                continue
+            t_ns = recorder.elapsed_ns()
+            if forward:
+                sock.sendto(memoryview(buffer)[:nbytes], forward)
+            if decode_into(sample, buffer, nbytes):
+                recorder.add(sample, t_ns)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        sock.close()
+    print(f"Recorded {recorder.count} packets.")
+
+
+def replay(path, target=("127.0.0.1", 4444), rate=1.0, fast=False, wire_format="binary"):
+    """Send a recording to `target` at `rate` x real time, or as fast as possible."""
+    if not fast and not rate > 0:
+        raise ValueError(f"Replay rate must be positive, got {rate}")
+    recording = Recording(path)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    packet = bytearray(PACKET_V1.size)
+    first_ns = recording[0][0] if len(recording) else 0
+    start = time.perf_counter()
+    sent = 0
+    try:
+        for t_ns, seq, sender_ms, flags, vx, vy, vz in recording:
+            if not fast:
+                # Absolute schedule from the start, so pacing never drifts
+                delay = start + (t_ns - first_ns) / 1e9 / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if not flags & FLAG_HAS_SEQ:
+                seq, sender_ms = sent, int(t_ns // 1_000_000)
+            if wire_format == "json":
+                sock.sendto(encode_json(seq, sender_ms, vx, vy, vz), target)
+            else:
+                pack_binary_into(packet, seq, sender_ms, vx, vy, vz)
+                sock.sendto(packet, target)
+            sent += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.perf_counter() - start
+        sock.close()
+        recording.close()
+    return sent, elapsed
+
+
+def info(path):
+    recording = Recording(path)
+    try:
+        print(f"{path}: {len(recording)} packets over {recording.duration:.1f} s, "
+              f"started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(recording.start_ns / 1e9))}")
+        if np is not None and len(recording):
+            records = recording.as_array()
+            speed_mph = np.sqrt(records["vx"].astype(float) ** 2 + records["vy"] ** 2 + records["vz"] ** 2) * 2.237
+            del records  # Release the view on the mapping before it is closed
+            print(f"Speed (mph): mean {speed_mph.mean():.1f}, max {speed_mph.max():.1f}; "
+                  f"mean rate {len(recording) / max(recording.duration, 1e-9):.1f} packets/s")
+    finally:
+        recording.close()
+
+
+def _positive_float(text):
+    value = float(text)
+    if not value > 0:
+        raise argparse.ArgumentTypeError(f"must be positive, got {text}")
+    return value
+
+
+def _address(text):
+    host, _, port = text.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record BeamNG telemetry and replay it into a controller.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rec = commands.add_parser("record", help="Capture telemetry from a UDP port")
+    rec.add_argument("path")
+    rec.add_argument("--port", type=int, default=4444)
+    rec.add_argument("--forward", type=_address, help="Also pass packets on to HOST:PORT (e.g. a controller)")
+    rec.add_argument("--duration", type=float, help="Stop after this many seconds")
+    rep = commands.add_parser("replay", help="Send a recording to a controller")
+    rep.add_argument("path")
+    rep.add_argument("--target", type=_address, default=("127.0.0.1", 4444))
+    rep.add_argument("--rate", type=_positive_float, default=1.0, help="Replay speed multiplier (1 = real time)")
+    rep.add_argument("--fast", action="store_true", help="Send as fast as possible")
+    rep.add_argument("--format", choices=("binary", "json"), default="binary")
+    inf = commands.add_parser("info", help="Summarise a recording")
+    inf.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.path, args.port, args.forward, args.duration)
+    elif args.command == "replay":
+        mode = "as fast as possible" if args.fast else f"at {args.rate:g}x"
+        print(f"Replaying {args.path} to {args.target[0]}:{args.target[1]} {mode}")
+        sent, elapsed = replay(args.path, args.target, args.rate, args.fast, args.format)
+        print(f"Sent {sent} packets in {elapsed:.2f} s ({sent / max(elapsed, 1e-9):.0f} packets/s)")
+    else:
+        info(args.path)
+
+
+if __name__ == "__main__":
+    main()
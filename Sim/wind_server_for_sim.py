@@ -1,8 +1,19 @@
-from flask import Flask, request, render_template_string, jsonify # Added jsonify
+import os
+import sys
+from flask import Flask, Response, request, render_template_string, jsonify # Added jsonify
+
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from config_push import CONFIG_PUSH_PORT, ConfigPublisher
+from metrics import read_metrics_file
+from wind_config import ConfigStore
 
 app = Flask(__name__)
 
-top_speed = 150  # Default top speed
+# Full wind config (top speed, curve, PWM limits, main.lua rate control),
+# saved to wind_config.json so it survives restarts. The form edits top speed
+# and sender settings; /api/config reads and changes every field.
+store = ConfigStore()
 
 HTML = '''
 <!DOCTYPE html>
@@ -12,6 +23,7 @@ HTML = '''
 <title>BeamNG Fan Controller</title>
 </head>
 <body>
+{% if error %}<p style="color: red">{{error}}</p>{% endif %}
 <h2>Set In-Game Car Top Speed</h2>
 <form method="post">
 <label for="top_speed_input">Top Speed (mph, 1-250):</label>
@@ -19,35 +31,95 @@ HTML = '''
 <input type="submit" value="Set">
 </form>
 <p>Current top speed: {{top_speed}} mph</p>
+<h2>Telemetry Sender (main.lua)</h2>
+<form method="post">
+<label>Max send rate (Hz, 1-240): <input type="number" name="max_send_hz" value="{{sender.max_send_hz}}" min="1" max="240" step="any" required></label><br>
+<label>Change threshold (m/s, 0-5): <input type="number" name="change_threshold" value="{{sender.change_threshold}}" min="0" max="5" step="any" required></label><br>
+<label>Keepalive when unchanged (s, 0.1-1.5): <input type="number" name="keepalive" value="{{sender.keepalive}}" min="0.1" max="1.5" step="any" required></label><br>
+<input type="submit" value="Set">
+</form>
 </body>
 </html>
 ''' #
 
+# Pushes top_speed changes to subscribed fan controllers over UDP; started in __main__
+config_publisher = None
+
+def get_top_speed():
+    top_speed = store.config.top_speed
+    return int(top_speed) if top_speed.is_integer() else top_speed
+
+def get_config():
+    config = store.config
+    return {"top_speed": get_top_speed(), "sender": config.sender._asdict(), "curve": config.curve,
+            "deadband": config.deadband, "max_write_hz": config.max_write_hz, "slew_rate": config.slew_rate}
+
+def on_config_change(version, config):
+    if config_publisher is not None:
+        config_publisher.publish()
+
+store.add_listener(on_config_change)
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    global top_speed
+    error = None
     if request.method == 'POST':
         try:
-            ts = int(request.form['top_speed'])
-            if 1 <= ts <= 250:  # Validation from HTML form
-                top_speed = ts
-        except ValueError: # More specific exception
-            pass # Keep current top_speed if input is invalid
-    return render_template_string(HTML, top_speed=top_speed)  #
+            if 'top_speed' in request.form:
+                ts = int(request.form['top_speed'])
+                if not 1 <= ts <= 250: # Validation from HTML form
+                    raise ValueError(ts)
+                store.update(top_speed=ts)
+            else:
+                store.update(max_send_hz=request.form['max_send_hz'],
+                             change_threshold=request.form['change_threshold'],
+                             keepalive=request.form['keepalive'])  # Clamped to safe ranges
+        except (KeyError, ValueError):
+            error = "Invalid value; nothing was changed."
+        except OSError as e:
+            print(f"Error: Could not save {store.path}: {e}")
+            error = f"Could not save the config: {e}"
+    return render_template_string(HTML, top_speed=get_top_speed(), sender=store.config.sender, error=error)
 
 # New API endpoint for the fan controller simulator
 @app.route('/get_top_speed_api', methods=['GET'])
 def get_top_speed_api():
-    global top_speed
-    return jsonify({"top_speed": top_speed})
+    version = config_publisher.version if config_publisher is not None else None
+    return jsonify({"top_speed": get_top_speed(), "version": version})
+
+# Whole config as JSON; POST a JSON object with the fields to change
+@app.route('/api/config', methods=['GET', 'POST'])
+def config_api():
+    if request.method == 'POST':
+        changes = request.get_json(silent=True)
+        if not isinstance(changes, dict):
+            return jsonify({"error": "Expected a JSON object"}), 400
+        changes.pop("version", None)
+        try:
+            store.update(**changes)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except OSError as e:
+            print(f"Error: Could not save {store.path}: {e}")
+            return jsonify({"error": f"Could not save the config: {e}"}), 500
+    version, config = store.snapshot
+    return jsonify({"version": version, **config._asdict()})
+
+# Prometheus-style pipeline metrics published by the fan controller process
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(read_metrics_file(), mimetype='text/plain; version=0.0.4')
 
 # This function can be used if other Python modules on the same server need it.
 def get_top_speed_py_func(): # Renamed to avoid conflict if imported
-    global top_speed
-    return top_speed
+    return get_top_speed()
 
 if __name__ == '__main__':
+    config_publisher = ConfigPublisher(get_config).start()
     print("Starting Wind Server for Simulation on http://0.0.0.0:5000")
     print("Access web UI at http://127.0.0.1:5000")
     print("API for top speed at http://127.0.0.1:5000/get_top_speed_api")
+    print(f"Full config at http://127.0.0.1:5000/api/config, saved to {store.path}")
+    print("Controller metrics at http://127.0.0.1:5000/metrics")
+    print(f"Pushing top speed changes to subscribed controllers on UDP port {CONFIG_PUSH_PORT}")
     app.run(host='0.0.0.0', port=5000) #
\ No newline at end of file
@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import time
+
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from pwm_output import OutputStage
+from sample_ring import SampleRing, default_ring_path
+from telemetry_protocol import MPS_TO_MPH, TelemetrySample, decode_into, encode_binary, encode_json
+from udp_receiver import DrainingReceiver
+from wind_channels import AXES, ChannelBank
+from wind_curve import CURVE_KINDS, FEEL_TABLE, compile_curve
+
+# Microbenchmarks for the per-packet hot path of the fan controllers.
+#
+#   python benchmarks/bench_hot_path.py                      run, compare with baseline.json
+#   python benchmarks/bench_hot_path.py --save-baseline      run and make this the new baseline
+#   python benchmarks/bench_hot_path.py --json results.json  also write this run's results
+#   python benchmarks/bench_hot_path.py --filter curve       only benchmarks whose name contains "curve"
+#
+# Each benchmark is timed in `--repeat` rounds of enough calls to last about
+# `--min-time` seconds; the median round is reported in nanoseconds per
+# operation (the minimum is kept too, as the least noisy figure). Results are
+# JSON, keyed by benchmark name, with the machine and Python version they came
+# from. Baselines are per machine: save one on the Pi itself, then compare
+# later runs on the same Pi. A benchmark slower than the baseline by more than
+# `--threshold` is reported as a regression and the exit status is 1.
+#
+# The PWM write is a no-op stub, so nothing here needs RPi.GPIO.
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.15  # Fractional slowdown reported as a regression
+BENCH_PORT = 4460         # Loopback port for the UDP benchmarks
+
+ORIGINAL_PAYLOAD = b'{"vel":[1.25,31.5,-0.02]}'  # What the original Lua sender emitted
+JSON_PAYLOAD = encode_json(1234, 5678, 1.25, 31.5, -0.02)
+BINARY_PAYLOAD = encode_binary(1234, 5678, 1.25, 31.5, -0.02)
+ORIENTED_PAYLOAD = encode_binary(1234, 5678, 1.25, 31.5, -0.02, 42, (0.28, 0.96, 0.0, 0.0, 0.0, 1.0))
+SPEEDS = [i * 0.7 % 180.0 for i in range(1000)]  # Spread across and beyond top speed
+
+
+def _original_calculate_motor_power(speed_mph, top_speed=150, max_real_wind_speed=70, max_power=100):
+    """fan_controller.py before the curves were compiled (quadratic, closed form)."""
+    if top_speed < 5:
+        return 0
+    normalized_speed = speed_mph / top_speed
+    real_wind_equivalent = normalized_speed * max_real_wind_speed
+    power = (real_wind_equivalent / max_real_wind_speed) ** 2 * max_power
+    return min(max(power, 0), max_power)
+
+
+def _original_piecewise(speed_mph, top_speed=150):
+    """The README feel table interpolated per call, as a direct implementation would."""
+    table = [(s, p) for s, p in FEEL_TABLE if s < top_speed] + [(top_speed, 100)]
+    if speed_mph <= 0:
+        return 0.0
+    for (x0, y0), (x1, y1) in zip(table, table[1:]):
+        if speed_mph <= x1:
+            return y0 + (y1 - y0) * (speed_mph - x0) / (x1 - x0)
+    return 100.0
+
+
+def _measure(func, loops, repeat, min_time):
+    """Calibrate the loop count, then time `repeat` rounds; returns per-op ns per round."""
+    number = 1
+    while True:
+        start = time.perf_counter_ns()
+        func(number)
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e8:  # A tenth of the target is enough to scale from
+            number = max(1, int(number * min_time * 1e9 / elapsed))
+            break
+        number *= 10
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func(number)
+        rounds.append((time.perf_counter_ns() - start) / (number * loops))
+    return rounds
+
+
+def _looped(op, args=()):
+    """Wrap a single-op callable as func(number) that runs it `number` times."""
+    def run(number):
+        for _ in range(number):
+            op(*args)
+    return run
+
+
+def _speed_loop(op):
+    def run(number):
+        speeds = SPEEDS
+        for _ in range(number):
+            for s in speeds:
+                op(s)
+    return run
+
+
+def _ignore_sample(sample, address, now, arrival):
+    pass
+
+
+def _benchmarks():
+    """(name, func(number), operations per call) for every hot-path stage."""
+    sample = TelemetrySample()
+    vel = json.loads(ORIGINAL_PAYLOAD)["vel"]
+
+    def forward_speed():
+        return vel[1] * MPS_TO_MPH
+
+    def magnitude_speed():
+        return (vel[0] ** 2 + vel[1] ** 2 + vel[2] ** 2) ** 0.5 * MPS_TO_MPH
+
+    def original_get_vehicle_speed_mph():
+        telemetry = json.loads(ORIGINAL_PAYLOAD.decode("utf-8"))
+        velocity = telemetry["vel"]
+        return (velocity[0] ** 2 + velocity[1] ** 2 + velocity[2] ** 2) ** 0.5 * 2.237
+
+    yield "decode/json_loads_original", _looped(json.loads, (ORIGINAL_PAYLOAD,)), 1
+    yield "decode/decode_into_json", _looped(decode_into, (sample, JSON_PAYLOAD, len(JSON_PAYLOAD))), 1
+    yield "decode/decode_into_binary", _looped(decode_into, (sample, BINARY_PAYLOAD, len(BINARY_PAYLOAD))), 1
+    oriented = TelemetrySample()
+    decode_into(oriented, ORIENTED_PAYLOAD, len(ORIENTED_PAYLOAD))
+    yield "decode/decode_into_binary_oriented", _looped(decode_into, (oriented, ORIENTED_PAYLOAD,
+                                                                      len(ORIENTED_PAYLOAD))), 1
+    yield "speed/vel1_forward", _looped(forward_speed), 1
+    yield "speed/vector_magnitude", _looped(magnitude_speed), 1
+    yield "speed/sample_forward_speed_mph", _looped(sample.forward_speed_mph), 1
+    yield "speed/sample_speed_mph", _looped(sample.speed_mph), 1
+    yield "speed/original_get_vehicle_speed_mph", _looped(original_get_vehicle_speed_mph), 1
+    yield "speed/sample_vehicle_velocity", _looped(oriented.vehicle_velocity), 1
+
+    yield "curve/original_quadratic", _speed_loop(_original_calculate_motor_power), len(SPEEDS)
+    yield "curve/original_piecewise", _speed_loop(_original_piecewise), len(SPEEDS)
+    for kind in CURVE_KINDS:
+        points = ((0, 0), (30, 20), (90, 80), (150, 100)) if kind == "points" else None
+        yield f"curve/compiled_{kind}", _speed_loop(compile_curve(kind, 150, points)), len(SPEEDS)
+    try:
+        import numpy as np
+    except ImportError:
+        pass
+    else:
+        batch_curve = compile_curve("piecewise", 150)
+        speeds = np.asarray(SPEEDS)
+        yield "curve/evaluate_batch_per_speed", _looped(batch_curve.evaluate_batch, (speeds,)), len(SPEEDS)
+
+        # One control tick of the multi-fan output: all channels in one step
+        for count in (1, 3, 8):
+            axes = list(AXES)
+            bank = ChannelBank([{"axis": axes[i % len(axes)], "top_speed": 40 + i} for i in range(count)],
+                               [lambda power: None] * count)
+            tick = [0.0]
+
+            def bank_step(bank=bank, tick=tick):
+                tick[0] += 0.001
+                bank.update(oriented, tick[0])
+                bank.step(tick[0])
+
+            yield f"channels/bank_step_{count}", _looped(bank_step), 1
+
+    output = OutputStage(lambda power: None)
+    clock = [0.0]
+
+    def pwm_update():
+        clock[0] += 0.001
+        output.update(SPEEDS[int(clock[0] * 1000) % len(SPEEDS)] / 1.8, clock[0])
+
+    yield "pwm/output_stage_update_stub", _looped(pwm_update), 1
+
+    # Receiver process -> controller hand-off (both ends in this process)
+    consumer = SampleRing(default_ring_path(), create=True)
+    producer = SampleRing(consumer.path)
+    address = ("192.168.1.20", 51234)
+
+    def ring_push(number):
+        for _ in range(number):
+            producer.push(oriented, address, 0.0, 0.0)
+            consumer.drain(_ignore_sample)
+
+    def ring_batch(number):
+        for _ in range(number):
+            for _ in range(16):
+                producer.push(oriented, address, 0.0, 0.0)
+            consumer.drain(_ignore_sample)
+
+    try:
+        yield "ring/push_drain_one", ring_push, 1
+        yield "ring/push_drain_batch16", ring_batch, 16
+    finally:
+        producer.close()
+        consumer.close()  # Removes the ring file
+
+
+def _udp_benchmarks():
+    """Loopback round trips: the socket cost every packet pays before any parsing."""
+    receiver_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver_sock.bind(("127.0.0.1", BENCH_PORT))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = ("127.0.0.1", BENCH_PORT)
+    buffer = bytearray(1024)
+    receiver_sock.settimeout(1.0)
+
+    def blocking_round_trip(number):
+        for _ in range(number):
+            sender.sendto(BINARY_PAYLOAD, target)
+            receiver_sock.recv_into(buffer)
+
+    def recvfrom_round_trip(number):
+        for _ in range(number):
+            sender.sendto(ORIGINAL_PAYLOAD, target)
+            receiver_sock.recvfrom(1024)
+
+    receiver = None  # Made non-blocking by DrainingReceiver, after the blocking benchmarks
+    sample = TelemetrySample()
+    curve = compile_curve("quadratic", 150)
+    output = OutputStage(lambda power: None, deadband=0, max_write_hz=None, slew_rate=None)
+
+    def full_pipeline(number):
+        for _ in range(number):
+            sender.sendto(BINARY_PAYLOAD, target)
+            receiver.wait(1.0)
+            nbytes = receiver.drain()
+            if decode_into(sample, receiver.buffer, nbytes):
+                output.update(curve(sample.forward_speed_mph()))
+
+    try:
+        yield "udp/loopback_recvfrom_json", recvfrom_round_trip, 1
+        yield "udp/loopback_recv_into_binary", blocking_round_trip, 1
+        receiver = DrainingReceiver(receiver_sock)
+        yield "udp/full_pipeline_binary", full_pipeline, 1
+    finally:
+        sender.close()
+        receiver_sock.close()
+
+
+def run(filter_text=None, repeat=7, min_time=0.2):
+    results = {}
+    for benchmarks in (_benchmarks(), _udp_benchmarks()):
+        for name, func, loops in benchmarks:
+            if filter_text and filter_text not in name:
+                continue
+            rounds = sorted(_measure(func, loops, repeat, min_time))
+            results[name] = {"median_ns": rounds[len(rounds) // 2], "min_ns": rounds[0], "repeat": repeat}
+            print(f"{name:40s} {results[name]['median_ns']:10.1f} ns/op  (min {rounds[0]:.1f})")
+    return {
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """Print the change against `baseline`; returns the names that regressed."""
+    if (baseline.get("machine"), baseline.get("python")) != (report["machine"], report["python"]):
+        print(f"Note: baseline is from {baseline.get('node')} ({baseline.get('machine')}, Python {baseline.get('python')}), "
+              f"this run is {report['node']} ({report['machine']}, Python {report['python']})")
+    regressions = []
+    print(f"\n{'benchmark':40s} {'baseline':>10s} {'now':>10s} {'change':>8s}")
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:40s} {'-':>10s} {result['median_ns']:10.1f}      new")
+            continue
+        change = result["median_ns"] / base["median_ns"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:40s} {base['median_ns']:10.1f} {result['median_ns']:10.1f} {change * 100:+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of the telemetry-to-PWM hot path.")
+    parser.add_argument("--json", help="Write this run's results to a JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown (fraction) reported as a regression (default 0.15)")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed rounds per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Target seconds per round")
+    args = parser.parse_args()
+
+    report = run(args.filter, args.repeat, args.min_time)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    regressions = compare(report, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold * 100:.0f}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import sys
+
+# Shared controller modules live alongside the Pi scripts in Examples/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Examples"))
+from speed_filter import FilterStage, make_filter, measure_lag
+
+# What each speed filter configuration costs in lag and buys in smoothing.
+#
+#   python benchmarks/filter_lag.py                  table for the built-in configurations
+#   python benchmarks/filter_lag.py --rate 144       at another telemetry rate
+#   python benchmarks/filter_lag.py --lead 0.25      with another lead (seconds)
+#   python benchmarks/filter_lag.py --json           machine-readable output
+#
+# See speed_filter.measure_lag() for the definitions. Pick the lead from the
+# fan's spin-up time: the lag it hides is added back as overshoot on steps.
+
+CONFIGS = (
+    ("none", {}),
+    ("ema", {"time_constant": 0.05}),
+    ("ema", {"time_constant": 0.1}),
+    ("ema", {"time_constant": 0.2}),
+    ("one_euro", {}),
+    ("one_euro", {"min_cutoff": 0.5, "beta": 0.1}),
+    ("kalman", {}),
+    ("kalman", {"jerk_noise": 50.0}),
+    ("kalman", {"jerk_noise": 2000.0}),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure lag and smoothing of the speed filters")
+    parser.add_argument("--rate", type=float, default=60.0, help="Telemetry packets per second")
+    parser.add_argument("--noise", type=float, default=0.5, help="Speed noise (mph, standard deviation)")
+    parser.add_argument("--lead", type=float, action="append", help="Lead in seconds (repeatable; default 0 and 0.15)")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    results = []
+    for lead in args.lead or (0.0, 0.15):
+        for kind, params in CONFIGS:
+            result = measure_lag(lambda: FilterStage(make_filter(kind, **params), lead), args.rate, args.noise)
+            label = kind + "".join(f" {k}={v:g}" for k, v in params.items())
+            results.append({"filter": label, "lead": lead, **result})
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'filter':<38} {'lead s':>6} {'ramp lag ms':>11} {'step 50% ms':>11} {'overshoot':>9} {'noise':>6}")
+    for r in results:
+        step_50 = f"{r['step_50'] * 1000:.0f}" if r["step_50"] is not None else "-"
+        print(f"{r['filter']:<38} {r['lead']:>6.2f} {r['ramp_lag'] * 1000:>11.0f} {step_50:>11} "
+              f"{r['overshoot']:>9.1f} {r['noise_ratio']:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()